@@ -0,0 +1,188 @@
+'''
+Scaling benchmark of the simulation kernels: times the movement functions,
+Virus.infect and full PopulationUtil.move steps across population sizes and
+epidemic phases, and writes the results to a JSON report.
+
+Usage: python -m benchmarks.scaling --sizes 1000 10000 --out scaling.json
+'''
+import argparse
+import datetime
+import json
+import platform
+import sys
+import time
+import numpy as np
+from main import Main
+from src.population_util import PopulationUtil
+import src.person_properties_util as index
+
+# Share of the population that is infected, immune and dead in every phase, everybody else is healthy
+phases = {
+    "low":  {"infected": 0.001, "immune": 0.0, "dead": 0.0},
+    "peak": {"infected": 0.3,   "immune": 0.2, "dead": 0.01},
+    "late": {"infected": 0.02,  "immune": 0.7, "dead": 0.03},
+}
+
+# Timed functions, in the order they run inside PopulationUtil.move()
+components = ["update_persons", "out_of_bounds", "update_pop", "infect", "move"]
+
+# Frame the benchmark runs at, no intervention starts on it
+frame = 1001
+
+
+def create_population_util(size: int, seed: int) -> PopulationUtil:
+    """
+    Creates a simulation of the given size with the parameters of config/config.ini
+
+    Parameters
+    ----------
+    :param size: Size of the population
+    :param seed: Seed of the simulation
+
+    :return The PopulationUtil
+    """
+    main = Main()
+    main.load_config()
+    params = main.get_population_params()
+    params["size"] = size
+    params["total_healthcare_capacity"] = size * main.total_healthcare_capacity / main.size
+    return PopulationUtil(seed=seed, **params)
+
+
+def set_phase(population_util: PopulationUtil, phase: str, seed: int):
+    """
+    Puts the population in the given epidemic phase: draws the state of every person from the shares of the
+    phase, spreads the infection times over the recovery time and fills the hospital
+
+    Parameters
+    ----------
+    :param population_util: The simulation
+    :param phase: Name of the phase in phases
+    :param seed: Seed for the drawing
+    """
+    rng = np.random.default_rng(seed)
+    persons = population_util.persons
+    size = population_util.size
+    shares = phases[phase]
+    healthy = 1 - shares["infected"] - shares["immune"] - shares["dead"]
+    state = rng.choice(4, size=size, p=[healthy, shares["infected"], shares["immune"], shares["dead"]])
+    state[population_util.infected_person] = 1
+    persons[:, index.current_state] = state
+
+    infected = np.flatnonzero(state == 1)
+    persons[infected, index.infected_at] = frame - rng.integers(0, population_util.recovery_time, size=len(infected))
+    persons[infected, index.infected_by] = rng.integers(0, size, size=len(infected))
+
+    persons[:, index.hospitalized] = 0
+    population_util.population.hospital_occupancy = 0
+    population_util.population.admit_to_hospital(infected[:int(population_util.total_healthcare_capacity)])
+
+
+def snapshot(population_util: PopulationUtil) -> tuple:
+    """
+    Copies the state changed by the timed components: the person columns, the hospital occupancy and the
+    state of the random number generator
+    """
+    return ([np.array(column) for column in population_util.persons.columns],
+            population_util.population.get_hospital_occupancy(), population_util.rng.bit_generator.state)
+
+
+def restore(population_util: PopulationUtil, state: tuple):
+    """
+    Restores a state copied by snapshot()
+    """
+    columns, occupancy, rng_state = state
+    for column, saved in zip(population_util.persons.columns, columns):
+        column[:] = saved
+    population_util.population.hospital_occupancy = occupancy
+    population_util.rng.bit_generator.state = rng_state
+
+
+def benchmark(population_util: PopulationUtil, component: str, repeats: int, state: tuple) -> list:
+    """
+    Times one component, the population is restored before every repeat so each one does the same work
+
+    Parameters
+    ----------
+    :param population_util: The simulation
+    :param component: Name of the component in components
+    :param repeats: Number of timed calls
+    :param state: Snapshot of the phase to benchmark, see snapshot()
+
+    :return List of the durations in seconds
+    """
+    persons = population_util.persons
+    movement = population_util.movement
+    bounds = np.array([population_util.x_bounds])
+    calls = {
+        "update_persons": lambda: movement.update_persons(persons, population_util.size, population_util.speed),
+        "out_of_bounds":  lambda: movement.out_of_bounds(persons, bounds, bounds),
+        "update_pop":     lambda: movement.update_pop(persons),
+        "infect":         lambda: population_util.virus.infect(population_util.population, frame),
+        "move":           lambda: population_util.move(frame),
+    }
+
+    times = []
+    for _ in range(repeats):
+        restore(population_util, state)
+        start = time.perf_counter()
+        calls[component]()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def run(sizes: list, phase_names: list, repeats: int, seed: int) -> dict:
+    """
+    Runs the benchmark for every size, phase and component
+
+    Parameters
+    ----------
+    :param sizes: Population sizes
+    :param phase_names: Names of the phases in phases
+    :param repeats: Number of timed calls per component
+    :param seed: Seed of the simulations
+
+    :return The report
+    """
+    results = []
+    for size in sizes:
+        population_util = create_population_util(size, seed)
+        for phase in phase_names:
+            set_phase(population_util, phase, seed)
+            state = snapshot(population_util)
+            counts = population_util.population.get_state_counts()
+            for component in components:
+                times = benchmark(population_util, component, repeats, state)
+                median = float(np.median(times))
+                result = {"size": size, "phase": phase, "component": component,
+                            "healthy": int(counts[0]), "infected": int(counts[1]), "immune": int(counts[2]), "dead": int(counts[3]),
+                            "repeats": repeats, "median_s": median, "best_s": float(min(times)),
+                            "frames_per_s": 1 / median, "agent_updates_per_s": size / median}
+                results.append(result)
+                print("%9d %-5s %-15s %10.6f s %12.1f frames/s %14.0f agents/s" %
+                        (size, phase, component, median, result["frames_per_s"], result["agent_updates_per_s"]), file = sys.stdout)
+
+    return {"created": datetime.datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+            "numpy": np.__version__, "machine": platform.machine(), "processor": platform.processor(),
+            "seed": seed, "frame": frame, "phases": {name: phases[name] for name in phase_names}, "results": results}
+
+
+def parse_args(argv: list) -> argparse.Namespace:
+    """
+    Parses the command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Scaling benchmark of the simulation kernels")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000], help="Population sizes")
+    parser.add_argument("--phases", nargs="+", choices=list(phases), default=list(phases), help="Epidemic phases")
+    parser.add_argument("--repeats", type=int, default=5, help="Number of timed calls per component")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the simulations")
+    parser.add_argument("--out", default="scaling.json", help="Path of the JSON report")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    report = run(args.sizes, args.phases, args.repeats, args.seed)
+    with open(args.out, "w") as out:
+        json.dump(report, out, indent=2)
+    print("Saved report to " + args.out, file = sys.stdout)
@@ -9,12 +9,11 @@ import tkinter as tk
 from tkinter import Widget, ttk, filedialog
 import webbrowser
 import sys
-from src.visualization import Visualization
 from sys import platform
-from src.population_util import PopulationUtil
 from src.config_util import ConfigUtil
 from PIL import Image, ImageTk
 from gui.data_store import DataStore
+from gui.simulation_worker import SimulationWorker
 
 class ButtonsFrame(ttk.Frame):
     """
@@ -37,6 +36,7 @@ class ButtonsFrame(ttk.Frame):
         self.width = width
         self.data = DataStore.get_instance()
         self.render_dir = None
+        self.worker = None
         
         self.create_widgets()
 
@@ -197,9 +197,18 @@ class ButtonsFrame(ttk.Frame):
                                     pady=float(self.label_frame.winfo_reqheight()) * 0.02)
 
         self.start_sim_button = ttk.Button(master=label_frame, text="Start", command=self.start)
-        self.start_sim_button.grid(row=9,column=0,columnspan=2, sticky='ew', 
-                                    padx=(float(self.label_frame.winfo_reqwidth()) * 0.05,float(self.label_frame.winfo_reqwidth()) * 0.05), 
+        self.start_sim_button.grid(row=9,column=0,columnspan=1, sticky='ew', 
+                                    padx=(float(self.label_frame.winfo_reqwidth()) * 0.05,float(self.label_frame.winfo_reqwidth()) * 0.02), 
+                                    pady=float(self.label_frame.winfo_reqheight()) * 0.02)
+
+        self.cancel_button = ttk.Button(master=label_frame, text="Cancel", command=self.cancel, state=tk.DISABLED)
+        self.cancel_button.grid(row=9,column=1,columnspan=1, sticky='ew', 
+                                    padx=(float(self.label_frame.winfo_reqwidth()) * 0.02,float(self.label_frame.winfo_reqwidth()) * 0.05), 
                                     pady=float(self.label_frame.winfo_reqheight()) * 0.02)
+
+        # Progress and final statistics of the simulation
+        self.progress_label = ttk.Label(master=label_frame, text="")
+        self.progress_label.grid(row=10, column=0, columnspan=2, padx=float(label_frame.winfo_reqwidth()) * 0.02, pady=float(label_frame.winfo_reqheight()) * 0.01, sticky=tk.W)
         
         if self.simulation_mode.get() == 1:
             warning_label_text = "Warning: This feature relies on FFMPEG, it will NOT work if system\ndoes not have FFMPEG installed"
@@ -207,7 +216,7 @@ class ButtonsFrame(ttk.Frame):
             if platform == "darwin":
                 warning_label_text += "\n\nDISCLAIMER FOR MAC USERS: For renderings to be stored on the\ndisk either you need to explicitly give disk permissions or start the\napplication using root permission using the following command.\n\"sudo open [path\\to\\applicaton.app]\""
             warning_label = ttk.Label(master=label_frame,text=warning_label_text)
-            warning_label.grid(row=10, column=0, columnspan=2, padx=float(label_frame.winfo_reqwidth()) * 0.02, pady=float(label_frame.winfo_reqheight()) * 0.01, sticky=tk.W)
+            warning_label.grid(row=11, column=0, columnspan=2, padx=float(label_frame.winfo_reqwidth()) * 0.02, pady=float(label_frame.winfo_reqheight()) * 0.01, sticky=tk.W)
 
 
     def load_covid_data(self):
@@ -268,8 +277,10 @@ class ButtonsFrame(ttk.Frame):
 
     def start(self):
         """
-        Starts the simulation with the requested configuration;
-        Updates the top level window with the simulation in live mode, generates the video file of the simulation in render mode;
+        Starts the simulation with the requested configuration in a worker process;
+        Opens a window with the simulation in live mode, generates the video file of the simulation in render mode;
+        Progress is shown in the top level window, see poll_worker, which stays open while a live simulation runs so
+        it can be followed and cancelled;
         """
 
         config_util = ConfigUtil("config/config.ini")
@@ -277,10 +288,13 @@ class ButtonsFrame(ttk.Frame):
             self.start_sim_button["text"] = "Please select a directory"
             return
 
+        if self.worker is not None and not self.worker.finished:
+            return
+
         if self.simulation_mode.get() == 1:
             self.start_sim_button["text"] = "Rendering. Please Wait"
-
-        self.update()
+        else:
+            self.start_sim_button["text"] = "Simulating"
 
         k               = self.data.get_k_val()
         r               = self.data.get_r_val()
@@ -305,19 +319,62 @@ class ButtonsFrame(ttk.Frame):
         else:
             enforce_masks_at = self.data.get_mask_mandate_starting_at_val()
 
-        p_util = PopulationUtil(r=r, k=k, size=size, min_age=min_age, max_age=max_age,
+        params = dict(r=r, k=k, size=size, min_age=min_age, max_age=max_age,
                     mortality_rate=mortality, infection_range=infection_range, recovery_time=recovery_time,
                     total_healthcare_capacity=health_cap, mask_effectiveness=mask_effect,
                     speed=speed, social_distance_per=social_dist_per,social_distancing_at=enforce_social_distance_at,
                     mask_wearing_at=enforce_masks_at)
-        
-        if self.simulation_mode.get() == 2:
-            self.newWindow.destroy()
-            Visualization(p_util, render_mode=False)
-            
-        if self.simulation_mode.get() == 1:
-            Visualization(p_util, render_mode=True, render_path=self.data.render_dir)
-            self.start_sim_button["text"] = "Done Rendering."
+
+        render_path = self.data.render_dir if self.simulation_mode.get() == 1 else None
+        self.worker = SimulationWorker(params, render_path=render_path)
+        self.worker.start()
+        self.start_sim_button["state"] = tk.DISABLED
+        self.cancel_button["state"] = tk.NORMAL
+        self.progress_label["text"] = "Starting"
+        self.after(100, self.poll_worker)
+
+    def cancel(self):
+        """
+        Cancels the running simulation
+        """
+        if self.worker is not None:
+            self.worker.cancel()
+            self.progress_label["text"] = "Cancelling"
+
+    def poll_worker(self):
+        """
+        Shows the messages of the worker process, runs on the Tkinter loop every 100 ms until the worker is done
+        """
+        for kind, stats in self.worker.poll():
+            if kind == "progress":
+                if stats["frames"] is None:
+                    done = "Frame " + str(stats["frame"])
+                else:
+                    done = "Frame " + str(stats["simulated"]) + " of " + str(stats["frames"])
+                self.progress_label["text"] = (done + ", " + str(round(stats["frames_per_s"], 1)) + " frames/s\n" +
+                                                str(stats["infected"]) + " infected, " + str(stats["immune"]) + " immune, " +
+                                                str(stats["dead"]) + " dead")
+            elif kind == "done":
+                if stats.get("path") is not None:
+                    self.start_sim_button["text"] = "Done Rendering."
+                    self.progress_label["text"] = ("Rendered " + str(stats["simulated"]) + " frames in " + str(round(stats["seconds"], 1)) +
+                                                    " s to\n" + stats["path"])
+                else:
+                    self.start_sim_button["text"] = "Start"
+                    self.progress_label["text"] = ("Simulated " + str(stats["simulated"]) + " frames\n" + str(stats["healthy"]) + " healthy, " +
+                                                    str(stats["immune"]) + " immune, " + str(stats["dead"]) + " dead")
+            elif kind == "cancelled":
+                self.start_sim_button["text"] = "Start"
+                self.progress_label["text"] = "Cancelled"
+            else:
+                self.start_sim_button["text"] = "Start"
+                self.progress_label["text"] = "Failed: " + stats["message"].strip().splitlines()[-1]
+
+        if self.worker.finished:
+            self.start_sim_button["state"] = tk.NORMAL
+            self.cancel_button["state"] = tk.DISABLED
+        else:
+            self.after(100, self.poll_worker)
     
     def about_me(self):
         """
@@ -0,0 +1,176 @@
+"""
+Runs a simulation of the Virussim application in a worker process, so the Tkinter window stays responsive while
+the simulation is shown or rendered. Progress and the final statistics are sent back through a queue that the
+window polls, must not import tkinter
+"""
+
+import multiprocessing
+import os
+import queue
+import time
+import traceback
+
+
+class Cancelled(Exception):
+    """
+    Raised inside the worker process when the simulation was cancelled
+    """
+
+
+class Progress():
+    """
+    Observer of PopulationUtil.move() in the worker process, reports the progress at most every interval seconds
+    and stops a render when it is cancelled
+    """
+
+    def __init__(self, messages: multiprocessing.Queue, cancel: multiprocessing.Event, frames: int, interval: float = 0.25):
+        """
+        Constructor to set the queue, the cancel event and the number of frames
+
+        Parameters
+        ----------
+        :param messages: Queue to send the progress to
+        :param cancel: Event set by the window to cancel a render, None for a live window. Cancelled raised in a
+                       FuncAnimation callback would be swallowed by the event loop of the window, so a live window
+                       is cancelled by terminating the process instead, see SimulationWorker.cancel()
+        :param frames: Number of frames that will be simulated, None when it runs until the window is closed
+        :param interval: Seconds between two progress messages
+        """
+        self.messages  = messages
+        self.cancel    = cancel
+        self.frames    = frames
+        self.interval  = interval
+        self.start     = time.perf_counter()
+        self.last      = self.start
+        self.simulated = 0
+
+    def get_stats(self, population_util) -> dict:
+        """
+        Returns the number of simulated frames, the speed and the current state counts
+        """
+        elapsed = time.perf_counter() - self.start
+        healthy, infected, immune, dead = population_util.population.get_state_counts().tolist()
+        return {"frame": population_util.frame, "frames": self.frames, "simulated": self.simulated,
+                "seconds": elapsed, "frames_per_s": self.simulated / elapsed if elapsed > 0 else 0.0,
+                "healthy": healthy, "infected": infected, "immune": immune, "dead": dead}
+
+    def observe(self, population_util, frame: int):
+        """
+        Counts the frame, sends the progress when the interval has passed and raises Cancelled when a render was
+        cancelled
+        """
+        if self.cancel is not None and self.cancel.is_set():
+            raise Cancelled()
+        self.simulated += 1
+        now = time.perf_counter()
+        if now - self.last >= self.interval:
+            self.last = now
+            self.messages.put(("progress", self.get_stats(population_util)))
+
+
+def run_simulation(params: dict, render_path: str, frames: int, messages: multiprocessing.Queue, cancel: multiprocessing.Event):
+    """
+    Body of the worker process: builds the simulation and shows it in a window, or renders it to
+    render_path/render.mp4. Sends ("progress", stats) messages while running and ends with one ("done", stats),
+    ("cancelled", stats) or ("error", {"message": traceback}) message
+
+    Parameters
+    ----------
+    :param params: Keyword arguments for the PopulationUtil constructor
+    :param render_path: Directory to render to, None to show the simulation in a window
+    :param frames: Number of frames to render
+    :param messages: Queue to send the messages to
+    :param cancel: Event set by the window to cancel a render
+    """
+    try:
+        import matplotlib
+        if render_path is not None:
+            matplotlib.use("Agg")
+        from src.population_util import PopulationUtil
+        from src.visualization import Visualization
+
+        population_util = PopulationUtil(**params)
+        if render_path is None:
+            progress = Progress(messages, None, None)
+        else:
+            progress = Progress(messages, cancel, frames)
+        population_util.add_observer(progress.observe)
+        if render_path is None:
+            Visualization(population_util, render_mode=False)
+            messages.put(("done", progress.get_stats(population_util)))
+        else:
+            path = os.path.join(render_path, "render.mp4")
+            render_stats = Visualization(population_util, start=False).render(path, frames)
+            stats = progress.get_stats(population_util)
+            stats.update(path=path, frames_per_s=render_stats["frames_per_s"])
+            messages.put(("done", stats))
+    except Cancelled:
+        messages.put(("cancelled", progress.get_stats(population_util)))
+    except Exception:
+        messages.put(("error", {"message": traceback.format_exc()}))
+
+
+class SimulationWorker():
+    """
+    Handle of the worker process on the side of the window. The process is started with the spawn method, which
+    works the same on every platform and does not copy the state of Tkinter into the child
+    """
+
+    def __init__(self, params: dict, render_path: str = None, frames: int = 1000):
+        """
+        Constructor to set what to run, the process is only started by start()
+
+        Parameters
+        ----------
+        :param params: Keyword arguments for the PopulationUtil constructor
+        :param render_path: Directory to render to, None to show the simulation in a window
+        :param frames: Number of frames to render
+        """
+        context           = multiprocessing.get_context("spawn")
+        self.messages     = context.Queue()
+        self.cancel_event = context.Event()
+        self.process      = context.Process(target=run_simulation,
+                                            args=(params, render_path, frames, self.messages, self.cancel_event),
+                                            daemon=True)
+        self.render_path  = render_path
+        self.finished     = False
+
+    def start(self):
+        """
+        Starts the worker process
+        """
+        self.process.start()
+
+    def poll(self) -> list:
+        """
+        Returns the messages received since the last call without blocking. Once the process has exited without
+        sending its last message, a ("cancelled", {}) message is made up so the window always sees the end
+
+        :return List of (kind, stats) tuples
+        """
+        received = []
+        while True:
+            try:
+                received.append(self.messages.get_nowait())
+            except queue.Empty:
+                break
+        if any(kind in ("done", "cancelled", "error") for kind, _ in received):
+            self.finished = True
+        elif not self.finished and self.process.exitcode is not None and self.messages.empty():
+            self.finished = True
+            received.append(("cancelled", {}))
+        return received
+
+    def cancel(self):
+        """
+        Cancels the simulation. A render stops on its next frame, a window is closed right away
+        """
+        self.cancel_event.set()
+        if self.render_path is None and self.process.is_alive():
+            self.process.terminate()
+
+    def is_alive(self) -> bool:
+        """
+        Returns whether the worker process is still running
+        """
+        return self.process.is_alive()
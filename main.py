@@ -1,7 +1,7 @@
-from src.visualization import Visualization
 from src.population_util import PopulationUtil
 from src.config_util import ConfigUtil
-from gui.gui_main import main
+import argparse
+import multiprocessing
 import sys
 
 class Main(object):
@@ -14,7 +14,8 @@ class Main(object):
         Constructor to initialize a configUtil object
         """
         self.config_util = ConfigUtil("config/config.ini")
-        
+        self.backend     = None
+
 
     def load_config(self) -> None:
         """
@@ -35,47 +36,236 @@ class Main(object):
         self.enforce_social_distance_at = self.config_util.getIntegerValue("area.stats", "enforce_social_distancing_at")
         self.enforce_mask_wearing_at    = self.config_util.getIntegerValue("area.stats", "enforce_mask_wearing_at")
 
-    def runNoUI(self) -> None:
+    def get_population_params(self) -> dict:
+        """
+        Function returning the PopulationUtil constructor arguments from the loaded config
+        """
+        return dict(k = self.k, r = self.r, min_age = self.min_age, max_age = self.max_age, size = self.size,
+                    mortality_rate = self.mortality_rate, infection_range = self.infection_range, recovery_time = self.recovery_time,
+                    total_healthcare_capacity = self.total_healthcare_capacity, social_distance_per = self.social_distance_per,
+                    mask_effectiveness = self.mask_effectiveness, speed=self.speed, social_distancing_at = self.enforce_social_distance_at,
+                    mask_wearing_at = self.enforce_mask_wearing_at)
+
+    def get_backend(self) -> str:
+        """
+        Function returning the kernels of new simulations, the ones set by --backend or numpy. A resumed run
+        keeps the kernels of its checkpoint unless --backend is given
+        """
+        return self.backend or "numpy"
+
+    def create_population_util(self, seed: int = None, storage_dir: str = None) -> PopulationUtil:
+        """
+        Function to create the PopulationUtil object from the loaded config, with the kernels of get_backend()
+        """
+        return PopulationUtil(seed=seed, storage_dir=storage_dir, backend=self.get_backend(), **self.get_population_params())
+
+    def runNoUI(self, record: str = None, profile: bool = False, fast: bool = False, trace: str = None,
+                publish: str = None) -> None:
         """
         Function to run with NO UI, loads everyting from config file
         """
+        from src.visualization import Visualization
         print("Running with no UI, loading data from the config file")
         self.load_config()
-        self.population_util = PopulationUtil(k = self.k, r = self.r, min_age = self.min_age, max_age = self.max_age, size = self.size,
-                                mortality_rate = self.mortality_rate, infection_range = self.infection_range, recovery_time = self.recovery_time,
-                                total_healthcare_capacity = self.total_healthcare_capacity, social_distance_per = self.social_distance_per,
-                                mask_effectiveness = self.mask_effectiveness, speed=self.speed, social_distancing_at = self.enforce_social_distance_at,
-                                mask_wearing_at = self.enforce_mask_wearing_at)
-        self.visualize = Visualization(self.population_util, render_mode = False)
-    
-    def render(self, path: str) -> None:
+        self.population_util = self.create_population_util()
+        publisher = self.start_publishing(publish)
+        try:
+            self.visualize = Visualization(self.population_util, render_mode = False, record_path = record, show_stats = profile, fast = fast,
+                                            trace_path = trace)
+        finally:
+            if publisher is not None:
+                publisher.close()
+
+    def start_publishing(self, name: str):
+        """
+        Function to publish the state of the simulation to the shared memory segment name after every frame, if
+        a name is given
+
+        :return The SharedStatePublisher, None when no name is given
+        """
+        if name is None:
+            return None
+        from src.shared_state import SharedStatePublisher
+        publisher = SharedStatePublisher(self.population_util, name).attach(self.population_util)
+        print("Publishing the simulation state to the shared memory segment " + publisher.name)
+        return publisher
+
+    def render(self, path: str, record: str = None, fast: bool = False, frames: int = 1000, workers: int = None) -> None:
         """
-        Function to directly render without showing ANY UI
+        Function to directly render without showing ANY UI. With more than one worker the simulation is run
+        headless first and the recorded frames are drawn by a pool of processes, see ParallelRender
         """
         print("Rendering to " + path)
         self.load_config()
-        self.population_util = PopulationUtil(k = self.k, r = self.r, min_age = self.min_age, max_age = self.max_age, size = self.size,
-                                mortality_rate = self.mortality_rate, infection_range = self.infection_range, recovery_time = self.recovery_time,
-                                total_healthcare_capacity = self.total_healthcare_capacity, social_distance_per = self.social_distance_per,
-                                mask_effectiveness = self.mask_effectiveness, speed=self.speed, social_distancing_at = self.enforce_social_distance_at,
-                                mask_wearing_at = self.enforce_mask_wearing_at)
-        Visualization(self.population_util, render_mode=True, render_path=path)
+        self.population_util = self.create_population_util()
+        if workers == 1:
+            from src.visualization import Visualization
+            Visualization(self.population_util, render_mode=True, render_path=path, record_path=record, fast=fast,
+                            render_frames=frames)
+            return
+
+        from src.parallel_render import ParallelRender
+        from src.recorder import TimeSeriesRecorder
+        recorder = TimeSeriesRecorder(record).attach(self.population_util) if record is not None else None
+        ParallelRender(self.population_util, frames, workers=workers, fast=fast).run(path + "/render.mp4")
+        if recorder is not None:
+            recorder.close()
+            print("Recorded " + str(recorder.frames) + " frames to " + record)
+
+    def runHeadless(self, frames: int, out: str, seed: int = None, storage_dir: str = None, checkpoint: str = None,
+                    checkpoint_every: int = 0, resume: str = None, record: str = None, profile: bool = False,
+                    trace: str = None, publish: str = None) -> None:
+        """
+        Function to run the simulation without any UI or plotting, loads everything from the config file
+        and saves the per frame counts. A run resumed from a checkpoint continues up to the same total
+        number of frames
+        """
+        from src.headless import HeadlessSimulation
+        if resume is not None:
+            print("Resuming headless run from " + resume)
+            simulation = HeadlessSimulation.from_checkpoint(resume, storage_dir, self.backend)
+            self.population_util = simulation.putil
+        else:
+            print("Running headless for " + str(frames) + " frames, loading data from the config file")
+            self.load_config()
+            self.population_util = self.create_population_util(seed, storage_dir)
+            simulation = HeadlessSimulation(self.population_util)
+        start_frame = simulation.next_frame()
+        if profile:
+            self.population_util.enable_instrumentation()
+        publisher = self.start_publishing(publish)
+        try:
+            if record is not None:
+                from src.recorder import TimeSeriesRecorder
+                resume_frame = start_frame if resume is not None else None
+                with TimeSeriesRecorder(record, resume_frame=resume_frame).attach(self.population_util):
+                    simulation.run(max(frames - start_frame, 0), start_frame, checkpoint_path=checkpoint, checkpoint_every=checkpoint_every)
+            else:
+                simulation.run(max(frames - start_frame, 0), start_frame, checkpoint_path=checkpoint, checkpoint_every=checkpoint_every)
+        finally:
+            if publisher is not None:
+                publisher.close()
+        simulation.save(out)
+        print(simulation.get_final_counts())
+        if profile:
+            print(self.population_util.timer.report())
+        if trace is not None:
+            from src.tracing import InfectionTrace
+            infections = InfectionTrace.from_population(self.population_util.population)
+            infections.save(trace)
+            print("Saved the infections of " + str(len(infections)) + " persons to " + trace)
+
+    def runTiled(self, frames: int, out: str, tiles: list, workers: int = None, seed: int = None) -> None:
+        """
+        Function to run the simulation headless with the space split into tiles simulated by worker processes, and save the per frame counts
+        """
+        from src.domain_decomposition import DomainDecomposition
+        print("Running headless for " + str(frames) + " frames on " + str(tiles[0]) + " x " + str(tiles[1]) + " tiles, loading data from the config file")
+        self.load_config()
+        self.population_util = self.create_population_util(seed)
+        with DomainDecomposition(self.population_util, tiles=tiles, workers=workers, seed=seed) as decomposition:
+            decomposition.run(frames)
+            decomposition.save(out)
+
+    def runSweep(self, spec_path: str, frames: int, out: str, workers: int = None, seed: int = None) -> None:
+        """
+        Function to run a parameter sweep on all cores, the config file gives the values of the parameters
+        the sweep specification does not set
+        """
+        from src.sweep import ParameterSweep
+        print("Running sweep " + spec_path + " for " + str(frames) + " frames per run")
+        self.load_config()
+        sweep = ParameterSweep(self.get_population_params(), frames, workers=workers, seed=seed, backend=self.get_backend())
+        sweep.run_spec(spec_path, out)
+        print("Sweep results saved to " + out)
+
+    def runEnsemble(self, members: int, frames: int, out: str, workers: int = None, seed: int = None, plot: bool = False) -> None:
+        """
+        Function to run the config file configuration with many seeds and save the per frame mean and quantile bands
+        """
+        from src.ensemble import Ensemble
+        print("Running an ensemble of " + str(members) + " runs for " + str(frames) + " frames each")
+        self.load_config()
+        ensemble = Ensemble(self.get_population_params(), frames, members, workers=workers, seed=seed, backend=self.get_backend()).run()
+        ensemble.save(out)
+        if plot:
+            import matplotlib.pyplot as plt
+            ensemble.plot()
+            plt.show()
+
+    def runMetapopulation(self, spec_path: str, frames: int, out: str, workers: int = None, seed: int = None) -> None:
+        """
+        Function to run the regions described by a JSON file, linked by their travel matrix, and save the per region counts
+        """
+        from src.metapopulation import Metapopulation
+        self.load_config()
+        metapopulation = Metapopulation.from_spec_file(spec_path, self.get_population_params(), workers=workers, seed=seed,
+                                                        backend=self.get_backend())
+        days = -(-frames // metapopulation.frames_per_day)
+        print("Running metapopulation " + spec_path + " for " + str(days) + " days of " + str(metapopulation.frames_per_day) + " frames")
+        with metapopulation:
+            metapopulation.run(days)
+            metapopulation.save(out)
 
     def runUI(self) -> None:
         """
         Function to execute helper UI
         """
+        from gui.gui_main import main
         main()
 
 
+def parse_args(argv: list) -> argparse.Namespace:
+    """
+    Parses the command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Viral Diseases Simulator")
+    parser.add_argument("--disable-UI", dest="disable_ui", action="store_true", help="Run the simulation window without the helper GUI")
+    parser.add_argument("--render", metavar="PATH", help="Render the simulation to PATH/render.mp4 without showing any UI")
+    parser.add_argument("--headless", action="store_true", help="Run without any UI or plotting and save the per frame counts")
+    parser.add_argument("--sweep", metavar="SPEC", help="Run the parameter sweep described by the JSON file SPEC and save the results as CSV")
+    parser.add_argument("--ensemble", metavar="M", type=int, help="Run the config file configuration with M seeds and save the per frame bands")
+    parser.add_argument("--metapopulation", metavar="SPEC", help="Run the regions and travel matrix described by the JSON file SPEC and save the per region counts")
+    parser.add_argument("--plot", action="store_true", help="Plot the bands after an ensemble run")
+    parser.add_argument("--frames", type=int, default=1000, help="Number of frames to simulate in headless, render, sweep, ensemble and metapopulation mode")
+    parser.add_argument("--out", help="Output file, defaults to results.npz in headless mode, sweep.csv in sweep mode, ensemble.npz in ensemble mode and metapopulation.npz in metapopulation mode")
+    parser.add_argument("--workers", type=int, help="Number of worker processes, defaults to the number of cores, 1 renders in a single process")
+    parser.add_argument("--seed", type=int, help="Seed for the random number generators")
+    parser.add_argument("--record", metavar="PATH", help="Stream the per frame numbers to PATH, a .csv, .npz or .parquet file. With --resume the rows recorded before the checkpoint are kept")
+    parser.add_argument("--profile", action="store_true", help="Time the phases of every step and print them at the end, --disable-UI also shows them live")
+    parser.add_argument("--fast", action="store_true", help="Draw everybody with one scatter and blit in --disable-UI and --render mode, for large populations")
+    parser.add_argument("--trace", metavar="PATH", help="Save who infected whom to PATH, a .csv, .npz or .graphml file, at the end of a headless or --disable-UI run")
+    parser.add_argument("--publish", metavar="NAME", help="Publish the state of a headless or --disable-UI run to the shared memory segment NAME after every frame")
+    parser.add_argument("--backend", choices=["numpy", "numba", "auto"], help="Kernels used to move and infect the persons, numba needs Numba and falls back to numpy without it. Defaults to numpy, or to the kernels of the checkpoint with --resume")
+    parser.add_argument("--tiles", nargs=2, type=int, metavar=("NX", "NY"), help="Split the space into NX x NY tiles simulated by --workers processes in headless mode")
+    parser.add_argument("--checkpoint", metavar="PATH", help="Periodically save the full simulation state to PATH in headless mode")
+    parser.add_argument("--checkpoint-every", dest="checkpoint_every", type=int, default=100, help="Number of frames between two checkpoints")
+    parser.add_argument("--resume", metavar="PATH", help="Continue the headless run saved in the checkpoint PATH up to --frames frames")
+    parser.add_argument("--storage-dir", dest="storage_dir", metavar="DIR", help="Keep the persons in memory mapped files in DIR in headless mode, for populations larger than the memory")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
+    # Needed by the worker processes of packaged binaries, which are started with the spawn method
+    multiprocessing.freeze_support()
+    args = parse_args(sys.argv[1:])
     m = Main()
-    if len(sys.argv) > 1 and sys.argv[1] == "--disable-UI":
-        m.runNoUI()
-    elif len(sys.argv) > 1 and sys.argv[1] == "--render":
-        path = sys.argv[2]
-        m.render(path=path)
+    m.backend = args.backend
+    if args.sweep is not None:
+        m.runSweep(args.sweep, frames=args.frames, out=args.out or "sweep.csv", workers=args.workers, seed=args.seed)
+    elif args.ensemble is not None:
+        m.runEnsemble(args.ensemble, frames=args.frames, out=args.out or "ensemble.npz", workers=args.workers, seed=args.seed, plot=args.plot)
+    elif args.metapopulation is not None:
+        m.runMetapopulation(args.metapopulation, frames=args.frames, out=args.out or "metapopulation.npz", workers=args.workers, seed=args.seed)
+    elif args.headless and args.tiles is not None:
+        m.runTiled(frames=args.frames, out=args.out or "results.npz", tiles=args.tiles, workers=args.workers, seed=args.seed)
+    elif args.headless or args.resume is not None:
+        m.runHeadless(frames=args.frames, out=args.out or "results.npz", seed=args.seed, storage_dir=args.storage_dir,
+                        checkpoint=args.checkpoint, checkpoint_every=args.checkpoint_every, resume=args.resume, record=args.record, profile=args.profile,
+                        trace=args.trace, publish=args.publish)
+    elif args.disable_ui:
+        m.runNoUI(record=args.record, profile=args.profile, fast=args.fast, trace=args.trace, publish=args.publish)
+    elif args.render is not None:
+        m.render(path=args.render, record=args.record, fast=args.fast, frames=args.frames, workers=args.workers)
     else:
         m.runUI()
-    
-    
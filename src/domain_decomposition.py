@@ -0,0 +1,650 @@
+'''
+Spatial domain decomposition of a single population: the unit square is split
+into tiles and the persons of every tile are simulated by the worker process
+owning it. Every frame runs in three lockstep rounds:
+
+1. move: every tile moves its persons, persons who crossed a tile border are
+   handed to the tile they entered, and the infectors within sqrt(infection_range)
+   of a border are sent to the neighbouring tiles as ghosts (the halo)
+2. infect: every tile pairs its own infectors and the ghosts with its healthy
+   persons, draws the transmissions and proposes every infected person to the
+   tile owning its infector, then resolves the infections that ended
+3. accept: every tile accepts the proposals for its infectors up to their g
+   value. The persons refused by an infector without g value left are offered
+   to their next infector by id, until every infected person is accepted or
+   has no infector left. The accepted infections are applied by the move round
+   of the next frame, before anybody moves, so they count for this frame
+
+Cross border infections follow the same rules as in a single simulation, but
+with other draws and with the infectors sharing persons settled in rounds
+instead of one after the other, so a tiled run matches a single one on average
+rather than exactly. The whole epidemic is spread over all the cores
+'''
+import math
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+import numpy as np
+from src.population_util import PopulationUtil, spawn_seeds
+from src.headless import HeadlessSimulation
+from src.person_table import PersonTable
+import src.person_properties_util as index
+
+
+def get_tile_shape(workers: int) -> tuple:
+    """
+    Returns the most square x_tiles by y_tiles grid with one tile per worker
+    """
+    x_tiles = int(math.sqrt(workers))
+    while workers % x_tiles != 0:
+        x_tiles -= 1
+    return workers // x_tiles, x_tiles
+
+
+class TileGrid():
+    """
+    Geometry of the tiles. Tile number tx * y_tiles + ty covers the tx-th column and ty-th row of the space,
+    persons outside the bounds belong to the border tiles
+    """
+
+    def __init__(self, x_tiles: int, y_tiles: int, reach: float, x_bounds: list = [0, 1], y_bounds: list = [0, 1]):
+        """
+        Constructor to set up the tiles
+
+        Parameters
+        ----------
+        :param x_tiles: Number of tiles along the x axis
+        :param y_tiles: Number of tiles along the y axis
+        :param reach: Width of the halo, the half width of the infection box, at most the size of a tile
+        :param x_bounds: List containing the lower and upper bound for the x axis
+        :param y_bounds: List containing the lower and upper bound for the y axis
+        """
+        self.x_tiles = x_tiles
+        self.y_tiles = y_tiles
+        self.reach   = reach
+        self.x_edges = np.linspace(x_bounds[0], x_bounds[1], x_tiles + 1)
+        self.y_edges = np.linspace(y_bounds[0], y_bounds[1], y_tiles + 1)
+        if reach > min(np.diff(self.x_edges).min(), np.diff(self.y_edges).min()):
+            raise ValueError("Tiles must be larger than the infection range, use fewer tiles")
+
+    def __len__(self) -> int:
+        return self.x_tiles * self.y_tiles
+
+    def get_columns(self, x: np.ndarray, y: np.ndarray) -> tuple:
+        """
+        Returns the tile column and row of every position
+        """
+        tx = np.clip(np.searchsorted(self.x_edges, x, side="right") - 1, 0, self.x_tiles - 1)
+        ty = np.clip(np.searchsorted(self.y_edges, y, side="right") - 1, 0, self.y_tiles - 1)
+        return tx, ty
+
+    def tile_of(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """
+        Returns the tile owning every position
+        """
+        tx, ty = self.get_columns(x, y)
+        return tx * self.y_tiles + ty
+
+    def get_halo(self, x: np.ndarray, y: np.ndarray) -> tuple:
+        """
+        Finds the neighbouring tiles whose infection boxes reach every position, that is the tiles other than
+        the owner which have a border less than reach away on both axes
+
+        Parameters
+        ----------
+        :param x: The x coordinates
+        :param y: The y coordinates
+
+        :return Tuple of the position index and the tile of every (position, neighbouring tile) pair
+        """
+        tx, ty = self.get_columns(x, y)
+        points = []
+        tiles = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                if dx == 0 and dy == 0:
+                    continue
+                nx = tx + dx
+                ny = ty + dy
+                valid = (nx >= 0) & (nx < self.x_tiles) & (ny >= 0) & (ny < self.y_tiles)
+                nx = np.clip(nx, 0, self.x_tiles - 1)
+                ny = np.clip(ny, 0, self.y_tiles - 1)
+                near = (valid &
+                        (self.x_edges[nx] - self.reach < x) & (self.x_edges[nx + 1] + self.reach > x) &
+                        (self.y_edges[ny] - self.reach < y) & (self.y_edges[ny + 1] + self.reach > y))
+                points.append(np.flatnonzero(near))
+                tiles.append((nx * self.y_tiles + ny)[near])
+        return np.concatenate(points), np.concatenate(tiles)
+
+
+def group_by(keys: np.ndarray, *arrays) -> dict:
+    """
+    Splits arrays by key, keeping their order inside every group
+
+    :return Dictionary from key to the tuple of the arrays of that key
+    """
+    order = np.argsort(keys, kind="stable")
+    unique, starts = np.unique(keys[order], return_index=True)
+    ends = np.append(starts[1:], len(order))
+    return {int(key): tuple(array[order[start:end]] for array in arrays) for key, start, end in zip(unique, starts, ends)}
+
+
+class Tile():
+    """
+    The persons of one tile, simulated by a PopulationUtil whose persons are replaced by the ones of the tile
+    """
+
+    def __init__(self, tile: int, grid: TileGrid, params: dict, seed: int, persons: PersonTable, patient: int):
+        """
+        Constructor to create the simulation of the tile
+
+        Parameters
+        ----------
+        :param tile: Number of the tile
+        :param grid: The tiles
+        :param params: Keyword arguments for the PopulationUtil constructor, the size is ignored
+        :param seed: Seed of the tile
+        :param persons: The persons in the tile
+        :param patient: Id of the first infected person, who never distances
+        """
+        self.tile       = tile
+        self.grid       = grid
+        self.patient    = patient
+        self.candidates = None
+        self.offered    = None
+        self.next       = None
+        self.putil      = PopulationUtil(seed=seed, **dict(params, size=max(len(persons), 1)))
+        self.putil.destinations = self.putil.rng.uniform(low=0, high=1, size=(len(persons), 2))
+        self.putil.set_persons(persons)
+        self.putil.population.hospital_occupancy = int(np.count_nonzero(persons[:, index.hospitalized] == 1))
+        self.find_patient()
+
+    def find_patient(self):
+        """
+        Points infected_person at the first infected person when they are in the tile
+        """
+        rows = np.flatnonzero(self.putil.persons[:, index.id] == self.patient)
+        self.putil.infected_person = int(rows[0]) if len(rows) else -1
+
+    def get_rows(self, ids: np.ndarray) -> np.ndarray:
+        """
+        Returns the rows of the persons of the tile with the given ids, raises ValueError when some of them are
+        not in the tile
+        """
+        person_ids = self.putil.persons[:, index.id]
+        order = np.argsort(person_ids)
+        rows = order[np.minimum(np.searchsorted(person_ids, ids, sorter=order), len(order) - 1)]
+        if len(ids) and (len(order) == 0 or (person_ids[rows] != ids).any()):
+            raise ValueError("Persons " + str(np.setdiff1d(ids, person_ids)[:10].tolist()) + " are not in tile " + str(self.tile))
+        return rows
+
+    def get_counts(self) -> np.ndarray:
+        """
+        Returns the number of healthy, infected, immune, dead and hospitalized persons in the tile
+        """
+        return np.append(self.putil.population.get_state_counts(), self.putil.population.get_hospital_occupancy())
+
+    def apply(self, frame: int, infections: tuple) -> np.ndarray:
+        """
+        Infects the persons accepted by the tiles of their infectors and hospitalizes the first of them
+
+        Parameters
+        ----------
+        :param frame: The frame of the infections
+        :param infections: Tuple of the infector ids, the infected ids and the number of free beds given to the tile
+
+        :return The counts of the tile after the frame, see get_counts()
+        """
+        infectors, targets, beds = infections
+        rows = self.get_rows(targets)
+        persons = self.putil.persons
+        persons[rows, index.current_state] = 1
+        persons[rows, index.infected_by] = infectors
+        persons[rows, index.infected_at] = frame
+        self.putil.population.admit_to_hospital(rows[:beds])
+        return self.get_counts()
+
+    def move(self, frame: int, infections: tuple = None) -> tuple:
+        """
+        Applies the infections of the previous frame and the interventions, moves the persons and hands out the
+        ones who left the tile
+
+        Parameters
+        ----------
+        :param frame: The current frame
+        :param infections: The infections accepted in the previous frame, see apply()
+
+        :return Tuple of the counts after the previous frame (None without infections), a dictionary from tile
+                to the PersonTable of the persons who moved there, and a dictionary from tile to the ghosts sent
+                there as (id, x, y, owner tile) arrays
+        """
+        counts = self.apply(frame - 1, infections) if infections is not None else None
+        putil = self.putil
+        putil.apply_interventions(frame)
+        bounds = (np.array([putil.x_bounds]), np.array([putil.y_bounds]))
+        putil.persons = putil.movement.out_of_bounds(putil.persons, *bounds)
+        putil.persons = putil.movement.update_persons(putil.persons, putil.size, putil.speed)
+        putil.persons = putil.movement.update_pop(putil.persons)
+
+        persons = putil.persons
+        x = persons[:, index.x_axis]
+        y = persons[:, index.y_axis]
+        owner = self.grid.tile_of(x, y)
+
+        #Infectors with g value left are ghosts in the tiles their infection box reaches
+        infectors = np.flatnonzero((persons[:, index.current_state] == 1) & (persons[:, index.g_value] > 0))
+        points, tiles = self.grid.get_halo(x[infectors], y[infectors])
+        rows = infectors[points]
+        ghosts = group_by(tiles, persons[:, index.id][rows].astype(np.int64), x[rows], y[rows], owner[rows])
+
+        leaving = np.flatnonzero(owner != self.tile)
+        emigrants = {}
+        if len(leaving):
+            removed = putil.remove_persons(leaving)
+            destinations = owner[leaving]
+            order = np.argsort(destinations, kind="stable")
+            removed = removed.take(order)
+            tiles, starts = np.unique(destinations[order], return_index=True)
+            ends = np.append(starts[1:], len(order))
+            emigrants = {int(tile): removed[start:end] for tile, start, end in zip(tiles, starts, ends)}
+        return counts, emigrants, ghosts
+
+    def infect(self, frame: int, immigrants: list, ghosts: list) -> tuple:
+        """
+        Lets the immigrants in, pairs the infectors of the tile and the ghosts with the healthy persons of the
+        tile and draws the transmissions. Every infected person is proposed to the first of its infectors by id,
+        the same infector as in a single simulation, the other infectors are kept in order for offer(). Then the
+        infections that lasted long enough end
+
+        Parameters
+        ----------
+        :param frame: The current frame
+        :param immigrants: PersonTables of the persons who moved into the tile
+        :param ghosts: (id, x, y, owner tile) arrays of the infectors of the neighbouring tiles
+
+        :return Tuple of a dictionary from tile to the (infector ids, infected ids) proposed to it, and the
+                hospital occupancy of the tile
+        """
+        putil = self.putil
+        if len(immigrants):
+            putil.add_persons(PersonTable.concatenate(immigrants))
+            if putil.infected_person < 0:
+                self.find_patient()
+
+        persons = putil.persons
+        infectors = np.flatnonzero(persons[:, index.current_state] == 1)
+        able = infectors[persons[:, index.g_value][infectors] > 0]
+        ids = np.concatenate([persons[:, index.id][able].astype(np.int64)] + [ghost[0] for ghost in ghosts])
+        x = np.concatenate([persons[:, index.x_axis][able]] + [ghost[1] for ghost in ghosts])
+        y = np.concatenate([persons[:, index.y_axis][able]] + [ghost[2] for ghost in ghosts])
+        owners = np.concatenate([np.full(len(able), self.tile, dtype=np.int64)] + [ghost[3] for ghost in ghosts])
+
+        virus = putil.virus
+        virus.update_index(persons)
+        susceptible = (persons[:, index.current_state] == 0) & (persons[:, index.social_distance] == 0)
+        offsets, targets = virus.spatial_index.neighbours(x, y, math.sqrt(virus.infection_range), susceptible)
+        owner = np.repeat(np.arange(len(ids)), np.diff(offsets))
+        hit = virus.rng.uniform(low = 0.0001, high = 1, size = len(targets)) < persons[:, index.susceptibility][targets]
+        owner, targets = owner[hit], targets[hit]
+
+        #The infectors of every infected person by id, the first one gets the proposal
+        target_ids = persons[:, index.id][targets].astype(np.int64)
+        order = np.lexsort((ids[owner], target_ids))
+        self.candidates = (target_ids[order], ids[owner][order], owners[owner][order])
+        self.offered, first = np.unique(self.candidates[0], return_index=True)
+        self.next = first
+        proposals = self.offer(self.offered)
+
+        virus.resolve_infections(putil.population, infectors, frame)
+        return proposals, putil.population.get_hospital_occupancy()
+
+    def offer(self, refused: np.ndarray) -> dict:
+        """
+        Proposes every infected person to its next infector by id, after the previous one refused it
+
+        Parameters
+        ----------
+        :param refused: Ids of the infected persons to propose again
+
+        :return Dictionary from tile to the (infector ids, infected ids) proposed to it, for the infected persons
+                with an infector left
+        """
+        target_ids, infector_ids, tiles = self.candidates
+        positions = np.searchsorted(self.offered, refused)
+        pairs = self.next[positions]
+        left = (pairs < len(target_ids)) & (target_ids[np.minimum(pairs, len(target_ids) - 1)] == refused)
+        pairs = pairs[left]
+        self.next[positions[left]] += 1
+        return group_by(tiles[pairs], infector_ids[pairs], target_ids[pairs])
+
+    def accept(self, proposals: list) -> tuple:
+        """
+        Accepts the proposed infections of the infectors of the tile, the first ones by infected id up to the g
+        value of every infector
+
+        Parameters
+        ----------
+        :param proposals: (infector ids, infected ids, tile of the infected persons) arrays from every tile
+
+        :return Tuple of a dictionary from tile to the accepted (infector ids, infected ids), ordered by infector
+                and infected, and a dictionary from tile to the ids of the refused infected persons
+        """
+        if len(proposals) == 0:
+            return {}, {}
+        infectors = np.concatenate([proposal[0] for proposal in proposals])
+        targets = np.concatenate([proposal[1] for proposal in proposals])
+        tiles = np.concatenate([proposal[2] for proposal in proposals])
+        order = np.lexsort((targets, infectors))
+        infectors, targets, tiles = infectors[order], targets[order], tiles[order]
+
+        rows = self.get_rows(infectors)
+        g_value = self.putil.persons[:, index.g_value]
+        rank = np.arange(len(rows)) - np.searchsorted(infectors, infectors)
+        keep = rank < g_value[rows]
+        np.subtract.at(g_value, rows[keep], 1)
+        refused = {tile: ids for tile, (ids,) in group_by(tiles[~keep], targets[~keep]).items()}
+        return group_by(tiles[keep], infectors[keep], targets[keep]), refused
+
+    def get_persons(self) -> PersonTable:
+        """
+        Returns the persons of the tile
+        """
+        return self.putil.persons
+
+
+class TileShard():
+    """
+    The tiles simulated by one worker process, every command is run on each of them
+    """
+
+    def __init__(self, tiles: dict):
+        """
+        Constructor to create the tiles
+
+        Parameters
+        ----------
+        :param tiles: Dictionary from tile number to the arguments of the Tile constructor
+        """
+        self.tiles = {tile: Tile(*args) for tile, args in tiles.items()}
+
+    def call(self, command: str, args: dict) -> dict:
+        """
+        Runs a method of every tile that has arguments
+
+        Parameters
+        ----------
+        :param command: Name of the Tile method
+        :param args: Dictionary from tile number to the tuple of arguments
+
+        :return Dictionary from tile number to the result
+        """
+        return {tile: getattr(self.tiles[tile], command)(*tile_args) for tile, tile_args in args.items()}
+
+
+def serve_tiles(connection, tiles: dict):
+    """
+    Body of a worker process: creates its tiles and answers every (command, args) message with
+    ("ok", TileShard.call()) until it receives None. Errors are answered with ("error", traceback)
+    """
+    try:
+        shard = TileShard(tiles)
+        connection.send(("ok", None))
+        while True:
+            message = connection.recv()
+            if message is None:
+                break
+            connection.send(("ok", shard.call(*message)))
+    except Exception:
+        connection.send(("error", traceback.format_exc()))
+    finally:
+        connection.close()
+
+
+class DomainDecomposition():
+    """
+    A single population split into tiles simulated in parallel by worker processes
+    """
+
+    def __init__(self, population_util: PopulationUtil, tiles: tuple = None, workers: int = None, seed = None):
+        """
+        Constructor to set the population and the tiles, the workers are started by start()
+
+        Parameters
+        ----------
+        :param population_util: The simulation to split, it is run from its current state. Its persons are
+                                 handed to the workers by start() and are not updated afterwards
+        :param tiles: Number of tiles along the x and the y axis, defaults to one tile per worker
+        :param workers: Number of worker processes, defaults to the number of cores or of tiles, 1 simulates all
+                        the tiles in this process
+        :param seed: Seed from which the seed of every tile is derived, see spawn_seeds()
+        """
+        self.putil    = population_util
+        self.workers  = workers or (tiles[0] * tiles[1] if tiles is not None else os.cpu_count())
+        x_tiles, y_tiles = tiles if tiles is not None else get_tile_shape(self.workers)
+        self.grid     = TileGrid(x_tiles, y_tiles, math.sqrt(population_util.virus.infection_range),
+                                    population_util.x_bounds, population_util.y_bounds)
+        self.workers  = max(1, min(self.workers, len(self.grid)))
+        self.seeds    = spawn_seeds(seed, len(self.grid))
+        self.capacity = population_util.total_healthcare_capacity
+        self.owner    = [tile % self.workers for tile in range(len(self.grid))]
+        self.frame    = population_util.frame + 1
+        self.pending  = None
+        self.counts   = np.zeros((0, len(HeadlessSimulation.columns)), dtype=np.int64)
+        self.connections = []
+        self.processes   = []
+        self.local_shard = None
+
+    def split(self) -> list:
+        """
+        Splits the persons of the population by tile
+
+        :return List with the arguments of the Tile constructor of every tile
+        """
+        putil = self.putil
+        persons = putil.persons
+        tiles = self.grid.tile_of(persons[:, index.x_axis], persons[:, index.y_axis])
+        params = dict(putil.get_params(), backend=putil.backend)
+        patient = int(persons[putil.infected_person, index.id]) if putil.infected_person >= 0 else -1
+        return [(tile, self.grid, params, self.seeds[tile], persons.take(tiles == tile), patient)
+                for tile in range(len(self.grid))]
+
+    def start(self) -> "DomainDecomposition":
+        """
+        Hands the tiles to one worker process each, or keeps them in this process with a single worker
+
+        :return The decomposition itself
+        """
+        args = self.split()
+        if self.workers == 1:
+            self.local_shard = TileShard(dict(enumerate(args)))
+            return self
+
+        context = multiprocessing.get_context("spawn")
+        for worker in range(self.workers):
+            tiles = {tile: args[tile] for tile in range(len(args)) if self.owner[tile] == worker}
+            connection, child = context.Pipe()
+            process = context.Process(target=serve_tiles, args=(child, tiles), daemon=True)
+            process.start()
+            child.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+        for connection in self.connections:
+            self.receive(connection)
+        return self
+
+    def receive(self, connection):
+        """
+        Returns the answer of a worker, raises RuntimeError when the worker failed
+        """
+        try:
+            status, result = connection.recv()
+        except EOFError:
+            raise RuntimeError("A domain decomposition worker stopped")
+        if status == "error":
+            raise RuntimeError("A domain decomposition worker failed:\n" + result)
+        return result
+
+    def call(self, command: str, args: dict) -> dict:
+        """
+        Runs a Tile method on the tiles with arguments, all the workers at once
+
+        Parameters
+        ----------
+        :param command: Name of the Tile method
+        :param args: Dictionary from tile number to the tuple of arguments
+
+        :return Dictionary from tile number to the result
+        """
+        if self.local_shard is not None:
+            return self.local_shard.call(command, args)
+        for worker, connection in enumerate(self.connections):
+            connection.send((command, {tile: tile_args for tile, tile_args in args.items() if self.owner[tile] == worker}))
+        results = {}
+        for connection in self.connections:
+            results.update(self.receive(connection))
+        return results
+
+    def flush(self) -> np.ndarray:
+        """
+        Applies the infections accepted in the last frame, which are otherwise applied by the next move round
+
+        :return The counts after the last frame, summed over the tiles
+        """
+        counts = self.call("apply", {tile: (self.frame - 1, infections) for tile, infections in self.pending.items()})
+        self.pending = None
+        return np.sum(list(counts.values()), axis=0)
+
+    def step(self) -> np.ndarray:
+        """
+        Simulates one frame in the rounds described at the top of the module, the infections accepted in the
+        last round are left pending for the next one
+
+        :return The counts after the previous frame, summed over the tiles, or None when nothing was pending
+        """
+        tiles = range(len(self.grid))
+        frame = self.frame
+        pending = self.pending or {}
+        moved = self.call("move", {tile: (frame, pending.get(tile)) for tile in tiles})
+        immigrants = {tile: [] for tile in tiles}
+        ghosts = {tile: [] for tile in tiles}
+        counts = None
+        for tile in tiles:
+            tile_counts, emigrants, tile_ghosts = moved[tile]
+            if tile_counts is not None:
+                counts = tile_counts if counts is None else counts + tile_counts
+            for destination, persons in emigrants.items():
+                immigrants[destination].append(persons)
+            for destination, ghost in tile_ghosts.items():
+                ghosts[destination].append(ghost)
+
+        infected = self.call("infect", {tile: (frame, immigrants[tile], ghosts[tile]) for tile in tiles})
+        proposals = {tile: [] for tile in tiles}
+        occupancy = 0
+        for tile in tiles:
+            tile_proposals, tile_occupancy = infected[tile]
+            occupancy += tile_occupancy
+            for owner, (infectors, targets) in tile_proposals.items():
+                proposals[owner].append((infectors, targets, np.full(len(targets), tile, dtype=np.int64)))
+
+        #The persons refused by an infector without g value left go to their next infector
+        infections = {tile: [] for tile in tiles}
+        while any(proposals.values()):
+            accepted = self.call("accept", {tile: (proposals[tile],) for tile in tiles if proposals[tile]})
+            refused = {tile: [] for tile in tiles}
+            for tile_accepted, tile_refused in accepted.values():
+                for target_tile, pairs in tile_accepted.items():
+                    infections[target_tile].append(pairs)
+                for target_tile, ids in tile_refused.items():
+                    refused[target_tile].append(ids)
+            offered = self.call("offer", {tile: (np.sort(np.concatenate(ids)),) for tile, ids in refused.items() if ids})
+            proposals = {tile: [] for tile in tiles}
+            for tile, tile_proposals in offered.items():
+                for owner, (infectors, targets) in tile_proposals.items():
+                    proposals[owner].append((infectors, targets, np.full(len(targets), tile, dtype=np.int64)))
+
+        #New cases are admitted tile by tile while there are beds left
+        free_beds = max(0, math.ceil(self.capacity - occupancy))
+        self.pending = {}
+        for tile in tiles:
+            infectors = np.concatenate([pairs[0] for pairs in infections[tile]] + [np.zeros(0, dtype=np.int64)])
+            targets = np.concatenate([pairs[1] for pairs in infections[tile]] + [np.zeros(0, dtype=np.int64)])
+            beds = min(free_beds, len(targets))
+            free_beds -= beds
+            self.pending[tile] = (infectors, targets, beds)
+        self.frame += 1
+        return counts
+
+    def run(self, frames: int) -> np.ndarray:
+        """
+        Simulates the given number of frames, starting the workers when needed
+
+        Parameters
+        ----------
+        :param frames: Number of frames to simulate
+
+        :return Array with one row per frame holding the columns listed in HeadlessSimulation.columns, summed
+                over the tiles
+        """
+        if self.local_shard is None and len(self.connections) == 0:
+            self.start()
+        start = time.perf_counter()
+        counts = np.zeros((frames, len(HeadlessSimulation.columns)), dtype=np.int64)
+        counts[:, 0] = np.arange(self.frame, self.frame + frames)
+        for i in range(frames):
+            previous = self.step()
+            if i > 0:
+                counts[i - 1, 1:] = previous
+        if frames > 0:
+            counts[-1, 1:] = self.flush()
+        elapsed = time.perf_counter() - start
+        self.counts = np.concatenate((self.counts, counts))
+        print("Simulated " + str(frames) + " frames on " + str(len(self.grid)) + " tiles and " + str(self.workers) +
+                " workers in " + str(round(elapsed, 2)) + " s", file = sys.stdout)
+        return counts
+
+    def save(self, path: str):
+        """
+        Saves the counts collected so far to a .npz file, one array per column, the same as HeadlessSimulation.save()
+
+        Parameters
+        ----------
+        :param path: Path to the output file
+        """
+        np.savez(path, **{name: self.counts[:, i] for i, name in enumerate(HeadlessSimulation.columns)})
+        print("Saved " + str(len(self.counts)) + " frames to " + path, file = sys.stdout)
+
+    def get_persons(self) -> PersonTable:
+        """
+        Collects the persons of all the tiles, ordered by id
+
+        :return PersonTable holding a copy of the whole population
+        """
+        tables = self.call("get_persons", {tile: () for tile in range(len(self.grid))})
+        persons = PersonTable.concatenate([tables[tile] for tile in range(len(self.grid))])
+        return persons.take(np.argsort(persons[:, index.id], kind="stable"))
+
+    def close(self):
+        """
+        Stops the worker processes
+        """
+        for connection in self.connections:
+            try:
+                connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            connection.close()
+        for process in self.processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self.connections = []
+        self.processes = []
+        self.local_shard = None
+
+    def __enter__(self) -> "DomainDecomposition":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
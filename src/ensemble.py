@@ -0,0 +1,249 @@
+'''
+Monte Carlo ensembles: runs the same configuration with many independent seeds
+over all cores and aggregates the per frame counts into mean and quantile bands
+without keeping the individual trajectories
+'''
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from src.population_util import PopulationUtil, spawn_seeds
+from src.headless import HeadlessSimulation
+
+# Compartments aggregated by the ensemble, in the order of HeadlessSimulation.columns after the frame
+compartments = ["healthy", "infected", "immune", "dead", "hospitalized"]
+
+# Colours of the compartments, the same as in the Visualization line chart
+compartment_colors = {"healthy": "lightsteelblue", "infected": "indianred", "immune": "mediumseagreen",
+                        "dead": "indigo", "hospitalized": "silver"}
+
+
+def run_member(params: dict, frames: int, seed: int, backend: str = "numpy") -> np.ndarray:
+    """
+    Runs one member of the ensemble headless. Module level so that worker processes can pickle it
+
+    Parameters
+    ----------
+    :param params: Keyword arguments for the PopulationUtil constructor
+    :param frames: Number of frames to simulate
+    :param seed: Seed for the random number generator of the member
+    :param backend: Implementation of the kernels, see PopulationUtil
+
+    :return Array of shape (frames, len(compartments)) with the per frame counts
+    """
+    simulation = HeadlessSimulation(PopulationUtil(seed=seed, backend=backend, **params))
+    return simulation.run(frames)[:, 1:]
+
+
+class StreamingBands():
+    """
+    Accumulates trajectories one at a time into per frame sums, from which the mean and the standard deviation
+    are computed, and keeps what is needed for the quantiles. As long as there are at most as many trajectories
+    as histogram bins they are kept as they are and the quantiles are exact. After that they are replaced by a
+    per frame histogram with one bin per possible count up to max_bins bins, so memory stops growing and is never
+    more than storing the trajectories. With fewer bins than possible counts the quantiles are interpolated
+    linearly inside a bin of (size + 1) / bins persons, which is accurate to one bin width
+    """
+
+    def __init__(self, frames: int, size: int, series: int = len(compartments), max_bins: int = 1024):
+        """
+        Constructor to allocate the accumulators
+
+        Parameters
+        ----------
+        :param frames: Number of frames per trajectory
+        :param size: Largest possible count, the population size
+        :param series: Number of series per frame
+        :param max_bins: Upper bound on the number of histogram bins per frame and series
+        """
+        self.size    = size
+        self.bins    = min(size + 1, max_bins)
+        self.width   = (size + 1) / self.bins
+        self.members = 0
+        self.sums    = np.zeros((frames, series))
+        self.squares = np.zeros((frames, series))
+        self.kept    = []
+        self.hist    = None
+
+    def add(self, counts: np.ndarray):
+        """
+        Adds one trajectory
+
+        Parameters
+        ----------
+        :param counts: Array of shape (frames, series) holding the counts of the trajectory
+        """
+        self.members += 1
+        self.sums += counts
+        self.squares += counts.astype(np.float64) ** 2
+
+        if self.hist is None:
+            self.kept.append(np.asarray(counts, dtype=np.int32))
+            if len(self.kept) <= self.bins:
+                return
+            #More trajectories than bins, the histogram is smaller from now on
+            self.hist = np.zeros(self.sums.shape + (self.bins,), dtype=np.int32)
+            for kept in self.kept:
+                self.add_to_histogram(kept)
+            self.kept = None
+        else:
+            self.add_to_histogram(counts)
+
+    def add_to_histogram(self, counts: np.ndarray):
+        """
+        Counts one trajectory in the histogram
+        """
+        b = np.minimum((counts * self.bins) // (self.size + 1), self.bins - 1).astype(np.int64)
+        frame, series = np.indices(counts.shape)
+        np.add.at(self.hist, (frame, series, b), 1)
+
+    def mean(self) -> np.ndarray:
+        """
+        Returns the per frame mean of every series
+        """
+        return self.sums / max(self.members, 1)
+
+    def std(self) -> np.ndarray:
+        """
+        Returns the per frame standard deviation of every series
+        """
+        mean = self.mean()
+        return np.sqrt(np.maximum(self.squares / max(self.members, 1) - mean ** 2, 0))
+
+    def quantile(self, q: float) -> np.ndarray:
+        """
+        Returns the per frame q quantile of every series, exact while the trajectories are kept and interpolated
+        inside the histogram bins afterwards
+
+        Parameters
+        ----------
+        :param q: The quantile, between 0 and 1
+
+        :return Array of shape (frames, series)
+        """
+        if self.hist is None:
+            if self.members == 0:
+                return np.zeros(self.sums.shape)
+            return np.quantile(np.stack(self.kept), q, axis=0, method="inverted_cdf").astype(np.float64)
+
+        cumulative = np.cumsum(self.hist, axis=-1)
+        target = q * self.members
+        b = np.minimum(np.argmax(cumulative >= max(target, 1e-9), axis=-1), self.bins - 1)
+        if self.width == 1:
+            return b.astype(np.float64)
+
+        below = np.take_along_axis(cumulative, b[..., None], axis=-1)[..., 0] - np.take_along_axis(self.hist, b[..., None], axis=-1)[..., 0]
+        inside = np.maximum(np.take_along_axis(self.hist, b[..., None], axis=-1)[..., 0], 1)
+        return (b + np.clip((target - below) / inside, 0, 1)) * self.width
+
+
+class Ensemble():
+    """
+    Runs the same configuration with many independent seeds across worker processes and aggregates the results
+    """
+
+    def __init__(self, params: dict, frames: int, members: int, workers: int = None, seed: int = None,
+                    quantiles: tuple = (0.05, 0.5, 0.95), max_bins: int = 1024, backend: str = "numpy"):
+        """
+        Constructor to set the configuration of the ensemble
+
+        Parameters
+        ----------
+        :param params: Keyword arguments for the PopulationUtil constructor
+        :param frames: Number of frames to simulate per member
+        :param members: Number of members in the ensemble
+        :param workers: Number of worker processes, defaults to the number of cores
+        :param seed: Seed from which the seeds of the members are derived
+        :param quantiles: Quantiles to report, the first and the last one are plotted as the band
+        :param max_bins: Upper bound on the number of histogram bins, see StreamingBands
+        :param backend: Implementation of the kernels used by every member, see PopulationUtil
+        """
+        self.params    = params
+        self.frames    = frames
+        self.members   = members
+        self.workers   = workers or os.cpu_count()
+        self.seed      = seed
+        self.quantiles = quantiles
+        self.bands     = StreamingBands(frames, int(params["size"]), max_bins=max_bins)
+        self.backend   = backend
+
+    def run(self) -> "Ensemble":
+        """
+        Runs every member and adds its trajectory to the bands as soon as it finishes
+
+        :return The ensemble itself
+        """
+        seeds = spawn_seeds(self.seed, self.members)
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(run_member, self.params, self.frames, seed, self.backend) for seed in seeds]
+            for future in as_completed(futures):
+                self.bands.add(future.result())
+                print("Finished member " + str(self.bands.members) + " of " + str(self.members), file = sys.stdout)
+        return self
+
+    def get_bands(self) -> dict:
+        """
+        Returns the aggregated bands
+
+        :return Dictionary from compartment name to a dictionary holding the "mean", "std" and one "q<quantile>"
+                entry per quantile, each an array with one value per frame
+        """
+        mean = self.bands.mean()
+        std = self.bands.std()
+        quantiles = {q: self.bands.quantile(q) for q in self.quantiles}
+        bands = {}
+        for i, name in enumerate(compartments):
+            bands[name] = {"mean": mean[:, i], "std": std[:, i]}
+            for q in self.quantiles:
+                bands[name]["q" + str(q)] = quantiles[q][:, i]
+        return bands
+
+    def save(self, path: str):
+        """
+        Saves the bands to a .npz file, with one array per compartment and statistic named like infected_mean
+
+        Parameters
+        ----------
+        :param path: Path to the output file
+        """
+        arrays = {"frame": np.arange(self.frames), "members": np.array(self.bands.members)}
+        for name, stats in self.get_bands().items():
+            for stat, values in stats.items():
+                arrays[name + "_" + stat] = values
+        np.savez(path, **arrays)
+        print("Saved ensemble bands to " + path, file = sys.stdout)
+
+    def plot(self, ax=None, series: list = ["infected", "dead", "immune"]):
+        """
+        Plots the mean and the outer quantile band of the given compartments in the style of the line chart of
+        the Visualization
+
+        Parameters
+        ----------
+        :param ax: Matplotlib axes to plot on, a new figure is created when not given
+        :param series: Compartments to plot
+
+        :return The axes
+        """
+        import matplotlib.pyplot as plt
+        if ax is None:
+            ax = plt.figure(figsize=(6.5, 2.5)).add_subplot(1, 1, 1)
+
+        frames = np.arange(self.frames)
+        bands = self.get_bands()
+        low = "q" + str(min(self.quantiles))
+        high = "q" + str(max(self.quantiles))
+        labels = {"infected": "Currently Infected", "dead": "Total Dead", "immune": "Total Immune",
+                    "healthy": "Healthy", "hospitalized": "Hospitalized"}
+        for name in series:
+            color = compartment_colors[name]
+            ax.fill_between(frames, bands[name][low], bands[name][high], color=color, alpha=0.3, linewidth=0)
+            ax.plot(frames, bands[name]["mean"], c=color, label=labels[name])
+
+        ax.plot([0, self.frames], [self.params["total_healthcare_capacity"]] * 2, c="silver")
+        ax.set_xlim(0, self.frames)
+        ax.set_ylim(0, self.params["size"])
+        ax.tick_params(axis="y", direction="in", pad=3)
+        ax.legend(prop={'size': 8}, loc='upper right')
+        ax.set_title(str(self.bands.members) + " runs, mean and " + low[1:] + " to " + high[1:] + " quantiles", fontsize='small')
+        return ax
@@ -0,0 +1,128 @@
+'''
+Runs the simulation without any user interface or plotting, only the per frame
+numbers are collected. Must not import matplotlib, networkx, PIL or tkinter
+'''
+import sys
+import threading
+import numpy as np
+from src.population_util import PopulationUtil, write_checkpoint
+
+class HeadlessSimulation():
+    """
+    Steps a PopulationUtil in a plain loop and collects the number of persons in every compartment per frame
+    """
+
+    # Names of the collected columns, in the order they are stored
+    columns = ["frame", "healthy", "infected", "immune", "dead", "hospitalized"]
+
+    def __init__(self, population_util: PopulationUtil):
+        """
+        Constructor to set the population util to run
+
+        Parameters
+        ----------
+        :param population_util: PopulationUtil object holding the simulation to run
+        """
+        self.putil             = population_util
+        self.counts            = np.zeros((0, len(self.columns)), dtype=np.int64)
+        self.checkpoint_writer = None
+
+    @classmethod
+    def from_checkpoint(cls, path: str, storage_dir: str = None, backend: str = None) -> "HeadlessSimulation":
+        """
+        Restores a headless simulation, including the counts collected so far, from a checkpoint written by run()
+
+        Parameters
+        ----------
+        :param path: Path to the checkpoint file
+        :param storage_dir: Directory for memory mapped person columns, see PopulationUtil
+        :param backend: Implementation of the kernels, defaults to the backend of the original run, see
+                        PopulationUtil.from_checkpoint()
+
+        :return The restored simulation, run(frames, start_frame=simulation.next_frame()) continues it
+        """
+        simulation = cls(PopulationUtil.from_checkpoint(path, storage_dir, backend))
+        with np.load(path, allow_pickle=False) as checkpoint:
+            if "counts" in checkpoint:
+                simulation.counts = checkpoint["counts"]
+        return simulation
+
+    def next_frame(self) -> int:
+        """
+        Returns the frame following the last simulated one
+        """
+        return self.putil.frame + 1
+
+    def run(self, frames: int, start_frame: int = 0, checkpoint_path: str = None, checkpoint_every: int = 0) -> np.ndarray:
+        """
+        Runs the simulation for the given number of frames
+
+        Parameters
+        ----------
+        :param frames: Number of frames to simulate
+        :param start_frame: The first frame to simulate
+        :param checkpoint_path: Path of the checkpoint file, overwritten every checkpoint_every frames and after
+                                the last frame
+        :param checkpoint_every: Number of frames between two checkpoints
+
+        :return Array with one row per frame holding the columns listed in HeadlessSimulation.columns
+        """
+        counts = np.zeros((frames, len(self.columns)), dtype=np.int64)
+        for i, frame in enumerate(range(start_frame, start_frame + frames)):
+            self.putil.move(frame)
+            counts[i, 0] = frame
+            counts[i, 1:5] = self.putil.population.get_state_counts()
+            counts[i, 5] = self.putil.population.get_hospital_occupancy()
+
+            if checkpoint_path is not None and checkpoint_every > 0 and (i + 1) % checkpoint_every == 0 and i + 1 < frames:
+                self.checkpoint(checkpoint_path, np.concatenate((self.counts, counts[:i + 1])))
+
+        self.counts = np.concatenate((self.counts, counts))
+        if checkpoint_path is not None:
+            self.checkpoint(checkpoint_path, self.counts)
+            self.wait_for_checkpoint()
+        self.putil.population.get_person().flush()
+        return counts
+
+    def checkpoint(self, path: str, counts: np.ndarray):
+        """
+        Snapshots the simulation and writes the snapshot in a background thread, so the compression does not
+        stall the next frames. Waits for the previous checkpoint first, only one is written at a time
+
+        Parameters
+        ----------
+        :param path: Path to the checkpoint file
+        :param counts: The counts collected up to the snapshot, stored with it
+        """
+        state = self.putil.get_checkpoint()
+        state["counts"] = counts
+        self.wait_for_checkpoint()
+        self.checkpoint_writer = threading.Thread(target=write_checkpoint, args=(path, state), daemon=True)
+        self.checkpoint_writer.start()
+
+    def wait_for_checkpoint(self):
+        """
+        Blocks until the checkpoint being written, if any, is on disk
+        """
+        if self.checkpoint_writer is not None:
+            self.checkpoint_writer.join()
+            self.checkpoint_writer = None
+
+    def get_final_counts(self) -> dict:
+        """
+        Returns the counts of the last simulated frame
+
+        :return Dictionary from column name to count
+        """
+        return dict(zip(self.columns, self.counts[-1].tolist()))
+
+    def save(self, path: str):
+        """
+        Saves the collected counts to a .npz file, one array per column
+
+        Parameters
+        ----------
+        :param path: Path to the output file
+        """
+        np.savez(path, **{name: self.counts[:, i] for i, name in enumerate(self.columns)})
+        print("Saved " + str(len(self.counts)) + " frames to " + path, file = sys.stdout)
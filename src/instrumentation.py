@@ -0,0 +1,101 @@
+'''
+Opt-in instrumentation of the simulation step: wall time and calls per phase
+of PopulationUtil.move() and counters of the work done by the virus
+'''
+import time
+
+
+class PhaseTimer():
+    """
+    Accumulates the wall time of consecutive phases. start() marks the beginning of a step and every lap(phase)
+    charges the time since the previous mark to that phase, so the phases of a step add up to the whole step
+    """
+
+    def __init__(self):
+        """
+        Constructor to initialize empty accumulators
+        """
+        self.reset()
+
+    def reset(self):
+        """
+        Clears all the accumulated times, calls and counters
+        """
+        self.times    = {}
+        self.calls    = {}
+        self.counters = {}
+        self.steps    = 0
+        self.last     = None
+
+    def start(self):
+        """
+        Marks the beginning of a step
+        """
+        self.steps += 1
+        self.last = time.perf_counter()
+
+    def lap(self, phase: str):
+        """
+        Charges the time since the previous mark to the given phase
+
+        Parameters
+        ----------
+        :param phase: Name of the phase that just finished
+        """
+        now = time.perf_counter()
+        self.times[phase] = self.times.get(phase, 0.0) + now - self.last
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+        self.last = now
+
+    def count(self, name: str, value: int):
+        """
+        Adds to a counter
+
+        Parameters
+        ----------
+        :param name: Name of the counter
+        :param value: Amount to add
+        """
+        self.counters[name] = self.counters.get(name, 0) + int(value)
+
+    def get_stats(self) -> dict:
+        """
+        Returns the accumulated statistics
+
+        :return Dictionary holding the number of steps, the total time, one entry per phase with its total time,
+                calls, mean time per call and share of the total time, and the counters
+        """
+        total = sum(self.times.values())
+        phases = {}
+        for phase, seconds in self.times.items():
+            phases[phase] = {"total_s": seconds, "calls": self.calls[phase],
+                                "mean_ms": 1000 * seconds / self.calls[phase],
+                                "share": seconds / total if total > 0 else 0.0}
+        return {"steps": self.steps, "total_s": total, "mean_step_ms": 1000 * total / max(self.steps, 1),
+                "phases": phases, "counters": dict(self.counters)}
+
+    def summary(self, top: int = None) -> str:
+        """
+        Returns a one line summary of the mean step time and the phases taking the most time
+
+        Parameters
+        ----------
+        :param top: Number of phases to list, all of them when not given
+        """
+        stats = self.get_stats()
+        phases = sorted(stats["phases"].items(), key=lambda item: -item[1]["total_s"])[:top]
+        return "Step %.1f ms: " % stats["mean_step_ms"] + ", ".join(
+                    "%s %d%%" % (phase, round(100 * values["share"])) for phase, values in phases)
+
+    def report(self) -> str:
+        """
+        Returns a table of all the phases and counters, to print at the end of a run
+        """
+        stats = self.get_stats()
+        lines = ["%d steps, %.3f s, %.3f ms per step" % (stats["steps"], stats["total_s"], stats["mean_step_ms"])]
+        for phase, values in sorted(stats["phases"].items(), key=lambda item: -item[1]["total_s"]):
+            lines.append("  %-20s %10.3f s %8d calls %10.3f ms/call %6.1f%%" %
+                            (phase, values["total_s"], values["calls"], values["mean_ms"], 100 * values["share"]))
+        for name, value in stats["counters"].items():
+            lines.append("  %-20s %10d total %14.1f per step" % (name, value, value / max(stats["steps"], 1)))
+        return "\n".join(lines)
@@ -0,0 +1,164 @@
+'''
+Compiled kernels for the hot loops of a frame: moving the persons, turning
+them around at the bounds and infecting the healthy persons around every
+infector. Every kernel is a single loop over the person columns that updates
+them in place, without the temporary arrays of the NumPy code in movements.py
+and virus_util.py. The kernels are compiled with Numba when it is installed,
+without it they still run as plain Python, which is only fast enough for tests
+'''
+import sys
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Names accepted for the backend argument of PopulationUtil, Movement and Virus
+backends = ["numpy", "numba"]
+
+
+def jit(function):
+    """
+    Compiles a kernel with Numba when it is installed, returns it unchanged otherwise
+    """
+    if numba is None:
+        return function
+    return numba.njit(cache=True, nogil=True)(function)
+
+
+def is_available() -> bool:
+    """
+    Returns whether the kernels are compiled, that is whether Numba is installed
+    """
+    return numba is not None
+
+
+def resolve_backend(backend: str = "numpy") -> str:
+    """
+    Returns the backend to use for the requested one: "auto" picks "numba" when it is installed, "numba" falls
+    back to "numpy" when it is not
+
+    Parameters
+    ----------
+    :param backend: "numpy", "numba" or "auto"
+
+    :return "numpy" or "numba"
+    """
+    if backend == "auto":
+        return "numba" if is_available() else "numpy"
+    if backend not in backends:
+        raise ValueError("Unknown backend: " + str(backend) + ", expected one of " + ", ".join(backends + ["auto"]))
+    if backend == "numba" and not is_available():
+        print("Numba is not installed, using the numpy backend", file = sys.stdout)
+        return "numpy"
+    return backend
+
+
+@jit
+def move(x, y, x_dir, y_dir, speed, state, social_distance):
+    """
+    Moves every person who is alive and not socially distancing by their direction times their speed, see
+    Movement.update_pop()
+    """
+    for i in range(len(x)):
+        if state[i] != 3 and social_distance[i] == 0:
+            x[i] += x_dir[i] * speed[i]
+            y[i] += y_dir[i] * speed[i]
+
+
+@jit
+def bounce(position, direction, bounds, rng):
+    """
+    Turns around the persons who are at or beyond a bound and still heading out of it, along one axis, see
+    Movement.out_of_bounds()
+
+    Parameters
+    ----------
+    :param position: Position of every person along the axis
+    :param direction: Direction of every person along the axis, updated in place
+    :param bounds: One [low, high] row per person or a single row shared by everyone
+    :param rng: Generator to draw the new directions from
+    """
+    shared = len(bounds) == 1
+    for i in range(len(position)):
+        row = 0 if shared else i
+        if position[i] <= bounds[row, 0] and direction[i] < 0:
+            direction[i] = min(max(rng.normal(0.5, 0.5 / 3), 0.05), 1.0)
+        elif position[i] >= bounds[row, 1] and direction[i] > 0:
+            direction[i] = min(max(-rng.normal(0.5, 0.5 / 3), -1.0), -0.05)
+
+
+@jit
+def infect(x, y, state, social_distance, susceptibility, g_value, infected_by, infected_at, ids, infectors,
+            order, cell_start, sorted_x, sorted_y, x_min, y_min, cell_w, cell_h, x_cells, y_cells,
+            reach, frame, rng, targets):
+    """
+    Lets the infectors infect the healthy persons around them one after the other, in the order of infectors.
+    The candidates of every infector are read from the cells of a SpatialGrid around it, each one that is
+    healthy, not socially distancing and strictly inside the infection box is infected with its susceptibility
+    as chance, until the g value of the infector runs out. The newly infected persons are marked as infected so
+    later infectors skip them, the same as Virus.transmit() gives a target to the first infector
+
+    Parameters
+    ----------
+    :param ids: Id of every person, written to infected_by
+    :param targets: Array receiving the rows of the newly infected persons, in the order they were infected,
+                    needs room for every healthy person that can be infected
+
+    :return Tuple of the number of newly infected persons and the number of candidate pairs scanned
+    """
+    infections = 0
+    pairs = 0
+    for infector in infectors:
+        budget = g_value[infector]
+        if budget <= 0:
+            continue
+        px = x[infector]
+        py = y[infector]
+        cx = min(max(int(np.floor((px - x_min) / cell_w)), 0), x_cells - 1)
+        cy = min(max(int(np.floor((py - y_min) / cell_h)), 0), y_cells - 1)
+        lo = max(cy - 1, 0)
+        hi = min(cy + 1, y_cells - 1)
+        for column in range(max(cx - 1, 0), min(cx + 1, x_cells - 1) + 1):
+            for k in range(cell_start[column * y_cells + lo], cell_start[column * y_cells + hi + 1]):
+                target = order[k]
+                if state[target] != 0 or social_distance[target] != 0:
+                    continue
+                if not (px - reach < sorted_x[k] < px + reach and py - reach < sorted_y[k] < py + reach):
+                    continue
+                pairs += 1
+                if rng.uniform(0.0001, 1.0) < susceptibility[target]:
+                    state[target] = 1
+                    infected_by[target] = ids[infector]
+                    infected_at[target] = frame
+                    targets[infections] = target
+                    infections += 1
+                    budget -= 1
+                    if budget == 0:
+                        break
+            if budget == 0:
+                break
+        g_value[infector] = budget
+    return infections, pairs
+
+
+@jit
+def nearby(x, y, state, social_distance, ids, rows, x_low, x_high, y_low, y_high, selected):
+    """
+    Collects the ids of the persons among rows who are healthy, not socially distancing and strictly inside the
+    box, see Virus.find_nearby()
+
+    Parameters
+    ----------
+    :param selected: Array receiving the ids, needs room for every row
+
+    :return Number of ids written to selected
+    """
+    count = 0
+    for row in rows:
+        if (state[row] == 0 and social_distance[row] == 0 and
+                x_low < x[row] < x_high and y_low < y[row] < y_high):
+            selected[count] = ids[row]
+            count += 1
+    return count
@@ -0,0 +1,371 @@
+'''
+Metapopulation mode: a network of regions, such as cities, each one a
+PopulationUtil on its own unit square, linked by a travel matrix. The regions
+are sharded across worker processes that simulate them in lockstep one day at a
+time; at the end of every day the travellers of every region are taken out as
+one PersonTable per destination and handed to the worker owning the
+destination before the next day starts. Every region has its own seed, so the
+result does not depend on the number of workers
+'''
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+import numpy as np
+from src.population_util import PopulationUtil, spawn_seeds
+from src.headless import HeadlessSimulation
+from src.person_table import PersonTable
+import src.person_properties_util as index
+
+
+def get_travellers(population_util: PopulationUtil) -> np.ndarray:
+    """
+    Returns the rows of the persons who can travel: alive, not hospitalized, not socially distancing and not
+    the first infected person of the region
+
+    Parameters
+    ----------
+    :param population_util: The region
+
+    :return Rows of the persons who can travel, in ascending order
+    """
+    persons = population_util.persons
+    can_travel = ((persons[:, index.current_state] != 3) & (persons[:, index.hospitalized] != 1) &
+                    (persons[:, index.social_distance] == 0))
+    if population_util.infected_person >= 0:
+        can_travel[population_util.infected_person] = False
+    return np.flatnonzero(can_travel)
+
+
+class Shard():
+    """
+    The regions simulated by one worker process
+    """
+
+    def __init__(self, regions: list, params: list, seeds: list, first_ids: list, travel: np.ndarray,
+                    backend: str = "numpy"):
+        """
+        Constructor to create the regions of the shard
+
+        Parameters
+        ----------
+        :param regions: Numbers of the regions of the shard
+        :param params: Keyword arguments for the PopulationUtil constructor of every region of the shard
+        :param seeds: Seed of every region of the shard
+        :param first_ids: Id of the first person of every region of the shard, ids are unique over all the regions
+        :param travel: Rows of the travel matrix of the regions of the shard
+        :param backend: Implementation of the kernels, see PopulationUtil
+        """
+        self.travel      = dict(zip(regions, travel))
+        self.simulations = {}
+        for region, region_params, seed, first_id in zip(regions, params, seeds, first_ids):
+            population_util = PopulationUtil(seed=seed, backend=backend, **region_params)
+            persons = population_util.persons
+            persons[:, index.id] += first_id
+            infected = persons[:, index.infected_by] != -1
+            persons[:, index.infected_by][infected] += first_id
+            self.simulations[region] = HeadlessSimulation(population_util)
+
+    def step(self, first_frame: int, frames: int, arrivals: dict) -> tuple:
+        """
+        Lets the arrivals in, simulates one day of every region and takes the travellers out
+
+        Parameters
+        ----------
+        :param first_frame: First frame of the day
+        :param frames: Number of frames in a day
+        :param arrivals: Dictionary from region to the list of PersonTables arriving there
+
+        :return Tuple of a dictionary from region to the counts of the day, see HeadlessSimulation.run(), and a
+                dictionary from (origin, destination) to the PersonTable of the travellers
+        """
+        for region, batches in arrivals.items():
+            self.arrive(self.simulations[region].putil, PersonTable.concatenate(batches))
+
+        counts = {region: simulation.run(frames, first_frame) for region, simulation in self.simulations.items()}
+        departures = {}
+        for region, simulation in self.simulations.items():
+            departures.update(self.depart(region, simulation.putil))
+        return counts, departures
+
+    def arrive(self, population_util: PopulationUtil, persons: PersonTable):
+        """
+        Adds travellers to a region at random positions, heading in a new direction
+        """
+        size = len(persons)
+        persons[:, index.x_axis] = population_util.rng.uniform(*population_util.x_bounds, size=size)
+        persons[:, index.y_axis] = population_util.rng.uniform(*population_util.y_bounds, size=size)
+        population_util.movement.update_persons(persons, size, population_util.speed, 1)
+        population_util.add_persons(persons)
+
+    def depart(self, region: int, population_util: PopulationUtil) -> dict:
+        """
+        Draws the destination of every person who can travel from the travel matrix and takes the travellers out
+
+        Parameters
+        ----------
+        :param region: The region
+        :param population_util: The simulation of the region
+
+        :return Dictionary from (region, destination) to the PersonTable of the travellers, only for the
+                destinations with at least one traveller
+        """
+        rates = self.travel[region].copy()
+        rates[region] = 0
+        travellers = get_travellers(population_util)
+        counts = population_util.rng.multinomial(len(travellers), np.append(rates, max(0.0, 1 - rates.sum())))[:-1]
+        if counts.sum() == 0:
+            return {}
+
+        travellers = population_util.rng.permutation(travellers)[:counts.sum()]
+        leaving = population_util.remove_persons(travellers)
+        ends = np.cumsum(counts)
+        return {(region, destination): leaving[end - count:end]
+                for destination, (count, end) in enumerate(zip(counts, ends)) if count > 0}
+
+
+def serve_shard(connection, regions: list, params: list, seeds: list, first_ids: list, travel: np.ndarray,
+                backend: str = "numpy"):
+    """
+    Body of a worker process: creates its shard and answers every (first_frame, frames, arrivals) message with
+    ("ok", Shard.step()) until it receives None. Errors are answered with ("error", traceback)
+    """
+    try:
+        shard = Shard(regions, params, seeds, first_ids, travel, backend)
+        connection.send(("ok", None))
+        while True:
+            message = connection.recv()
+            if message is None:
+                break
+            connection.send(("ok", shard.step(*message)))
+    except Exception:
+        connection.send(("error", traceback.format_exc()))
+    finally:
+        connection.close()
+
+
+class Metapopulation():
+    """
+    Regions linked by a travel matrix, simulated by a pool of worker processes in lockstep
+    """
+
+    def __init__(self, params: list, travel, frames_per_day: int = 30, workers: int = None, seed = None,
+                    backend: str = "numpy"):
+        """
+        Constructor to set the regions and the travel between them, the workers are started by start()
+
+        Parameters
+        ----------
+        :param params: Keyword arguments for the PopulationUtil constructor of every region, without the seed
+        :param travel: Square matrix where travel[i][j] is the fraction of the persons of region i who can travel
+                       that move to region j every day, the diagonal is ignored
+        :param frames_per_day: Number of frames between two exchanges of travellers
+        :param workers: Number of worker processes, defaults to the number of cores, 1 simulates all the regions
+                        in this process
+        :param seed: Seed from which the seed of every region is derived, see spawn_seeds()
+        :param backend: Implementation of the kernels used by every region, see PopulationUtil
+        """
+        self.params         = list(params)
+        self.travel         = np.array(travel, dtype=np.float64)
+        regions             = len(self.params)
+        if self.travel.shape != (regions, regions):
+            raise ValueError("The travel matrix must be " + str(regions) + " x " + str(regions))
+        off_diagonal = self.travel * (1 - np.eye(regions))
+        if (self.travel < 0).any() or (off_diagonal.sum(axis=1) > 1).any():
+            raise ValueError("Travel fractions must be positive and add up to at most 1 for every region")
+
+        self.frames_per_day = frames_per_day
+        self.backend        = backend
+        self.workers        = max(1, min(workers or os.cpu_count(), regions))
+        self.seeds          = spawn_seeds(seed, regions)
+        sizes               = [region["size"] for region in self.params]
+        self.first_ids      = np.concatenate(([0], np.cumsum(sizes)[:-1])).tolist()
+        self.shards         = self.get_shards(sizes)
+        self.owner          = {region: worker for worker, shard in enumerate(self.shards) for region in shard}
+        self.connections    = []
+        self.processes      = []
+        self.local_shard    = None
+        self.arrivals       = [{} for _ in self.shards]
+        self.counts         = [[] for _ in range(regions)]
+        self.frame          = 0
+
+    def get_shards(self, sizes: list) -> list:
+        """
+        Spreads the regions over the workers, the largest regions first to the least loaded worker
+
+        Parameters
+        ----------
+        :param sizes: Population of every region
+
+        :return List with the sorted regions of every worker
+        """
+        shards = [[] for _ in range(self.workers)]
+        loads = np.zeros(self.workers)
+        for region in np.argsort(sizes, kind="stable")[::-1]:
+            worker = int(np.argmin(loads))
+            shards[worker].append(int(region))
+            loads[worker] += sizes[region]
+        return [sorted(shard) for shard in shards]
+
+    def get_shard_args(self, shard: list) -> tuple:
+        """
+        Returns the arguments of the Shard constructor for the given regions
+        """
+        return (shard, [self.params[r] for r in shard], [self.seeds[r] for r in shard],
+                [self.first_ids[r] for r in shard], self.travel[shard], self.backend)
+
+    def start(self) -> "Metapopulation":
+        """
+        Creates the regions, in one worker process per shard or in this process with a single worker
+
+        :return The metapopulation itself
+        """
+        if self.workers == 1:
+            self.local_shard = Shard(*self.get_shard_args(self.shards[0]))
+            return self
+
+        context = multiprocessing.get_context("spawn")
+        for shard in self.shards:
+            connection, child = context.Pipe()
+            process = context.Process(target=serve_shard, args=(child,) + self.get_shard_args(shard), daemon=True)
+            process.start()
+            child.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+        for connection in self.connections:
+            self.receive(connection)
+        return self
+
+    def receive(self, connection):
+        """
+        Returns the answer of a worker, raises RuntimeError when the worker failed
+        """
+        try:
+            status, result = connection.recv()
+        except EOFError:
+            raise RuntimeError("A metapopulation worker stopped")
+        if status == "error":
+            raise RuntimeError("A metapopulation worker failed:\n" + result)
+        return result
+
+    def step(self):
+        """
+        Simulates one day of every region in parallel, then routes the travellers to the shards of their
+        destinations for the next day. The travellers reach every region in the order of their origin
+        """
+        messages = [(self.frame, self.frames_per_day, arrivals) for arrivals in self.arrivals]
+        if self.local_shard is not None:
+            results = [self.local_shard.step(*messages[0])]
+        else:
+            for connection, message in zip(self.connections, messages):
+                connection.send(message)
+            results = [self.receive(connection) for connection in self.connections]
+
+        departures = {}
+        for counts, shard_departures in results:
+            for region, region_counts in counts.items():
+                self.counts[region].append(region_counts)
+            departures.update(shard_departures)
+
+        self.arrivals = [{} for _ in self.shards]
+        for origin, destination in sorted(departures):
+            self.arrivals[self.owner[destination]].setdefault(destination, []).append(departures[(origin, destination)])
+        self.frame += self.frames_per_day
+
+    def run(self, days: int) -> np.ndarray:
+        """
+        Simulates the given number of days, starting the workers when needed
+
+        Parameters
+        ----------
+        :param days: Number of days to simulate
+
+        :return Array of shape (regions, frames, len(HeadlessSimulation.columns)) with the counts of every
+                region and frame simulated so far
+        """
+        if self.local_shard is None and len(self.connections) == 0:
+            self.start()
+        start = time.perf_counter()
+        for _ in range(days):
+            self.step()
+        elapsed = time.perf_counter() - start
+        print("Simulated " + str(days) + " days of " + str(len(self.params)) + " regions on " + str(self.workers) +
+                " workers in " + str(round(elapsed, 2)) + " s", file = sys.stdout)
+        return self.get_counts()
+
+    def get_counts(self) -> np.ndarray:
+        """
+        Returns the counts of every region and frame simulated so far, see run()
+        """
+        return np.stack([np.concatenate(counts) if counts else np.zeros((0, len(HeadlessSimulation.columns)), dtype=np.int64)
+                            for counts in self.counts])
+
+    def save(self, path: str):
+        """
+        Saves the counts to a .npz file, one array of shape (regions, frames) per column of
+        HeadlessSimulation.columns, along with the travel matrix
+
+        Parameters
+        ----------
+        :param path: Path to the output file
+        """
+        counts = self.get_counts()
+        np.savez(path, travel=self.travel, **{name: counts[:, :, i] for i, name in enumerate(HeadlessSimulation.columns)})
+        print("Saved " + str(counts.shape[1]) + " frames of " + str(len(self.params)) + " regions to " + path, file = sys.stdout)
+
+    def close(self):
+        """
+        Stops the worker processes
+        """
+        for connection in self.connections:
+            try:
+                connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            connection.close()
+        for process in self.processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self.connections = []
+        self.processes = []
+        self.local_shard = None
+
+    def __enter__(self) -> "Metapopulation":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @classmethod
+    def from_spec(cls, spec: dict, base_params: dict, workers: int = None, seed = None,
+                    backend: str = "numpy") -> "Metapopulation":
+        """
+        Creates a metapopulation from a description such as
+        {"regions": [{"size": 5000}, {"size": 2000, "r": 3.0, "seeded": false}], "travel": [[0, 0.01], [0.02, 0]],
+        "frames_per_day": 30} where every region only lists the PopulationUtil arguments that differ from
+        base_params. Regions with "seeded": false start without an infected person
+
+        Parameters
+        ----------
+        :param spec: The description, for instance loaded from a JSON file
+        :param base_params: Keyword arguments for the PopulationUtil constructor shared by the regions
+        :param workers: Number of worker processes, see the constructor
+        :param seed: Seed of the metapopulation, see the constructor
+        :param backend: Implementation of the kernels, see the constructor
+
+        :return The Metapopulation
+        """
+        params = [dict(base_params, **region) for region in spec["regions"]]
+        return cls(params, spec["travel"], spec.get("frames_per_day", 30), workers, seed, backend)
+
+    @classmethod
+    def from_spec_file(cls, path: str, base_params: dict, workers: int = None, seed = None,
+                        backend: str = "numpy") -> "Metapopulation":
+        """
+        Creates a metapopulation from a JSON file, see from_spec()
+        """
+        with open(path) as spec_file:
+            return cls.from_spec(json.load(spec_file), base_params, workers, seed, backend)
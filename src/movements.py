@@ -9,11 +9,44 @@ will move and to where
 from src.population import Population
 import numpy as np
 import src.person_properties_util as idx
+from src import kernels
 
 class Movement():
     """
     Class providing abstraction into each movement of the population
     """    
+
+    def __init__(self, rng: np.random.Generator = None, chunk_size: int = 1 << 16, backend: str = "numpy"):
+        """
+        Constructor to set the random number generator used for all the movements
+
+        Parameters
+        ----------
+        rng : np.random.Generator, optional
+            Generator to draw the random values from, a new unseeded generator is used when not given
+        chunk_size : int, optional
+            Number of persons processed at once, keeps the temporary arrays cache sized and the pages of memory
+            mapped populations local, by default 65536
+        backend : str, optional
+            "numpy" or "numba", the latter moves the persons with the loops of kernels.py, by default "numpy"
+        """
+        if backend not in kernels.backends:
+            raise ValueError("Unknown backend: " + str(backend))
+        self.rng        = rng if rng is not None else np.random.default_rng()
+        self.chunk_size = chunk_size
+        self.backend    = backend
+
+    def chunks(self, size: int):
+        """
+        Yields the consecutive row ranges of at most chunk_size persons covering the population
+
+        Parameters
+        ----------
+        size : int
+            The size of the population
+        """
+        for start in range(0, size, self.chunk_size):
+            yield slice(start, min(start + self.chunk_size, size))
     
     def update_persons(self, persons: np.ndarray, size: int, speed: float = 0.1, heading_update_chance: float = 0.02) -> np.ndarray:
         """
@@ -36,26 +69,30 @@ class Movement():
             The upated NumPy array with updated values
         """  
 
-        #For updating the x position 
-        #Generate a random array with update chance for each person in the population 
-        update = np.random.random(size=(size,))
+        for rows in self.chunks(size):
+            chunk = persons[rows]
+            chunk_size = rows.stop - rows.start
+
+            #For updating the x position 
+            #Generate a random array with update chance for each person in the population 
+            update = self.rng.random(size=(chunk_size,))
 
-        #Get the persons in the population who have a lower or equal to chance of getting updated in this epoch
-        shp = update[update <= heading_update_chance].shape
+            #Get the persons in the population who have a lower or equal to chance of getting updated in this epoch
+            shp = update[update <= heading_update_chance].shape
 
-        #Update the position for the direction in which they are heading
-        persons[:,idx.x_dir][update <= heading_update_chance] = np.random.normal(loc = 0, scale = 1/3, size = shp)
+            #Update the position for the direction in which they are heading
+            chunk[:,idx.x_dir][update <= heading_update_chance] = self.rng.normal(loc = 0, scale = 1/3, size = shp)
 
-        #For updating the y position, do the same
-        update = np.random.random(size=(size,))
-        shp = update[update <= heading_update_chance].shape
-        persons[:,idx.y_dir][update <= heading_update_chance] = np.random.normal(loc = 0, scale = 1/3, size = shp)
-        
-        #Update the speed by generating a random normal distribution using the argument speed as the parameter
-        update = np.random.random(size=(size,))
-        shp = update[update <= heading_update_chance].shape
-        persons[:,idx.speed][update <= heading_update_chance] = np.random.normal(loc = speed, scale = speed / 3, size = shp)
-        persons[:,idx.speed] = np.clip(persons[:,idx.speed], a_min=0.0005, a_max=0.01)
+            #For updating the y position, do the same
+            update = self.rng.random(size=(chunk_size,))
+            shp = update[update <= heading_update_chance].shape
+            chunk[:,idx.y_dir][update <= heading_update_chance] = self.rng.normal(loc = 0, scale = 1/3, size = shp)
+            
+            #Update the speed by generating a random normal distribution using the argument speed as the parameter
+            update = self.rng.random(size=(chunk_size,))
+            shp = update[update <= heading_update_chance].shape
+            chunk[:,idx.speed][update <= heading_update_chance] = self.rng.normal(loc = speed, scale = speed / 3, size = shp)
+            np.clip(chunk[:,idx.speed], a_min=0.0005, a_max=0.01, out=chunk[:,idx.speed])
 
         #Return the updated array
         return persons
@@ -69,10 +106,10 @@ class Movement():
         ----------
         person : np.ndarray
             The NumPy array containing the details of the individuals
-        xbounds : list
-            List containing bounds for X axis.
-        ybounds : list
-            List containing bounds for Y axis.
+        xbounds : np.ndarray
+            Bounds for X axis, either one [low, high] row per person or a single row shared by everyone.
+        ybounds : np.ndarray
+            Bounds for Y axis, either one [low, high] row per person or a single row shared by everyone.
 
         Returns
         -------
@@ -80,46 +117,57 @@ class Movement():
             The upated NumPy array with updated values
         """  
 
-        # Store shape of list of people who are heading out of bounds based on X bound [0]
-        shp = persons[:,4][(persons[:,2] <= xbounds[:,0]) &
-                            (persons[:,4] < 0)].shape
-        # Update them randomly using a normal distribution
-        persons[:,4][(persons[:,2] <= xbounds[:,0]) &
-                        (persons[:,4] < 0)] = np.clip(np.random.normal(loc = 0.5, 
-                                                                            scale = 0.5/3,
-                                                                            size = shp),
-                                                            a_min = 0.05, a_max = 1)
-
-        # Store shape of list of people who are heading out of bounds based on X bound [1]
-        shp = persons[:,4][(persons[:,2] >= xbounds[:,1]) &
-                                (persons[:,4] > 0)].shape
-        # Update them randomly using a normal distribution
-        persons[:,4][(persons[:,2] >= xbounds[:,1]) &
-                        (persons[:,4] > 0)] = np.clip(-np.random.normal(loc = 0.5, 
-                                                                            scale = 0.5/3,
-                                                                            size = shp),
-                                                            a_min = -1, a_max = -0.05)
-
-        # Store shape of list of people who are heading out of bounds based on Y bound [0]
-        shp = persons[:,5][(persons[:,3] <= ybounds[:,0]) &
-                                (persons[:,5] < 0)].shape  
-        # Update them randomly using a normal distribution 
-        persons[:,5][(persons[:,3] <= ybounds[:,0]) &
-                        (persons[:,5] < 0)] = np.clip(np.random.normal(loc = 0.5, 
-                                                                            scale = 0.5/3,
-                                                                            size = shp),
-                                                            a_min = 0.05, a_max = 1)
-
-        # Store shape of list of people who are heading out of bounds based on Y bound [1]
-        shp = persons[:,5][(persons[:,3] >= ybounds[:,1]) &
-                                (persons[:,5] > 0)].shape
-        # Update them randomly using a normal distribution
-        persons[:,5][(persons[:,3] >= ybounds[:,1]) &
-                        (persons[:,5] > 0)] = np.clip(-np.random.normal(loc = 0.5, 
-                                                                            scale = 0.5/3,
-                                                                            size = shp),
-                                                            a_min = -1, a_max = -0.05)
-        
+        if self.backend == "numba":
+            kernels.bounce(persons[:, idx.x_axis], persons[:, idx.x_dir], np.asarray(xbounds, dtype=np.float64), self.rng)
+            kernels.bounce(persons[:, idx.y_axis], persons[:, idx.y_dir], np.asarray(ybounds, dtype=np.float64), self.rng)
+            return persons
+
+        #Bounds may be given per person or once for everyone
+        for rows in self.chunks(len(persons)):
+            chunk = persons[rows]
+            xb = xbounds[rows] if len(xbounds) > 1 else xbounds
+            yb = ybounds[rows] if len(ybounds) > 1 else ybounds
+
+            # Store shape of list of people who are heading out of bounds based on X bound [0]
+            shp = chunk[:,4][(chunk[:,2] <= xb[:,0]) &
+                                (chunk[:,4] < 0)].shape
+            # Update them randomly using a normal distribution
+            chunk[:,4][(chunk[:,2] <= xb[:,0]) &
+                            (chunk[:,4] < 0)] = np.clip(self.rng.normal(loc = 0.5, 
+                                                                                scale = 0.5/3,
+                                                                                size = shp),
+                                                                a_min = 0.05, a_max = 1)
+
+            # Store shape of list of people who are heading out of bounds based on X bound [1]
+            shp = chunk[:,4][(chunk[:,2] >= xb[:,1]) &
+                                    (chunk[:,4] > 0)].shape
+            # Update them randomly using a normal distribution
+            chunk[:,4][(chunk[:,2] >= xb[:,1]) &
+                            (chunk[:,4] > 0)] = np.clip(-self.rng.normal(loc = 0.5, 
+                                                                                scale = 0.5/3,
+                                                                                size = shp),
+                                                                a_min = -1, a_max = -0.05)
+
+            # Store shape of list of people who are heading out of bounds based on Y bound [0]
+            shp = chunk[:,5][(chunk[:,3] <= yb[:,0]) &
+                                    (chunk[:,5] < 0)].shape  
+            # Update them randomly using a normal distribution 
+            chunk[:,5][(chunk[:,3] <= yb[:,0]) &
+                            (chunk[:,5] < 0)] = np.clip(self.rng.normal(loc = 0.5, 
+                                                                                scale = 0.5/3,
+                                                                                size = shp),
+                                                                a_min = 0.05, a_max = 1)
+
+            # Store shape of list of people who are heading out of bounds based on Y bound [1]
+            shp = chunk[:,5][(chunk[:,3] >= yb[:,1]) &
+                                    (chunk[:,5] > 0)].shape
+            # Update them randomly using a normal distribution
+            chunk[:,5][(chunk[:,3] >= yb[:,1]) &
+                            (chunk[:,5] > 0)] = np.clip(-self.rng.normal(loc = 0.5, 
+                                                                                scale = 0.5/3,
+                                                                                size = shp),
+                                                                a_min = -1, a_max = -0.05)
+
         return persons
 
     def update_pop(self, persons):
@@ -138,12 +186,18 @@ class Movement():
         np.ndarray
             The upated NumPy array with updated values
         """  
-        filter = (persons[:, idx.current_state] != 3) & (persons[:, idx.social_distance] == 0)
-        
-
-        #x
-        persons[:,2][filter] = persons[:,2][filter] + (persons[:,4][filter] * persons[:,6][filter])
-        #y
-        persons[:,3][filter] = persons[:,3][filter] + (persons [:,5][filter] * persons[:,6][filter])
+        if self.backend == "numba":
+            kernels.move(persons[:, idx.x_axis], persons[:, idx.y_axis], persons[:, idx.x_dir], persons[:, idx.y_dir],
+                            persons[:, idx.speed], persons[:, idx.current_state], persons[:, idx.social_distance])
+            return persons
+
+        for rows in self.chunks(len(persons)):
+            chunk = persons[rows]
+            filter = (chunk[:, idx.current_state] != 3) & (chunk[:, idx.social_distance] == 0)
+
+            #x
+            chunk[:,2][filter] = chunk[:,2][filter] + (chunk[:,4][filter] * chunk[:,6][filter])
+            #y
+            chunk[:,3][filter] = chunk[:,3][filter] + (chunk [:,5][filter] * chunk[:,6][filter])
 
         return persons
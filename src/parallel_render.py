@@ -0,0 +1,139 @@
+'''
+Two stage rendering: the simulation is run headless once while its trajectory
+is recorded, then the frame range is split into segments that worker processes
+draw and encode in parallel, and the segments are joined into one video
+'''
+import math
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib.pyplot as plt
+from src.population_util import PopulationUtil
+from src.headless import HeadlessSimulation
+from src.trajectory import TrajectoryRecorder, TrajectoryPlayer
+from src.visualization import Visualization
+from src.render import concat
+
+
+def render_segment(directory: str, first_frame: int, frames: int, path: str, fast: bool, refresh_every: int,
+                    fps: int, dpi: int) -> dict:
+    """
+    Draws and encodes one segment of a recorded trajectory. Module level so that worker processes can pickle it
+
+    Parameters
+    ----------
+    :param directory: Directory of the recording, see TrajectoryRecorder
+    :param first_frame: First frame of the segment
+    :param frames: Number of frames in the segment
+    :param path: Path to the segment video
+    :param fast: Toggle for the single scatter and blitting, see Visualization
+    :param refresh_every: Number of frames between two refreshes of the line graph in fast mode
+    :param fps: Frames per second of the video
+    :param dpi: Resolution of the frames
+
+    :return Statistics of Visualization.render()
+    """
+    plt.switch_backend("Agg")
+    visualization = Visualization(TrajectoryPlayer(directory), fast=fast, refresh_every=refresh_every, start=False)
+    stats = visualization.render(path, frames, fps, dpi, first_frame)
+    plt.close(visualization.fig)
+    return stats
+
+
+class ParallelRender():
+    """
+    Renders a simulation to a video with a pool of processes, each one drawing a contiguous segment of frames
+    """
+
+    def __init__(self, population_util: PopulationUtil, frames: int, workers: int = None, fast: bool = False,
+                    refresh_every: int = 10, fps: int = 30, dpi: int = 120):
+        """
+        Constructor to set the simulation and the render settings
+
+        Parameters
+        ----------
+        :param population_util: The simulation to render, it is run from its current state
+        :param frames: Number of frames to render
+        :param workers: Number of worker processes, defaults to the number of cores
+        :param fast: Toggle for the single scatter and blitting, see Visualization
+        :param refresh_every: Number of frames between two refreshes of the line graph in fast mode, segments
+                              start on multiples of it so they look the same as a single render
+        :param fps: Frames per second of the video
+        :param dpi: Resolution of the frames
+        """
+        self.putil         = population_util
+        self.frames        = frames
+        self.workers       = workers or os.cpu_count()
+        self.fast          = fast
+        self.refresh_every = max(1, refresh_every)
+        self.fps           = fps
+        self.dpi           = dpi
+
+    def segments(self) -> list:
+        """
+        Splits the frames into at most one segment per worker
+
+        :return List of (first frame, number of frames) tuples, in order
+        """
+        length = math.ceil(self.frames / self.workers / self.refresh_every) * self.refresh_every
+        return [(first, min(length, self.frames - first)) for first in range(0, self.frames, max(length, 1))]
+
+    def record(self, directory: str) -> int:
+        """
+        Runs the simulation headless and records its trajectory
+
+        Parameters
+        ----------
+        :param directory: Directory to store the recording in
+
+        :return Number of recorded frames
+        """
+        with TrajectoryRecorder(directory, self.putil, self.frames) as recorder:
+            self.putil.add_observer(recorder.record)
+            try:
+                HeadlessSimulation(self.putil).run(self.frames)
+            finally:
+                self.putil.remove_observer(recorder.record)
+        return recorder.frames
+
+    def run(self, path: str) -> dict:
+        """
+        Records the trajectory, renders the segments in parallel and joins them. The recording and the segments
+        are kept in a temporary directory next to the video and removed at the end
+
+        Parameters
+        ----------
+        :param path: Path to the video
+
+        :return Seconds spent in every stage and the overall number of frames per second
+        """
+        if self.frames < 1:
+            raise ValueError("Nothing to render, the number of frames must be at least 1")
+        stats = {}
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path))) as work_dir:
+            trajectory_dir = os.path.join(work_dir, "trajectory")
+            self.record(trajectory_dir)
+            stats["simulate_s"] = time.perf_counter() - start
+
+            segments = self.segments()
+            paths = [os.path.join(work_dir, "segment%05d.mp4" % i) for i in range(len(segments))]
+            with ProcessPoolExecutor(max_workers=max(1, min(self.workers, len(segments)))) as executor:
+                futures = [executor.submit(render_segment, trajectory_dir, first, frames, segment_path, self.fast,
+                                            self.refresh_every, self.fps, self.dpi)
+                            for (first, frames), segment_path in zip(segments, paths)]
+                for future in futures:
+                    future.result()
+            stats["draw_s"] = time.perf_counter() - start - stats["simulate_s"]
+
+            concat(paths, path)
+        stats["total_s"] = time.perf_counter() - start
+        stats["concat_s"] = stats["total_s"] - stats["simulate_s"] - stats["draw_s"]
+        stats["frames_per_s"] = self.frames / stats["total_s"]
+        print("Rendered " + str(self.frames) + " frames in " + str(len(segments)) + " segments in " +
+                str(round(stats["total_s"], 2)) + " s, " + str(round(stats["frames_per_s"], 1)) + " frames/s (simulating " +
+                str(round(stats["simulate_s"], 2)) + " s, drawing " + str(round(stats["draw_s"], 2)) + " s, joining " +
+                str(round(stats["concat_s"], 2)) + " s)", file = sys.stdout)
+        return stats
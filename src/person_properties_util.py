@@ -2,6 +2,8 @@
 Created on Nov 30, 2020
 @author: Pallak Singh
 '''
+import numpy as np
+
 #Index of all the properties of the persons in the persons NumPy array located in population.py -> Population() class
 id                 = 0
 age                = 1
@@ -24,5 +26,31 @@ hospitalized       = 17
 social_distance    = 18
 infected_by        = 19
 
+#Storage type of every property, in the order of the indices above, used by person_table.py -> PersonTable() class
+dtypes = [
+    np.int32,   #id
+    np.int16,   #age
+    np.float32, #x_axis
+    np.float32, #y_axis
+    np.float32, #x_dir
+    np.float32, #y_dir
+    np.float32, #speed
+    np.int8,    #currently_active
+    np.int8,    #at_destination
+    np.int8,    #current_state
+    np.float32, #wander_x
+    np.float32, #wander_y
+    np.int16,   #g_value
+    np.float32, #susceptibility
+    np.float32, #mortality_rate
+    np.float32, #mask_effectiveness
+    np.int32,   #infected_at
+    np.int8,    #hospitalized
+    np.int8,    #social_distance
+    np.int32,   #infected_by
+]
 
-
+#Name of every property, in the order of the indices above, used to name the column files of a stored PersonTable
+names = ["id", "age", "x_axis", "y_axis", "x_dir", "y_dir", "speed", "currently_active", "at_destination",
+            "current_state", "wander_x", "wander_y", "g_value", "susceptibility", "mortality_rate",
+            "mask_effectiveness", "infected_at", "hospitalized", "social_distance", "infected_by"]
@@ -0,0 +1,179 @@
+'''
+Column store holding the properties of all the persons, one contiguous typed
+NumPy array per property instead of one float64 matrix. The columns can be
+backed by memory mapped files to simulate populations larger than the memory
+'''
+import os
+import numpy as np
+import src.person_properties_util as idx
+
+class PersonTable():
+    """
+    Structure of arrays holding the persons. Supports the same [rows, property] indexing as a persons matrix,
+    so the indices in person_properties_util keep working: selecting a single property returns its typed
+    column (a view when all the rows are selected), selecting several properties or whole rows returns a
+    float64 copy. Selecting a range of rows with persons[start:stop] returns a PersonTable viewing those rows,
+    the same as basic slicing of an ndarray
+    """
+
+    ndim = 2
+
+    def __init__(self, size: int, dtypes: list = idx.dtypes, storage_dir: str = None):
+        """
+        Constructor to allocate a zeroed column for every property
+
+        Parameters
+        ----------
+        :param size: Number of persons
+        :param dtypes: Storage type of every property, in the order of the indices in person_properties_util
+        :param storage_dir: Directory in which every column is stored as a memory mapped <property>.dat file
+                            instead of in memory, existing files are overwritten. Every simulation needs its own
+                            directory
+        """
+        self.size        = size
+        self.storage_dir = storage_dir
+        if storage_dir is None:
+            self.columns = [np.zeros(size, dtype=dtype) for dtype in dtypes]
+        else:
+            os.makedirs(storage_dir, exist_ok=True)
+            self.columns = [np.memmap(self.column_path(storage_dir, name), dtype=dtype, mode="w+", shape=(size,))
+                            for name, dtype in zip(idx.names, dtypes)]
+
+    @staticmethod
+    def column_path(storage_dir: str, name: str) -> str:
+        """
+        Returns the path of the file storing the given property
+        """
+        return os.path.join(storage_dir, name + ".dat")
+
+    @classmethod
+    def open(cls, storage_dir: str, mode: str = "r", dtypes: list = idx.dtypes) -> "PersonTable":
+        """
+        Opens the columns stored in a directory by an earlier simulation without reading them into memory, for
+        instance to inspect the final state of a run after its process has exited
+
+        Parameters
+        ----------
+        :param storage_dir: The storage directory of the simulation
+        :param mode: Mode of the memory maps, "r" for read only and "r+" to also write
+
+        :return The table viewing the stored columns
+        """
+        columns = [np.memmap(cls.column_path(storage_dir, name), dtype=dtype, mode=mode)
+                    for name, dtype in zip(idx.names, dtypes)]
+        return cls._wrap(columns, storage_dir)
+
+    @classmethod
+    def _wrap(cls, columns: list, storage_dir: str = None) -> "PersonTable":
+        """
+        Creates a table around existing columns without copying them
+        """
+        table = cls(0)
+        table.size        = len(columns[0])
+        table.storage_dir = storage_dir
+        table.columns     = columns
+        return table
+
+    @classmethod
+    def from_array(cls, persons: np.ndarray) -> "PersonTable":
+        """
+        Creates a table from a persons matrix with one row per person and one column per property
+
+        Parameters
+        ----------
+        :param persons: The persons matrix
+
+        :return The table holding a typed copy of the matrix
+        """
+        table = cls(len(persons))
+        table[:, :] = persons
+        return table
+
+    def take(self, rows) -> "PersonTable":
+        """
+        Returns a new in memory table holding a typed copy of the given persons
+
+        Parameters
+        ----------
+        :param rows: Integer rows or boolean mask of the persons to copy
+
+        :return The table holding the copy
+        """
+        return self._wrap([column[rows] for column in self.columns])
+
+    @classmethod
+    def concatenate(cls, tables: list) -> "PersonTable":
+        """
+        Joins tables into a new in memory table, the persons of every table follow those of the previous one
+
+        Parameters
+        ----------
+        :param tables: The tables to join, at least one
+
+        :return The table holding a copy of all the persons
+        """
+        return cls._wrap([np.concatenate(columns) for columns in zip(*(table.columns for table in tables))])
+
+    @property
+    def shape(self) -> tuple:
+        """
+        Number of persons and number of properties, the shape of the equivalent persons matrix
+        """
+        return (self.size, len(self.columns))
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory taken by all the columns
+        """
+        return sum(column.nbytes for column in self.columns)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def flush(self):
+        """
+        Writes the changes of the memory mapped columns to their files, does nothing for in memory columns
+        """
+        for column in self.columns:
+            if isinstance(column, np.memmap):
+                column.flush()
+
+    def _split(self, key) -> tuple:
+        """
+        Splits an index into its rows and properties parts
+        """
+        if isinstance(key, tuple):
+            if len(key) != 2:
+                raise IndexError("PersonTable takes a [rows, property] index")
+            return key
+        return key, slice(None)
+
+    def _selected(self, properties) -> list:
+        """
+        Returns the indices of the selected properties
+        """
+        if isinstance(properties, slice):
+            return list(range(len(self.columns)))[properties]
+        return [int(p) for p in np.atleast_1d(properties)]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self._wrap([column[key] for column in self.columns], self.storage_dir)
+        rows, properties = self._split(key)
+        if isinstance(properties, (int, np.integer)):
+            return self.columns[properties][rows]
+        return np.stack([self.columns[p][rows] for p in self._selected(properties)], axis=-1).astype(np.float64)
+
+    def __setitem__(self, key, value):
+        rows, properties = self._split(key)
+        if isinstance(properties, (int, np.integer)):
+            self.columns[properties][rows] = value
+            return
+
+        value = np.asarray(value)
+        for i, p in enumerate(self._selected(properties)):
+            self.columns[p][rows] = value[..., i] if value.ndim > 0 else value
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        return np.stack(self.columns, axis=-1).astype(dtype or np.float64)
@@ -4,6 +4,7 @@ Created on Nov 29, 2020
 '''
 
 import numpy as np
+from src.person_table import PersonTable
 
 
 class Population(object):
@@ -12,9 +13,12 @@ class Population(object):
     holding all persons
     """
 
-    def __init__(self, size):
+    def __init__(self, size, rng: np.random.Generator = None, storage_dir: str = None):
         """
-        Initializes the NumPy array holding all persons with their specific properties
+        Initializes the PersonTable holding all persons with their specific properties, each property is stored
+        in its own typed column (see person_properties_util.dtypes). All the random values are drawn from rng, a
+        new unseeded generator is used when it is not given. When storage_dir is given the columns are memory
+        mapped files in that directory, see PersonTable
         
         0 - ID:                         An incremental ID uniquely identifying all the individuals              
         1 - age:                        Age of the individuals
@@ -38,8 +42,12 @@ class Population(object):
         19 - infected_by                The person this person was infected by if infected at all 
         """        
         
-        #Generate the numpy array of population size = size and column size = 12
-        self.persons = np.zeros((size, 20))
+        #Generate the table of population size = size with one typed column per property
+        self.persons = PersonTable(size, storage_dir=storage_dir)
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+        #Number of persons currently hospitalized, kept up to date on every admission and discharge
+        self.hospital_occupancy = 0
 
     def set_age(self, data: list):
         """
@@ -166,7 +174,7 @@ class Population(object):
         :param index: The id/index of the person for which we need to set the index for
         :param frame: The time frame at which the person got infected
         """
-        self.persons[index][16] = frame
+        self.persons[index, 16] = frame
 
     def set_mask_effectiveness(self, data):
         """
@@ -179,6 +187,31 @@ class Population(object):
         """
         self.persons[:, 15] = data
 
+    def admit_to_hospital(self, index: np.ndarray):
+        """
+        Hospitalizes the given persons and updates the hospital occupancy
+
+        Parameters
+        ----------
+
+        :param index: The indices of the persons to hospitalize
+        """
+        self.persons[index, 17] = 1
+        self.hospital_occupancy += np.size(index)
+
+    def discharge_from_hospital(self, index: np.ndarray):
+        """
+        Discharges the given hospitalized persons, marking them as having been hospitalized at some time, and
+        updates the hospital occupancy
+
+        Parameters
+        ----------
+
+        :param index: The indices of the currently hospitalized persons to discharge
+        """
+        self.persons[index, 17] = 3
+        self.hospital_occupancy -= np.size(index)
+
     def get_x_axis(self) -> np.array:
         """
         Returns the current x coordinate of all the persons in the population
@@ -212,14 +245,14 @@ class Population(object):
         """
         return self.persons[:, 9]
 
-    def get_person(self) -> np.ndarray:
+    def get_person(self) -> PersonTable:
         """
-        Returns the NumPy array containing all information about all the persons in the population
+        Returns the PersonTable containing all information about all the persons in the population
 
         Parameters
         ----------
 
-        :return The NumPy array containing all information about all the persons in the population
+        :return The PersonTable containing all information about all the persons in the population
         """
         return self.persons
 
@@ -267,6 +300,35 @@ class Population(object):
         """
         return self.persons[self.persons[:, 9] == 3]
 
+    def get_state_counts(self) -> np.ndarray:
+        """
+        Returns the number of persons in each state with a single pass over the population
+
+        Parameters
+        ----------
+
+        :return Array with the number of healthy, infected, immune and dead persons, in this order
+        """
+        return np.bincount(self.persons[:, 9].astype(np.int64), minlength=4)
+
+    def get_positions_by_state(self) -> tuple:
+        """
+        Returns the positions of all the persons grouped by their state, with one counting pass and one stable
+        sort of the state column instead of one filtered copy of the population per state
+
+        Parameters
+        ----------
+
+        :return Tuple of the number of persons in each state and a list of four (count, 2) arrays holding the x and
+                y coordinates of the healthy, infected, immune and dead persons, in this order
+        """
+        state = self.persons[:, 9]
+        counts = np.bincount(state, minlength=4)
+        order = np.argsort(state, kind="stable")
+        positions = np.column_stack((self.persons[:, 2][order], self.persons[:, 3][order]))
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        return counts, [positions[offsets[s]:offsets[s + 1]] for s in range(4)]
+
     def get_currently_active_info(self) -> np.ndarray:
         """
         Return the column information for all persons' current travel information (whether they have reached their destinations)
@@ -278,6 +340,17 @@ class Population(object):
         """
         return self.persons[:, 7]
 
+    def get_hospital_occupancy(self) -> int:
+        """
+        Returns the number of persons who are currently hospitalized, without scanning the population
+
+        Parameters
+        ----------
+
+        :return The number of persons currently hospitalized
+        """
+        return self.hospital_occupancy
+
     def get_time_infected(self, index: int, current_frame: int) -> int:
         """
         Get the time units (in this case frames) elapsed since a person got infected
@@ -290,7 +363,7 @@ class Population(object):
 
         :return The elapsed time since person got infected
         """
-        return current_frame - self.persons[index][16]
+        return current_frame - self.persons[index, 16]
 
     def get_since_infected_all(self, current_frame: int, recovery_time: int):
         return self.persons[(current_frame - self.persons[:, 16] > recovery_time)]
@@ -305,8 +378,7 @@ class Population(object):
         :param low: Lower bound for ID
         :param high: Upper bound for ID
         """
-        ID = list(range(low, high))
-        self.persons[:, 0] = ID
+        self.persons[:, 0] = np.arange(low, high)
 
     def initialize_ages(self, min_age: int, max_age: int, size: int):
         """
@@ -319,7 +391,7 @@ class Population(object):
         :param max_age: Maximum age for the randomly generated ages
         :param size: Size of the population
         """
-        ages = np.int32(np.random.uniform(low=min_age, high=max_age, size=size))
+        ages = np.int32(self.rng.uniform(low=min_age, high=max_age, size=size))
         self.set_age(ages)
 
     def initialize_positions(self, x_bounds: list, y_bounds: list, size: int):
@@ -333,9 +405,9 @@ class Population(object):
         :param y_bounds: List containing the lower and upper bound for the y axis
         :param size: Size of the population
         """
-        x_bound_list = np.random.uniform(low=x_bounds[0],
+        x_bound_list = self.rng.uniform(low=x_bounds[0],
                                          high=x_bounds[1], size=size)
-        y_bound_list = np.random.uniform(low=y_bounds[0],
+        y_bound_list = self.rng.uniform(low=y_bounds[0],
                                          high=y_bounds[1], size=size)
         self.set_x_axis(x_bound_list)
         self.set_y_axis(y_bound_list)
@@ -352,7 +424,7 @@ class Population(object):
         :param std_dev: Standard deviation of the g value to be generated randomly
         :param size: Size of the random g value array to be generated
         """
-        g_value = np.random.normal(loc=mean, scale=std_dev, size=size)
+        g_value = self.rng.normal(loc=mean, scale=std_dev, size=size)
         g_value[g_value < 0] = 0.00000
         self.set_g_value(g_value.astype(int))
 
@@ -367,7 +439,7 @@ class Population(object):
         :return:
         """
 
-        tmp = np.random.randint(low=0, high=len(mask_effective_range.keys()), size=size)
+        tmp = self.rng.integers(low=0, high=len(mask_effective_range.keys()), size=size)
         key_list = list(mask_effective_range.keys())
 
         for i in range(len(key_list)):
@@ -386,11 +458,8 @@ class Population(object):
         :param hygiene_effectiveness: Standard deviation of the g value to be generated randomly
         :param size: Size of the random g value array to be generated
         """
-        tmp = (np.array([100] * len(self.persons)) - self.persons[:, 15]) / 100
-        
-        tmp2 = [0.06] * len(self.persons)
-        tmp2 = np.multiply(tmp, tmp2)
-        self.persons[:, 13] = tmp2
+        tmp = (100 - self.persons[:, 15]) / 100
+        self.persons[:, 13] = np.multiply(tmp, 0.06)
 
     def initialize_mortality_rate(self, size: int, fatality_rate: dict):
         """
@@ -421,7 +490,7 @@ class Population(object):
         :param fatality_rate: Fatality rate risk according to the age group
         """
         choice = [0,1]
-        random_social_distancing = np.random.choice(choice, len(self.persons), p=[1-social_distancing_per, social_distancing_per])
+        random_social_distancing = self.rng.choice(choice, len(self.persons), p=[1-social_distancing_per, social_distancing_per])
         self.persons[:,18] = random_social_distancing
 
     def initialize_infected_by(self):
@@ -2,13 +2,30 @@
 Created on Nov 29, 2020
 @author: Pallak Singh, manik
 '''
-import random
+import json
+import os
 import numpy as np
-from numpy.core.fromnumeric import size
 from src.population import Population
+from src.person_table import PersonTable
 import src.person_properties_util as index
 from src.virus_util import Virus
 from src.movements import Movement
+from src.instrumentation import PhaseTimer
+from src import kernels
+
+def spawn_seeds(seed, count: int) -> list:
+    """
+    Derives independent seeds for parallel simulations from a single seed, every seed comes from its own
+    child of a SeedSequence so the random streams of the simulations do not overlap
+
+    Parameters
+    ----------
+    :param seed: The parent seed, None for fresh entropy
+    :param count: Number of seeds to derive
+
+    :return List of integer seeds, to be passed as the seed argument of PopulationUtil
+    """
+    return [int(child.generate_state(1, np.uint64)[0]) for child in np.random.SeedSequence(seed).spawn(count)]
 
 class PopulationUtil(object):
     """
@@ -21,7 +38,8 @@ class PopulationUtil(object):
 
     def __init__(self, size: int, r: float, k: float, min_age : int, max_age: int, mortality_rate: int,
                     social_distance_per: int, infection_range: float, recovery_time: int, total_healthcare_capacity: int,
-                    mask_effectiveness: dict, speed: float, social_distancing_at: int, mask_wearing_at: int):
+                    mask_effectiveness: dict, speed: float, social_distancing_at: int, mask_wearing_at: int, seed = None,
+                    storage_dir: str = None, backend: str = "numpy", seeded: bool = True):
         """
         Constructor used for initializing the bound for the x axis, y axis, the k and R value for the particular population
 
@@ -37,18 +55,36 @@ class PopulationUtil(object):
             Disease reproduction (R0) rate for the virus
         k : float
             The k value for the virus
+        seed : int, np.random.SeedSequence or np.random.Generator, optional
+            Seed of the random number generator shared by the population, movement and virus, runs with the
+            same seed and parameters are identical. Fresh entropy is used when not given
+        storage_dir : str, optional
+            Directory in which the person columns are kept as memory mapped files instead of in memory, for
+            populations larger than the memory. The final state can be opened with PersonTable.open()
+        backend : str, optional
+            Implementation of the movement and infection kernels: "numpy", "numba" for the compiled loops of
+            kernels.py or "auto" for Numba when it is installed. Falls back to "numpy" without Numba, by default
+            "numpy". Both give statistically equivalent runs but not the same runs for a seed
+        seeded : bool, optional
+            Whether the simulation starts with a randomly chosen infected person, by default True. Without it
+            nobody is infected until infected persons are added, for instance a region of a Metapopulation
+            reached by travellers. infected_person is -1 then
         """        
-        self.population                 = Population(size) 
-        self.virus                      = Virus(infection_range, recovery_time, total_healthcare_capacity)
+        self.seed                       = seed
+        self.backend                    = kernels.resolve_backend(backend)
+        self.seeded                     = seeded
+        self.rng                        = np.random.default_rng(seed)
+        self.population                 = Population(size, self.rng, storage_dir)
+        self.virus                      = Virus(infection_range, recovery_time, total_healthcare_capacity, self.rng, self.backend)
         self.recovery_time              = recovery_time
         self.total_healthcare_capacity  = total_healthcare_capacity
-        self.movement                   = Movement()
+        self.movement                   = Movement(self.rng, backend = self.backend)
         self.size                       = size
         self.x_bounds                   = [0, 1]
         self.y_bounds                   = [0, 1]
         self.k                          = k
         self.r                          = r
-        self.destinations               = np.random.uniform(low=0,high=1,size=(self.size,2))
+        self.destinations               = self.rng.uniform(low=0,high=1,size=(self.size,2))
         self.min_age                    = min_age
         self.max_age                    = max_age
         self.mortality_rate             = mortality_rate
@@ -60,6 +96,9 @@ class PopulationUtil(object):
         self.enforce_mask_wearing_at    = mask_wearing_at
         self.social_distancing_enforced = False
         self.mask_wearing_enforced      = False
+        self.frame                      = -1
+        self.observers                  = []
+        self.timer                      = None
         
 
         self.initialize_persons()
@@ -85,7 +124,10 @@ class PopulationUtil(object):
         #Update the destination each person is headed to and corresponding speed randomly
         self.persons = self.movement.update_persons(self.persons, self.size, self.speed, 1)
 
-        self.infected_person = np.random.randint(0,self.size)
+        self.infected_person = -1
+        if not self.seeded:
+            return
+        self.infected_person = int(self.rng.integers(0,self.size))
         self.persons[self.infected_person, index.g_value] = 3
         self.population.set_infected_at(self.infected_person, 0)
         self.persons[self.infected_person, index.infected_by] = self.infected_person
@@ -94,6 +136,50 @@ class PopulationUtil(object):
 
 
     def move(self, frame):
+        timer = self.timer
+        if timer is not None:
+            timer.start()
+
+        self.apply_interventions(frame)
+        if timer is not None:
+            timer.lap("interventions")
+
+        #The bounds are the same for everyone, a single row is broadcast over the population
+        _xbounds = np.array([self.x_bounds])
+        _ybounds = np.array([self.y_bounds])
+        if timer is not None:
+            timer.lap("bounds")
+        
+        self.persons = self.movement.out_of_bounds(self.persons, _xbounds, _ybounds)
+        if timer is not None:
+            timer.lap("out_of_bounds")
+
+        self.persons = self.movement.update_persons(self.persons, self.size, self.speed)
+        if timer is not None:
+            timer.lap("update_persons")
+        
+        self.persons = self.movement.update_pop(self.persons)
+        if timer is not None:
+            timer.lap("update_pop")
+
+        #The virus charges its own phases to the timer
+        self.population = self.virus.infect(self.population, frame)
+
+        self.frame = frame
+        for observer in self.observers:
+            observer(self, frame)
+        if timer is not None:
+            timer.lap("observers")
+
+    def apply_interventions(self, frame: int):
+        """
+        Starts mask wearing and social distancing on their frames, and redraws who is socially distancing every
+        300 frames after that. The first infected person never distances
+
+        Parameters
+        ----------
+        :param frame: The current frame
+        """
         if frame == self.enforce_mask_wearing_at:
             self.population.initialize_mask_eff(self.size, self.mask_effectiveness)
             self.population.initialize_susceptibility()
@@ -101,19 +187,195 @@ class PopulationUtil(object):
         
         if frame == self.enforce_social_distance_at:
             self.population.initialize_social_distancing(self.social_distance_per)
-            self.persons[self.infected_person, index.social_distance] = 0
+            if self.infected_person >= 0:
+                self.persons[self.infected_person, index.social_distance] = 0
             self.social_distancing_enforced =  True
 
         if frame >= self.enforce_social_distance_at and frame%300 == 0 and self.enforce_social_distance_at >= 0:
             self.population.initialize_social_distancing(self.social_distance_per)
 
-        _xbounds = np.array([[0,1]] * self.size)
-        _ybounds = np.array([[0,1]] * self.size)
-        
-        self.persons = self.movement.out_of_bounds(self.persons, _xbounds, _ybounds)
+    def enable_instrumentation(self) -> PhaseTimer:
+        """
+        Starts timing the phases of every move() and counting the work of the virus, until
+        disable_instrumentation() is called. Costs nothing while disabled
 
-        self.persons = self.movement.update_persons(self.persons, self.size, self.speed)
-        
-        self.persons = self.movement.update_pop(self.persons)
+        :return The PhaseTimer accumulating the statistics
+        """
+        if self.timer is None:
+            self.timer = PhaseTimer()
+        self.virus.timer = self.timer
+        return self.timer
 
-        self.population = self.virus.infect(self.population, frame)
+    def disable_instrumentation(self):
+        """
+        Stops the instrumentation, the statistics gathered so far are kept by the PhaseTimer
+        """
+        self.timer = None
+        self.virus.timer = None
+
+    def get_stats(self) -> dict:
+        """
+        Returns the statistics of the instrumentation, see PhaseTimer.get_stats(), or an empty dictionary
+        when it is disabled
+        """
+        return self.timer.get_stats() if self.timer is not None else {}
+
+    def remove_persons(self, rows: np.ndarray) -> PersonTable:
+        """
+        Takes persons out of the simulation, for instance when they travel to another region. Hospitalized
+        persons free their bed. When the first infected person is removed, infected_person becomes -1.
+        Populations kept in a storage directory cannot shrink
+
+        Parameters
+        ----------
+        :param rows: Rows of the persons to remove
+
+        :return PersonTable holding a copy of the removed persons, in the order of rows
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if self.persons.storage_dir is not None:
+            raise ValueError("Persons cannot be removed from a population kept in " + self.persons.storage_dir)
+
+        keep = np.ones(self.size, dtype=bool)
+        keep[rows] = False
+        removed = self.persons.take(rows)
+        if self.infected_person >= 0:
+            self.infected_person = int(np.count_nonzero(keep[:self.infected_person])) if keep[self.infected_person] else -1
+        self.destinations = self.destinations[keep]
+        self.population.hospital_occupancy -= int(np.count_nonzero(removed[:, index.hospitalized] == 1))
+        self.set_persons(self.persons.take(keep))
+        return removed
+
+    def add_persons(self, persons: PersonTable):
+        """
+        Appends persons to the simulation, for instance the ones removed from another region with
+        remove_persons(). They keep all their properties, including their position and their hospital bed
+
+        Parameters
+        ----------
+        :param persons: The persons to add
+        """
+        if self.persons.storage_dir is not None:
+            raise ValueError("Persons cannot be added to a population kept in " + self.persons.storage_dir)
+        self.destinations = np.concatenate((self.destinations, self.rng.uniform(low=0, high=1, size=(len(persons), 2))))
+        self.population.hospital_occupancy += int(np.count_nonzero(persons[:, index.hospitalized] == 1))
+        self.set_persons(PersonTable.concatenate([self.persons, persons]))
+
+    def set_persons(self, persons: PersonTable):
+        """
+        Replaces the persons of the simulation and its size
+        """
+        self.population.persons = persons
+        self.persons            = persons
+        self.size               = len(persons)
+
+    def add_observer(self, observer):
+        """
+        Registers a function called as observer(population_util, frame) at the end of every move(), for
+        instance TimeSeriesRecorder.record()
+
+        Parameters
+        ----------
+        :param observer: The function to call
+        """
+        self.observers.append(observer)
+
+    def remove_observer(self, observer):
+        """
+        Unregisters a function registered with add_observer()
+
+        Parameters
+        ----------
+        :param observer: The function to remove
+        """
+        self.observers.remove(observer)
+
+    def get_params(self) -> dict:
+        """
+        Returns the constructor arguments of this simulation, without the seed and the storage directory
+        """
+        return dict(size = self.size, r = self.r, k = self.k, min_age = self.min_age, max_age = self.max_age,
+                    mortality_rate = self.mortality_rate, social_distance_per = self.social_distance_per,
+                    infection_range = self.virus.infection_range, recovery_time = self.recovery_time,
+                    total_healthcare_capacity = self.total_healthcare_capacity, mask_effectiveness = self.mask_effectiveness,
+                    speed = self.speed, social_distancing_at = self.enforce_social_distance_at,
+                    mask_wearing_at = self.enforce_mask_wearing_at, seeded = self.seeded)
+
+    def get_checkpoint(self) -> dict:
+        """
+        Takes a snapshot of the full simulation state: the constructor arguments, every person column, the
+        destinations, the intervention flags, the last simulated frame and the state of the random number
+        generator. Only copies arrays, so it is cheap enough to call between two frames
+
+        :return Dictionary of arrays to pass to write_checkpoint()
+        """
+        state = dict(params = np.array(json.dumps(self.get_params(), default=float)),
+                     rng_state = np.array(json.dumps(self.rng.bit_generator.state)),
+                     destinations = self.destinations.copy(),
+                     backend = np.array(self.backend),
+                     frame = np.array(self.frame),
+                     infected_person = np.array(self.infected_person),
+                     social_distancing_enforced = np.array(self.social_distancing_enforced),
+                     mask_wearing_enforced = np.array(self.mask_wearing_enforced))
+        for name, column in zip(index.names, self.persons.columns):
+            state["persons." + name] = np.array(column)
+        return state
+
+    def save_checkpoint(self, path: str, **extra):
+        """
+        Saves the full simulation state to a compressed .npz file, see get_checkpoint()
+
+        Parameters
+        ----------
+        :param path: Path to the checkpoint file
+        :param extra: Additional arrays to store in the checkpoint
+        """
+        write_checkpoint(path, dict(self.get_checkpoint(), **extra))
+
+    @classmethod
+    def from_checkpoint(cls, path: str, storage_dir: str = None, backend: str = None) -> "PopulationUtil":
+        """
+        Restores a simulation saved by save_checkpoint(). Moving the restored simulation on from the frame after
+        the saved one gives exactly the same trajectory as the original run
+
+        Parameters
+        ----------
+        :param path: Path to the checkpoint file
+        :param storage_dir: Directory for memory mapped person columns, see the constructor
+        :param backend: Implementation of the kernels, see the constructor. Defaults to the backend of the
+                        original run, the trajectory is only the same with that one
+
+        :return The restored PopulationUtil, its frame attribute holds the last simulated frame
+        """
+        with np.load(path, allow_pickle=False) as checkpoint:
+            if backend is None:
+                backend = str(checkpoint["backend"]) if "backend" in checkpoint else "numpy"
+            population_util = cls(storage_dir=storage_dir, backend=backend, **json.loads(str(checkpoint["params"])))
+            for name, column in zip(index.names, population_util.persons.columns):
+                column[:] = checkpoint["persons." + name]
+            population_util.destinations               = checkpoint["destinations"]
+            population_util.frame                      = int(checkpoint["frame"])
+            population_util.infected_person            = int(checkpoint["infected_person"])
+            population_util.social_distancing_enforced = bool(checkpoint["social_distancing_enforced"])
+            population_util.mask_wearing_enforced      = bool(checkpoint["mask_wearing_enforced"])
+            population_util.rng.bit_generator.state    = json.loads(str(checkpoint["rng_state"]))
+
+        hospitalized = population_util.persons[:, index.hospitalized] == 1
+        population_util.population.hospital_occupancy = int(np.count_nonzero(hospitalized))
+        return population_util
+
+
+def write_checkpoint(path: str, state: dict):
+    """
+    Writes a checkpoint taken by PopulationUtil.get_checkpoint() to a compressed .npz file. The file is written
+    next to path first and then renamed, so a crash while writing never leaves a broken checkpoint behind
+
+    Parameters
+    ----------
+    :param path: Path to the checkpoint file
+    :param state: Dictionary of arrays to store
+    """
+    partial = path + ".partial"
+    with open(partial, "wb") as checkpoint:
+        np.savez_compressed(checkpoint, **state)
+    os.replace(partial, path)
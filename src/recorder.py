@@ -0,0 +1,216 @@
+'''
+Records the per frame numbers of a simulation into preallocated chunks and
+writes full chunks to disk on a background thread, so memory stays constant
+and the simulation loop never waits for the disk
+'''
+import os
+import queue
+import threading
+import numpy as np
+from src.population_util import PopulationUtil
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+class TimeSeriesRecorder():
+    """
+    Observer of PopulationUtil.move() collecting one row per frame. The output format follows the extension of
+    the path: .csv, .npz or .parquet (needs pyarrow)
+    """
+
+    # Names of the recorded columns, in the order they are stored
+    columns = ["frame", "healthy", "infected", "immune", "dead", "new_infections", "hospitalized",
+                "social_distancing", "mask_wearing"]
+
+    def __init__(self, path: str, chunk_frames: int = 4096, buffers: int = 2, resume_frame: int = None):
+        """
+        Constructor to allocate the chunks and start the writer thread
+
+        Parameters
+        ----------
+        :param path: Path to the output file, its extension selects the format
+        :param chunk_frames: Number of frames per chunk, a chunk is handed to the writer when it is full
+        :param buffers: Number of preallocated chunks, recording only waits for the writer when all of them are
+                        queued for writing
+        :param resume_frame: First frame of a run resumed from a checkpoint, the rows of the earlier frames are
+                             kept from an existing recording at path and the later ones dropped. None starts
+                             a new recording
+        """
+        self.path   = path
+        self.format = os.path.splitext(path)[1].lstrip(".").lower()
+        if self.format not in ("csv", "npz", "parquet"):
+            raise ValueError("Unsupported recording format: " + path)
+        if self.format == "parquet" and pyarrow is None:
+            raise ImportError("Recording to Parquet needs pyarrow")
+
+        self.free    = queue.Queue()
+        self.pending = queue.Queue()
+        for _ in range(buffers):
+            self.free.put(np.zeros((chunk_frames, len(self.columns)), dtype=np.int64))
+        self.chunk   = self.free.get()
+        self.rows    = 0
+        self.frames  = 0
+        self.error   = None
+        self.closed  = False
+
+        # Parquet files are appended to through one writer, npz chunks go to a raw file converted on close
+        self.parquet_writer = None
+        self.raw_path       = path + ".partial"
+        kept = self.read_rows(resume_frame) if resume_frame is not None else None
+        if self.format == "csv":
+            with open(self.path, "w") as out:
+                out.write(",".join(self.columns) + "\n")
+        elif self.format == "npz":
+            open(self.raw_path, "wb").close()
+        if kept is not None and len(kept) > 0:
+            self.write(kept)
+            self.frames = len(kept)
+
+        self.writer = threading.Thread(target=self.write_chunks, daemon=True)
+        self.writer.start()
+
+    def read_rows(self, before_frame: int) -> np.ndarray:
+        """
+        Reads the rows of the frames before the given one from an existing recording at the output path. An
+        npz recording that was not closed is read from its raw file
+
+        Parameters
+        ----------
+        :param before_frame: The rows of this and the later frames are left out
+
+        :return Array with one row per kept frame, no rows when there is no recording
+        """
+        rows = np.zeros((0, len(self.columns)), dtype=np.int64)
+        if self.format == "csv" and os.path.exists(self.path):
+            with open(self.path) as recording:
+                next(recording, None)
+                lines = recording.read().split()
+            if lines:
+                rows = np.loadtxt(lines, dtype=np.int64, delimiter=",", ndmin=2)
+        elif self.format == "npz" and os.path.exists(self.path):
+            with np.load(self.path, allow_pickle=False) as recording:
+                rows = np.column_stack([recording[name] for name in self.columns]).astype(np.int64)
+        elif self.format == "npz" and os.path.exists(self.raw_path):
+            rows = np.fromfile(self.raw_path, dtype=np.int64).reshape(-1, len(self.columns))
+        elif self.format == "parquet" and os.path.exists(self.path):
+            recording = pyarrow.parquet.read_table(self.path)
+            rows = np.column_stack([recording[name].to_numpy() for name in self.columns]).astype(np.int64)
+        return rows[rows[:, 0] < before_frame]
+
+    def attach(self, population_util: PopulationUtil) -> "TimeSeriesRecorder":
+        """
+        Registers the recorder as an observer of the given simulation, a row is recorded after every move()
+
+        Parameters
+        ----------
+        :param population_util: The simulation to record
+
+        :return The recorder itself
+        """
+        population_util.add_observer(self.record)
+        return self
+
+    def record(self, population_util: PopulationUtil, frame: int):
+        """
+        Records the numbers of the frame that was just simulated
+
+        Parameters
+        ----------
+        :param population_util: The simulation
+        :param frame: The frame that was just simulated
+        """
+        row = self.chunk[self.rows]
+        row[0] = frame
+        row[1:5] = population_util.population.get_state_counts()
+        row[5] = population_util.virus.new_infections
+        row[6] = population_util.population.get_hospital_occupancy()
+        row[7] = population_util.social_distancing_enforced
+        row[8] = population_util.mask_wearing_enforced
+        self.rows += 1
+        self.frames += 1
+        if self.rows == len(self.chunk):
+            self.hand_over()
+
+    def hand_over(self):
+        """
+        Queues the current chunk for writing and continues in a free one
+        """
+        if self.error is not None:
+            raise self.error
+        self.pending.put((self.chunk, self.rows))
+        self.chunk = self.free.get()
+        self.rows = 0
+
+    def write_chunks(self):
+        """
+        Body of the writer thread, writes the queued chunks until it receives None
+        """
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            chunk, rows = item
+            try:
+                if self.error is None:
+                    self.write(chunk[:rows])
+            except Exception as error:
+                self.error = error
+            self.free.put(chunk)
+
+    def write(self, rows: np.ndarray):
+        """
+        Appends rows to the output file, runs on the writer thread
+
+        Parameters
+        ----------
+        :param rows: The rows to write
+        """
+        if self.format == "csv":
+            with open(self.path, "a") as out:
+                np.savetxt(out, rows, fmt="%d", delimiter=",")
+        elif self.format == "npz":
+            with open(self.raw_path, "ab") as out:
+                rows.tofile(out)
+        else:
+            table = pyarrow.table({name: rows[:, i] for i, name in enumerate(self.columns)})
+            if self.parquet_writer is None:
+                self.parquet_writer = pyarrow.parquet.ParquetWriter(self.path, table.schema)
+            self.parquet_writer.write_table(table)
+
+    def close(self):
+        """
+        Writes the last partial chunk, waits for the writer thread and finishes the output file
+        """
+        if self.closed:
+            return
+        self.closed = True
+        if self.rows > 0:
+            self.hand_over()
+        self.pending.put(None)
+        self.writer.join()
+        if self.error is not None:
+            raise self.error
+
+        if self.format == "npz":
+            # Column wise copy from the memory mapped rows, np.savez streams it into the archive
+            if self.frames > 0:
+                rows = np.memmap(self.raw_path, dtype=np.int64, mode="r").reshape(-1, len(self.columns))
+            else:
+                rows = np.zeros((0, len(self.columns)), dtype=np.int64)
+            np.savez(self.path, **{name: rows[:, i] for i, name in enumerate(self.columns)})
+            del rows
+            os.remove(self.raw_path)
+        elif self.format == "parquet":
+            if self.parquet_writer is None:
+                self.write(np.zeros((0, len(self.columns)), dtype=np.int64))
+            self.parquet_writer.close()
+
+    def __enter__(self) -> "TimeSeriesRecorder":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,110 @@
+'''
+Encodes raw frames with an ffmpeg subprocess: every frame is the RGBA buffer of
+an Agg canvas written straight to the stdin of ffmpeg, without the matplotlib
+animation writers
+'''
+import os
+import subprocess
+import tempfile
+import matplotlib as mpl
+
+
+class FFmpegPipe():
+    """
+    Video file fed frame by frame through the stdin of ffmpeg. The binary is the one Matplotlib is configured with,
+    rcParams["animation.ffmpeg_path"], unless another one is given
+    """
+
+    def __init__(self, path: str, width: int, height: int, fps: int = 30, ffmpeg: str = None, codec: str = "libx264"):
+        """
+        Constructor to start the ffmpeg process
+
+        Parameters
+        ----------
+        :param path: Path to the output video
+        :param width: Width of every frame in pixels
+        :param height: Height of every frame in pixels
+        :param fps: Frames per second of the video
+        :param ffmpeg: Path to the ffmpeg binary
+        :param codec: Video codec of the output
+        """
+        self.path       = path
+        self.frame_size = width * height * 4
+        self.frames     = 0
+
+        # The input is raw RGBA, the output is padded to even dimensions as yuv420p needs them
+        command = [ffmpeg or mpl.rcParams["animation.ffmpeg_path"], "-y", "-loglevel", "error",
+                    "-f", "rawvideo", "-pix_fmt", "rgba", "-s", "%dx%d" % (width, height), "-r", str(fps), "-i", "-",
+                    "-an", "-vcodec", codec, "-pix_fmt", "yuv420p", "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", path]
+
+        # Errors go to a file, a pipe that nobody reads could fill up and block ffmpeg
+        self.log     = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self.log)
+
+    def write(self, frame):
+        """
+        Writes one frame
+
+        Parameters
+        ----------
+        :param frame: Buffer of height x width RGBA bytes, such as FigureCanvasAgg.buffer_rgba()
+        """
+        frame = memoryview(frame).cast("B")
+        if len(frame) != self.frame_size:
+            raise ValueError("Frame of " + str(len(frame)) + " bytes, expected " + str(self.frame_size))
+        try:
+            self.process.stdin.write(frame)
+        except BrokenPipeError:
+            self.process.wait()
+            raise RuntimeError("ffmpeg stopped: " + self.read_log())
+        self.frames += 1
+
+    def read_log(self) -> str:
+        """
+        Returns what ffmpeg wrote to stderr
+        """
+        self.log.seek(0)
+        return self.log.read().decode(errors="replace").strip()
+
+    def close(self):
+        """
+        Closes the stdin of ffmpeg and waits for it to finish the video
+        """
+        if self.process.stdin.closed:
+            return
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        if self.process.wait() != 0:
+            raise RuntimeError("ffmpeg failed with exit code " + str(self.process.returncode) + ": " + self.read_log())
+        self.log.close()
+
+    def __enter__(self) -> "FFmpegPipe":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def concat(paths: list, path: str, ffmpeg: str = None):
+    """
+    Joins videos encoded with the same settings, such as the segments written by FFmpegPipe, without re-encoding
+
+    Parameters
+    ----------
+    :param paths: Paths to the videos, in order
+    :param path: Path to the joined video
+    :param ffmpeg: Path to the ffmpeg binary
+    """
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as listing:
+        for segment in paths:
+            listing.write("file '" + os.path.abspath(segment).replace("'", "'\\''") + "'\n")
+    try:
+        result = subprocess.run([ffmpeg or mpl.rcParams["animation.ffmpeg_path"], "-y", "-loglevel", "error",
+                                    "-f", "concat", "-safe", "0", "-i", listing.name, "-c", "copy", path],
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    finally:
+        os.remove(listing.name)
+    if result.returncode != 0:
+        raise RuntimeError("ffmpeg failed with exit code " + str(result.returncode) + ": " + result.stderr.decode(errors="replace").strip())
@@ -0,0 +1,281 @@
+'''
+Live view of a running simulation through shared memory: the simulation
+publishes its per frame counters and a selection of person columns into a
+multiprocessing.shared_memory segment after every frame, and any process on the
+same machine can attach to it by name and read them without copies or pickling.
+A sequence number makes every frame a consistent snapshot (seqlock): it is odd
+while a frame is being written and even once the frame is complete.
+
+Usage: python -m src.shared_state NAME   prints the counters of a running simulation
+'''
+import argparse
+import json
+import sys
+import time
+import numpy as np
+from multiprocessing import shared_memory
+from src.population_util import PopulationUtil
+import src.person_properties_util as index
+
+# Counters published with every frame, in the order they are stored
+counters = ["healthy", "infected", "immune", "dead", "new_infections", "hospitalized", "social_distancing", "mask_wearing"]
+
+# Person columns published by default, enough to draw the population
+default_columns = ["x_axis", "y_axis", "current_state"]
+
+# The segment starts with a header: magic, sequence number, frame, length of the JSON layout, the JSON layout
+magic       = b"VSIMSHM1"
+header_size = 4096
+alignment   = 64
+
+
+def get_layout(size: int, columns: list) -> tuple:
+    """
+    Places the counters and the columns in the segment, every array starts on a 64 byte boundary after the header
+
+    Parameters
+    ----------
+    :param size: Number of persons
+    :param columns: Names of the published columns, see person_properties_util.names
+
+    :return Tuple of the layout, a dictionary that is stored as JSON in the header, and the size of the segment
+    """
+    offset = header_size
+    layout = {"size": size, "counters": counters, "counters_offset": offset, "columns": {}}
+    offset += len(counters) * 8
+    for name in columns:
+        dtype = np.dtype(index.dtypes[index.names.index(name)])
+        offset = -(-offset // alignment) * alignment
+        layout["columns"][name] = {"dtype": dtype.str, "offset": offset}
+        offset += size * dtype.itemsize
+    return layout, max(offset, header_size + alignment)
+
+
+def get_views(buffer, layout: dict) -> tuple:
+    """
+    Creates the arrays over a segment
+
+    :return Tuple of the sequence number, the frame, the counters and a dictionary of the columns
+    """
+    seq      = np.ndarray((1,), dtype=np.uint64, buffer=buffer, offset=8)
+    frame    = np.ndarray((1,), dtype=np.int64, buffer=buffer, offset=16)
+    counts   = np.ndarray((len(layout["counters"]),), dtype=np.int64, buffer=buffer, offset=layout["counters_offset"])
+    columns  = {name: np.ndarray((layout["size"],), dtype=np.dtype(column["dtype"]), buffer=buffer, offset=column["offset"])
+                for name, column in layout["columns"].items()}
+    return seq, frame, counts, columns
+
+
+def attach(name: str) -> shared_memory.SharedMemory:
+    """
+    Attaches to an existing segment without taking ownership of it
+
+    Parameters
+    ----------
+    :param name: Name of the segment
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+
+    # Before Python 3.13 attaching registers the segment with the resource tracker, which would remove it when
+    # this process exits, so the registration is skipped
+    from multiprocessing import resource_tracker
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None if rtype == "shared_memory" else register(name, rtype)
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+class SharedStatePublisher():
+    """
+    Observer of PopulationUtil.move() copying the counters and the selected person columns into a shared memory
+    segment after every frame. The segment is removed by close()
+    """
+
+    def __init__(self, population_util: PopulationUtil, name: str = None, columns: list = default_columns, every: int = 1):
+        """
+        Constructor to create the segment and publish the current state of the simulation
+
+        Parameters
+        ----------
+        :param population_util: The simulation to publish
+        :param name: Name of the segment, a random one is chosen when not given
+        :param columns: Names of the person columns to publish, see person_properties_util.names
+        :param every: Only every every-th frame is published
+        """
+        self.every  = max(1, every)
+        self.layout, nbytes = get_layout(population_util.size, list(columns))
+        description = json.dumps(self.layout).encode()
+        if 32 + len(description) > header_size:
+            raise ValueError("Too many columns to publish")
+
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=nbytes)
+        self.name = self.shm.name
+        self.shm.buf[:8] = magic
+        np.ndarray((1,), dtype=np.uint64, buffer=self.shm.buf, offset=24)[0] = len(description)
+        self.shm.buf[32:32 + len(description)] = description
+        self.seq, self.frame, self.counts, self.columns = get_views(self.shm.buf, self.layout)
+        self.indices = {name: index.names.index(name) for name in self.columns}
+        self.publish(population_util, population_util.frame)
+
+    def attach(self, population_util: PopulationUtil) -> "SharedStatePublisher":
+        """
+        Registers the publisher as an observer of the given simulation
+
+        Parameters
+        ----------
+        :param population_util: The simulation to publish
+
+        :return The publisher itself
+        """
+        population_util.add_observer(self.publish)
+        return self
+
+    def publish(self, population_util: PopulationUtil, frame: int):
+        """
+        Copies the frame that was just simulated into the segment, between two increments of the sequence number
+
+        Parameters
+        ----------
+        :param population_util: The simulation
+        :param frame: The frame that was just simulated
+        """
+        if frame % self.every != 0 and frame >= 0:
+            return
+        persons = population_util.persons
+        self.seq[0] += 1
+        for name, column in self.columns.items():
+            column[:] = persons[:, self.indices[name]]
+        self.counts[:4] = population_util.population.get_state_counts()
+        self.counts[4]  = population_util.virus.new_infections
+        self.counts[5]  = population_util.population.get_hospital_occupancy()
+        self.counts[6]  = population_util.social_distancing_enforced
+        self.counts[7]  = population_util.mask_wearing_enforced
+        self.frame[0]   = frame
+        self.seq[0] += 1
+
+    def close(self):
+        """
+        Removes the segment, attached readers keep their mapping until they close it
+        """
+        if self.shm is None:
+            return
+        del self.seq, self.frame, self.counts, self.columns
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+    def __enter__(self) -> "SharedStatePublisher":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SharedStateReader():
+    """
+    Attaches to the segment of a SharedStatePublisher. The arrays are read only views of the shared memory, so
+    nothing is copied until read() is called
+    """
+
+    def __init__(self, name: str):
+        """
+        Constructor to attach to a segment
+
+        Parameters
+        ----------
+        :param name: Name of the segment, see SharedStatePublisher.name
+        """
+        self.shm = attach(name)
+        if bytes(self.shm.buf[:8]) != magic:
+            self.shm.close()
+            raise ValueError("Not a simulation state segment: " + name)
+        length = int(np.ndarray((1,), dtype=np.uint64, buffer=self.shm.buf, offset=24)[0])
+        self.layout = json.loads(bytes(self.shm.buf[32:32 + length]).decode())
+        self.seq, self.frame, self.counts, self.columns = get_views(self.shm.buf, self.layout)
+        for array in [self.counts] + list(self.columns.values()):
+            array.flags.writeable = False
+
+    def get_seq(self) -> int:
+        """
+        Returns the current sequence number, odd while a frame is being written
+        """
+        return int(self.seq[0])
+
+    def is_consistent(self, seq: int) -> bool:
+        """
+        Returns whether the views still show the complete frame that was published when get_seq() returned seq,
+        check it after using the views directly
+
+        Parameters
+        ----------
+        :param seq: A sequence number returned by get_seq()
+        """
+        return seq % 2 == 0 and int(self.seq[0]) == seq
+
+    def read(self, columns: list = None, timeout: float = 1.0) -> dict:
+        """
+        Copies a consistent snapshot, retrying while the publisher is writing
+
+        Parameters
+        ----------
+        :param columns: Names of the columns to copy, all of the published ones when not given
+        :param timeout: Seconds to keep retrying for
+
+        :return Dictionary with the sequence number, the frame, the counters by name and the copied columns by name
+        """
+        names = list(self.columns) if columns is None else columns
+        deadline = time.perf_counter() + timeout
+        while True:
+            seq = self.get_seq()
+            if seq % 2 == 0:
+                snapshot = {"seq": seq, "frame": int(self.frame[0]),
+                            "counters": dict(zip(self.layout["counters"], self.counts.tolist())),
+                            "columns": {name: self.columns[name].copy() for name in names}}
+                if self.is_consistent(seq):
+                    return snapshot
+            if time.perf_counter() > deadline:
+                raise TimeoutError("No consistent frame within " + str(timeout) + " s")
+            time.sleep(0)
+
+    def close(self):
+        """
+        Detaches from the segment
+        """
+        if self.shm is None:
+            return
+        del self.seq, self.frame, self.counts, self.columns
+        self.shm.close()
+        self.shm = None
+
+    def __enter__(self) -> "SharedStateReader":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def parse_args(argv: list) -> argparse.Namespace:
+    """
+    Parses the command line arguments
+    """
+    parser = argparse.ArgumentParser(description="Print the counters of a simulation published to shared memory")
+    parser.add_argument("name", help="Name of the shared memory segment")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between two lines")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    with SharedStateReader(args.name) as reader:
+        last = None
+        while True:
+            snapshot = reader.read(columns=[])
+            if snapshot["seq"] != last:
+                last = snapshot["seq"]
+                print("frame " + str(snapshot["frame"]) + ": " +
+                        ", ".join(name + " " + str(value) for name, value in snapshot["counters"].items()), file = sys.stdout)
+            time.sleep(args.interval)
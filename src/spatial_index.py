@@ -0,0 +1,328 @@
+'''
+Spatial indexes used to look up the persons close to an infected individual
+without scanning the whole population
+'''
+import math
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+
+def make_index(infection_range: float, x_bounds: list = [0, 1], y_bounds: list = [0, 1]):
+    """
+    Returns the spatial index to use for the given infection range, a KD-tree when SciPy is installed and the
+    uniform grid otherwise
+
+    Parameters
+    ----------
+    :param infection_range: The infection range of the virus
+    :param x_bounds: List containing the lower and upper bound for the x axis
+    :param y_bounds: List containing the lower and upper bound for the y axis
+
+    :return KDTreeIndex or SpatialGrid
+    """
+    if cKDTree is not None:
+        return KDTreeIndex()
+    return SpatialGrid(infection_range, x_bounds, y_bounds)
+
+
+def _to_csr(owner: np.ndarray, rows: np.ndarray, size: int) -> tuple:
+    """
+    Sorts the (owner, row) pairs by owner and then by row, and returns them as CSR offsets and indices
+    """
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(owner, minlength=size), out=offsets[1:])
+
+    #Sorting a single combined key is a lot cheaper than a lexsort over the two arrays
+    span = int(rows.max()) + 1 if len(rows) else 1
+    keys = np.sort(owner.astype(np.int64) * span + rows)
+    return offsets, keys % span
+
+
+class SpatialGrid():
+    """
+    Uniform grid over the simulation space. Every person is bucketed into a square cell whose side is at least
+    the half width of the infection box, so all the persons inside the box around an infector lie in the
+    infector's cell or one of its 8 neighbours
+    """
+
+    # Upper bound on the number of cells along one axis, keeps the cell table small for tiny infection ranges
+    max_cells_per_axis = 1024
+
+    # Upper bound on the number of candidate pairs expanded at once by neighbours()
+    max_pairs_per_batch = 1 << 22
+
+    def __init__(self, infection_range: float, x_bounds: list = [0, 1], y_bounds: list = [0, 1]):
+        """
+        Constructor to set up the grid geometry
+
+        Parameters
+        ----------
+        :param infection_range: The infection range of the virus, the cell side is derived as sqrt(infection_range)
+        :param x_bounds: List containing the lower and upper bound for the x axis
+        :param y_bounds: List containing the lower and upper bound for the y axis
+        """
+        reach = math.sqrt(infection_range)
+        self.x_min      = float(x_bounds[0])
+        self.y_min      = float(y_bounds[0])
+        self.x_cells    = self._cell_count(x_bounds, reach)
+        self.y_cells    = self._cell_count(y_bounds, reach)
+        self.cell_w     = (x_bounds[1] - x_bounds[0]) / self.x_cells
+        self.cell_h     = (y_bounds[1] - y_bounds[0]) / self.y_cells
+        self.order      = None
+        self.cell_start = None
+        self.sorted_x   = None
+        self.sorted_y   = None
+
+    def _cell_count(self, bounds: list, reach: float) -> int:
+        """
+        Number of cells along an axis so that each cell is at least as wide as the reach of the infection box
+        """
+        extent = bounds[1] - bounds[0]
+        if reach <= 0:
+            return self.max_cells_per_axis
+        return int(max(1, min(math.floor(extent / reach), self.max_cells_per_axis)))
+
+    def cell_of(self, x: np.ndarray, y: np.ndarray) -> tuple:
+        """
+        Returns the (column, row) cell coordinates for the given positions. Persons outside the bounds are clamped
+        into the border cells, clamping is monotonic so neighbour lookups stay exact
+
+        Parameters
+        ----------
+        :param x: The x coordinates
+        :param y: The y coordinates
+
+        :return Tuple of the integer cell column and cell row arrays
+        """
+        cx = np.clip(np.floor((np.asarray(x) - self.x_min) / self.cell_w), 0, self.x_cells - 1).astype(np.int64)
+        cy = np.clip(np.floor((np.asarray(y) - self.y_min) / self.cell_h), 0, self.y_cells - 1).astype(np.int64)
+        return cx, cy
+
+    def build(self, x: np.ndarray, y: np.ndarray):
+        """
+        Rebuilds the index for the given positions, needs to be called every time the persons move
+
+        Parameters
+        ----------
+        :param x: The x coordinate of every person in the population
+        :param y: The y coordinate of every person in the population
+        """
+        cx, cy = self.cell_of(x, y)
+        keys = cx * self.y_cells + cy
+
+        # Row indices sorted by cell, stable so that rows inside a cell stay in ascending order
+        self.order      = np.argsort(keys, kind="stable")
+        self.cell_start = np.searchsorted(keys[self.order], np.arange(self.x_cells * self.y_cells + 1))
+
+        # Positions in cell order, so that the persons of neighbouring cells are read sequentially
+        self.sorted_x   = np.asarray(x)[self.order]
+        self.sorted_y   = np.asarray(y)[self.order]
+
+    def is_built(self) -> bool:
+        """
+        Returns whether the index has been built at least once
+        """
+        return self.order is not None
+
+    def query(self, x_bounds: list, y_bounds: list) -> np.ndarray:
+        """
+        Returns the row indices of the persons in the cells overlapping the box, the caller still has to apply the
+        exact box test on the returned candidates
+
+        Parameters
+        ----------
+        :param x_bounds: List containing the lower and upper bound of the box on the x axis
+        :param y_bounds: List containing the lower and upper bound of the box on the y axis
+
+        :return Sorted row indices of the candidate persons
+        """
+        #Cells are clamped monotonically, so the cells of the two corners bound every cell the box overlaps
+        x_lo, y_lo = self.cell_of(x_bounds[0], y_bounds[0])
+        x_hi, y_hi = self.cell_of(x_bounds[1], y_bounds[1])
+        cols = range(int(x_lo), int(x_hi) + 1)
+        rows_lo = int(y_lo)
+        rows_hi = int(y_hi)
+
+        # Cells of one grid column are contiguous in the sorted order, so each column is a single slice
+        chunks = [self.order[self.cell_start[c * self.y_cells + rows_lo]:self.cell_start[c * self.y_cells + rows_hi + 1]]
+                    for c in cols]
+        return np.sort(np.concatenate(chunks))
+
+    def neighbours(self, x: np.ndarray, y: np.ndarray, reach: float, mask: np.ndarray) -> tuple:
+        """
+        Finds, for every query point, the indexed persons allowed by mask that lie strictly inside the box of half
+        width reach around the point. All the query points are handled in one call
+
+        Parameters
+        ----------
+        :param x: The x coordinates of the query points
+        :param y: The y coordinates of the query points
+        :param reach: Half width of the box around each query point
+        :param mask: Boolean array over the indexed persons, only the persons where it is True are returned
+
+        :return Tuple of the CSR offsets (one more than the number of query points) and the row indices of the
+                neighbours; the neighbours of query point i are indices[offsets[i]:offsets[i + 1]] in ascending order
+        """
+        x = np.asarray(x)
+        y = np.asarray(y)
+        cx, cy = self.cell_of(x, y)
+
+        #One slice of the sorted order per query point and neighbouring grid column
+        cols = cx[:, None] + np.array([-1, 0, 1])
+        valid = (cols >= 0) & (cols < self.x_cells)
+        cols = np.clip(cols, 0, self.x_cells - 1) * self.y_cells
+        start = self.cell_start[cols + np.maximum(cy - 1, 0)[:, None]]
+        stop = self.cell_start[cols + np.minimum(cy + 1, self.y_cells - 1)[:, None] + 1]
+        lengths = np.where(valid, stop - start, 0)
+
+        #Expand the slices in batches of query points to keep the memory bounded
+        sorted_mask = np.asarray(mask)[self.order]
+        owners = []
+        neighbours = []
+        per_point = np.cumsum(lengths.sum(axis=1))
+        first = 0
+        while first < len(x):
+            expanded = per_point[first - 1] if first > 0 else 0
+            last = max(first + 1, int(np.searchsorted(per_point, expanded + self.max_pairs_per_batch, side="right")))
+            n = lengths[first:last].ravel()
+            owner = np.repeat(np.repeat(np.arange(first, last), 3), n)
+            pos = np.arange(int(n.sum())) + np.repeat(start[first:last].ravel() - (np.cumsum(n) - n), n)
+            px = self.sorted_x[pos]
+            py = self.sorted_y[pos]
+            keep = (sorted_mask[pos] &
+                    (x[owner] - reach < px) & (x[owner] + reach > px) &
+                    (y[owner] - reach < py) & (y[owner] + reach > py))
+            owners.append(owner[keep])
+            neighbours.append(self.order[pos[keep]])
+            first = last
+
+        if len(owners) == 0:
+            return np.zeros(len(x) + 1, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return _to_csr(np.concatenate(owners), np.concatenate(neighbours), len(x))
+
+
+class KDTreeIndex():
+    """
+    Spatial index backed by SciPy's KD-tree, offers the same queries as SpatialGrid
+    """
+
+    # Upper bound on the number of candidate pairs found at once by neighbours()
+    max_pairs_per_batch = SpatialGrid.max_pairs_per_batch
+
+    def __init__(self):
+        """
+        Constructor, the positions are set by build()
+        """
+        self.tree = None
+        self.x    = None
+        self.y    = None
+
+    def build(self, x: np.ndarray, y: np.ndarray):
+        """
+        Sets the positions to index, needs to be called every time the persons move. The trees themselves are
+        only built by the queries, since the batched query indexes the allowed persons only
+
+        Parameters
+        ----------
+        :param x: The x coordinate of every person in the population
+        :param y: The y coordinate of every person in the population
+        """
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+        self.tree = None
+
+    def is_built(self) -> bool:
+        """
+        Returns whether the index has been built at least once
+        """
+        return self.x is not None
+
+    def query(self, x_bounds: list, y_bounds: list) -> np.ndarray:
+        """
+        Returns the sorted row indices of the persons inside or on the border of the box, the caller still has
+        to apply the exact box test on the returned candidates
+
+        Parameters
+        ----------
+        :param x_bounds: List containing the lower and upper bound of the box on the x axis
+        :param y_bounds: List containing the lower and upper bound of the box on the y axis
+
+        :return Sorted row indices of the candidate persons
+        """
+        if self.tree is None:
+            self.tree = cKDTree(np.column_stack((self.x, self.y)))
+        centre = [(x_bounds[0] + x_bounds[1]) / 2, (y_bounds[0] + y_bounds[1]) / 2]
+        reach = max(x_bounds[1] - x_bounds[0], y_bounds[1] - y_bounds[0]) / 2
+        return np.array(self.tree.query_ball_point(centre, reach, p=np.inf, return_sorted=True), dtype=np.int64)
+
+    def neighbours(self, x: np.ndarray, y: np.ndarray, reach: float, mask: np.ndarray) -> tuple:
+        """
+        Finds, for every query point, the indexed persons allowed by mask that lie strictly inside the box of half
+        width reach around the point. See SpatialGrid.neighbours()
+        """
+        x = np.asarray(x)
+        y = np.asarray(y)
+        allowed = np.flatnonzero(mask)
+        if len(x) == 0 or len(allowed) == 0:
+            return np.zeros(len(x) + 1, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        #Split the query points into batches of at most max_pairs_per_batch pairs to keep the memory bounded,
+        #unless all the pairs fit into one batch anyway
+        allowed_tree = cKDTree(np.column_stack((self.x[allowed], self.y[allowed])))
+        points = np.column_stack((x, y))
+        if len(x) * len(allowed) > self.max_pairs_per_batch:
+            order, per_point = self.count_pairs(x, y, allowed, reach)
+        else:
+            order, per_point = np.arange(len(x)), np.zeros(len(x), dtype=np.int64)
+
+        owners = []
+        neighbours = []
+        first = 0
+        while first < len(x):
+            found = per_point[first - 1] if first > 0 else 0
+            last = max(first + 1, int(np.searchsorted(per_point, found + self.max_pairs_per_batch, side="right")))
+
+            #A dual tree traversal returns all the pairs as arrays instead of one Python list per query point
+            query_tree = cKDTree(points[order[first:last]])
+            pairs = query_tree.sparse_distance_matrix(allowed_tree, reach, p=np.inf, output_type="ndarray")
+            owner = order[first:last][pairs["i"]]
+            rows = allowed[pairs["j"]]
+            px = self.x[rows]
+            py = self.y[rows]
+            keep = ((x[owner] - reach < px) & (x[owner] + reach > px) &
+                    (y[owner] - reach < py) & (y[owner] + reach > py))
+            owners.append(owner[keep])
+            neighbours.append(rows[keep])
+            first = last
+        return _to_csr(np.concatenate(owners), np.concatenate(neighbours), len(x))
+
+    def count_pairs(self, x: np.ndarray, y: np.ndarray, allowed: np.ndarray, reach: float) -> tuple:
+        """
+        Bounds the number of pairs of every query point by the allowed persons in the 3 by 3 cells of a uniform
+        grid around it, which is a lot cheaper than counting them with the tree
+
+        Parameters
+        ----------
+        :param x: The x coordinates of the query points
+        :param y: The y coordinates of the query points
+        :param allowed: Rows of the allowed persons
+        :param reach: Half width of the box around each query point
+
+        :return Tuple of the query points sorted by cell, so that every batch covers a compact area, and the
+                cumulative bound on the pairs in that order
+        """
+        x_bounds = [min(x.min(), self.x[allowed].min()), max(x.max(), self.x[allowed].max())]
+        y_bounds = [min(y.min(), self.y[allowed].min()), max(y.max(), self.y[allowed].max())]
+        grid = SpatialGrid(reach ** 2, x_bounds, y_bounds)
+        cx, cy = grid.cell_of(self.x[allowed], self.y[allowed])
+        cells = np.bincount(cx * grid.y_cells + cy, minlength=grid.x_cells * grid.y_cells).reshape(grid.x_cells, grid.y_cells)
+        padded = np.pad(cells, 1)
+        around = sum(padded[dx:dx + grid.x_cells, dy:dy + grid.y_cells] for dx in range(3) for dy in range(3))
+
+        cx, cy = grid.cell_of(x, y)
+        order = np.argsort(cx * grid.y_cells + cy, kind="stable")
+        return order, np.cumsum(around[cx[order], cy[order]])
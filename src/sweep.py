@@ -0,0 +1,194 @@
+'''
+Parameter sweeps: runs the headless simulation for many combinations of the
+PopulationUtil constructor arguments over all cores and streams one result
+row per run to a CSV file
+'''
+import csv
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from src.population_util import PopulationUtil, spawn_seeds
+from src.headless import HeadlessSimulation
+
+# Constructor arguments that have to stay integers when sampled from a range
+integer_params = {"size", "min_age", "max_age", "recovery_time", "total_healthcare_capacity",
+                    "social_distancing_at", "mask_wearing_at"}
+
+# Outcome columns written after the parameters
+result_columns = ["healthy", "infected", "immune", "dead", "hospitalized", "total_infected", "peak_infected", "peak_frame"]
+
+
+def run_single(run_id: int, params: dict, frames: int, seed: int, backend: str = "numpy") -> dict:
+    """
+    Runs one simulation headless and returns its result row. Module level so that worker processes can pickle it
+
+    Parameters
+    ----------
+    :param run_id: Number of the run in the sweep
+    :param params: Keyword arguments for the PopulationUtil constructor
+    :param frames: Number of frames to simulate
+    :param seed: Seed for the random number generator of the run
+    :param backend: Implementation of the kernels, see PopulationUtil
+
+    :return Dictionary holding the run id, seed, parameters and outcome columns
+    """
+    simulation = HeadlessSimulation(PopulationUtil(seed=seed, backend=backend, **params))
+    counts = simulation.run(frames)
+    final = simulation.get_final_counts()
+    peak = int(np.argmax(counts[:, 2]))
+
+    row = {"run": run_id, "seed": seed}
+    row.update(flatten(params))
+    row.update({name: final[name] for name in ["healthy", "infected", "immune", "dead", "hospitalized"]})
+    row["total_infected"] = params["size"] - final["healthy"]
+    row["peak_infected"] = int(counts[peak, 2])
+    row["peak_frame"] = int(counts[peak, 0])
+    return row
+
+
+def flatten(params: dict) -> dict:
+    """
+    Flattens the dictionary valued parameters, like the mortality rates, into one column per key
+    """
+    flat = {}
+    for name, value in params.items():
+        if isinstance(value, dict):
+            for key, item in value.items():
+                flat[name + "." + str(key)] = item
+        else:
+            flat[name] = value
+    return flat
+
+
+class ParameterSweep():
+    """
+    Fans simulation runs out over a process pool and streams their results to CSV as they finish
+    """
+
+    def __init__(self, base_params: dict, frames: int, workers: int = None, seed: int = None, backend: str = "numpy"):
+        """
+        Constructor to set the parameters shared by all the runs
+
+        Parameters
+        ----------
+        :param base_params: Keyword arguments for the PopulationUtil constructor, overridden by every run
+        :param frames: Number of frames to simulate per run
+        :param workers: Number of worker processes, defaults to the number of cores
+        :param seed: Seed from which the seeds of the runs are derived
+        :param backend: Implementation of the kernels used by every run, see PopulationUtil
+        """
+        self.base_params = base_params
+        self.frames      = frames
+        self.workers     = workers or os.cpu_count()
+        self.seed        = seed
+        self.backend     = backend
+
+    @staticmethod
+    def grid(parameters: dict) -> list:
+        """
+        Returns every combination of the given parameter values
+
+        Parameters
+        ----------
+        :param parameters: Dictionary from parameter name to the list of its values
+
+        :return List of parameter dictionaries
+        """
+        names = list(parameters.keys())
+        return [dict(zip(names, values)) for values in itertools.product(*[parameters[name] for name in names])]
+
+    @staticmethod
+    def latin_hypercube(parameters: dict, samples: int, seed: int = None) -> list:
+        """
+        Returns a Latin hypercube sample of the given parameter ranges; every range is cut into samples strata
+        and each stratum is used exactly once per parameter
+
+        Parameters
+        ----------
+        :param parameters: Dictionary from parameter name to its [low, high] range
+        :param samples: Number of parameter combinations to draw
+        :param seed: Seed for the sampling
+
+        :return List of parameter dictionaries
+        """
+        rng = np.random.default_rng(seed)
+        runs = [dict() for _ in range(samples)]
+        for name, (low, high) in parameters.items():
+            points = (rng.permutation(samples) + rng.uniform(size=samples)) / samples
+            values = low + points * (high - low)
+            for run, value in zip(runs, values):
+                run[name] = int(round(value)) if name in integer_params else float(value)
+        return runs
+
+    @staticmethod
+    def from_spec(spec: dict) -> list:
+        """
+        Returns the runs described by a sweep specification, which is one of
+        {"mode": "grid", "parameters": {name: [values]}},
+        {"mode": "list", "runs": [{name: value}]} or
+        {"mode": "latin_hypercube", "samples": n, "parameters": {name: [low, high]}, "seed": s}
+
+        Parameters
+        ----------
+        :param spec: The sweep specification
+
+        :return List of parameter dictionaries
+        """
+        mode = spec.get("mode", "grid")
+        if mode == "grid":
+            return ParameterSweep.grid(spec["parameters"])
+        if mode == "list":
+            return list(spec["runs"])
+        if mode == "latin_hypercube":
+            return ParameterSweep.latin_hypercube(spec["parameters"], spec["samples"], spec.get("seed"))
+        raise ValueError("Unknown sweep mode: " + str(mode))
+
+    def run(self, runs: list, out_path: str) -> int:
+        """
+        Runs every parameter combination and appends a CSV row as soon as a run finishes, rows are therefore in
+        completion order and carry the run number
+
+        Parameters
+        ----------
+        :param runs: List of dictionaries overriding the base parameters
+        :param out_path: Path to the CSV file to write
+
+        :return Number of finished runs
+        """
+        jobs = [dict(self.base_params, **run) for run in runs]
+        seeds = spawn_seeds(self.seed, len(jobs))
+
+        fieldnames = ["run", "seed"]
+        for params in jobs:
+            fieldnames += [name for name in flatten(params) if name not in fieldnames]
+        fieldnames += result_columns
+
+        finished = 0
+        with open(out_path, "w", newline="") as out, ProcessPoolExecutor(max_workers=self.workers) as executor:
+            writer = csv.DictWriter(out, fieldnames=fieldnames)
+            writer.writeheader()
+            futures = [executor.submit(run_single, i, params, self.frames, seeds[i], self.backend) for i, params in enumerate(jobs)]
+            for future in as_completed(futures):
+                writer.writerow(future.result())
+                out.flush()
+                finished += 1
+                print("Finished run " + str(finished) + " of " + str(len(jobs)), file = sys.stdout)
+        return finished
+
+    def run_spec(self, spec_path: str, out_path: str) -> int:
+        """
+        Loads a sweep specification from a JSON file and runs it, see from_spec()
+
+        Parameters
+        ----------
+        :param spec_path: Path to the JSON sweep specification
+        :param out_path: Path to the CSV file to write
+
+        :return Number of finished runs
+        """
+        with open(spec_path) as spec_file:
+            spec = json.load(spec_file)
+        return self.run(self.from_spec(spec), out_path)
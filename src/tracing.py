@@ -0,0 +1,167 @@
+'''
+Infection tracing: the tree of who infected whom, built from the infected_by,
+current_state and infected_at columns with array operations, exported as CSV,
+npz or GraphML, and drawn with a layered layout where the x axis is the
+generation of the infection. Matplotlib and networkx are only imported to draw
+and to export GraphML, so headless runs can export the tree
+'''
+import os
+import numpy as np
+from src.population import Population
+import src.person_properties_util as index
+
+# Colour of every person in the drawing indexed by current state, first infections are drawn in root_color
+trace_colors = ["orange", "orange", "cornflowerblue", "indigo"]
+root_color = "red"
+
+
+class InfectionTrace():
+    """
+    Every person that has ever been infected, with who infected them, their state, the frame they were infected at
+    and their generation: 0 for the first infections and the persons infected from outside the trace, the
+    generation of the infector + 1 for everybody else
+    """
+
+    # Names of the exported columns, in the order they are stored
+    columns = ["person", "infected_by", "state", "infected_at", "generation"]
+
+    def __init__(self, person: np.ndarray, infected_by: np.ndarray, state: np.ndarray, infected_at: np.ndarray):
+        """
+        Constructor to set the infected persons and compute their generations
+
+        Parameters
+        ----------
+        :param person: Ids of the persons that have been infected
+        :param infected_by: Id of the infector of every person, their own id for the first infections. Persons
+                            whose infector is not among the traced persons, for instance a person infected in
+                            another region, are roots as well
+        :param state: Current state of every person
+        :param infected_at: Frame every person was infected at
+        """
+        self.person      = np.asarray(person, dtype=np.int64)
+        self.infected_by = np.asarray(infected_by, dtype=np.int64)
+        self.state       = np.asarray(state, dtype=np.int64)
+        self.infected_at = np.asarray(infected_at, dtype=np.int64)
+
+        # Position of every infector in person, so the tree can be walked with array indexing. Roots are their
+        # own parent
+        order = np.argsort(self.person)
+        self.parent = order[np.minimum(np.searchsorted(self.person, self.infected_by, sorter=order), len(order) - 1)]
+        self.roots  = (self.person == self.infected_by) | (self.person[self.parent] != self.infected_by)
+        self.parent[self.roots] = np.flatnonzero(self.roots)
+        self.generation = self.get_generations()
+
+    @classmethod
+    def from_population(cls, population: Population) -> "InfectionTrace":
+        """
+        Collects everybody that has been infected in a population
+
+        Parameters
+        ----------
+        :param population: The population
+
+        :return The InfectionTrace
+        """
+        persons = population.get_person()
+        infected = np.flatnonzero(persons[:, index.infected_by] != -1)
+        return cls(persons[:, index.id][infected], persons[:, index.infected_by][infected],
+                    persons[:, index.current_state][infected], persons[:, index.infected_at][infected])
+
+    def __len__(self) -> int:
+        return len(self.person)
+
+    def get_generations(self) -> np.ndarray:
+        """
+        Computes the generation of every person. An infector is always infected on an earlier frame than the
+        persons they infect, so the persons are handled one infection frame at a time, in order
+
+        :return Array with the generation of every person
+        """
+        generation = np.zeros(len(self), dtype=np.int64)
+        children = np.flatnonzero(~self.roots)
+        children = children[np.argsort(self.infected_at[children], kind="stable")]
+        _, starts = np.unique(self.infected_at[children], return_index=True)
+        for group in np.split(children, starts[1:]):
+            generation[group] = generation[self.parent[group]] + 1
+        return generation
+
+    def get_edges(self) -> np.ndarray:
+        """
+        Returns the infections as an edge list
+
+        :return Array of shape (infections, 2) with the infector and the infected person of every infection,
+                the roots have no edge
+        """
+        return np.column_stack((self.infected_by[~self.roots], self.person[~self.roots]))
+
+    def get_layout(self) -> np.ndarray:
+        """
+        Places every person in a column by generation, inside a column the persons are ordered by the position of
+        their infector so infections from the same person stay together and edges rarely cross
+
+        :return Array of shape (persons, 2) with the x and y coordinate of every person, both in [0, 1]
+        """
+        positions = np.zeros((len(self), 2))
+        last = max(int(self.generation.max(initial=0)), 1)
+        positions[:, 0] = self.generation / last
+        for generation in range(int(self.generation.max(initial=-1)) + 1):
+            members = np.flatnonzero(self.generation == generation)
+            members = members[np.lexsort((self.person[members], positions[self.parent[members], 1]))]
+            positions[members, 1] = (np.arange(len(members)) + 0.5) / len(members)
+        return positions
+
+    def save(self, path: str):
+        """
+        Saves the trace, the format follows the extension of the path: .csv and .npz store one row or array per
+        column of InfectionTrace.columns, .graphml stores a directed graph from every infector to the persons they
+        infected with the state, infection frame and generation as node attributes (needs networkx)
+
+        Parameters
+        ----------
+        :param path: Path to the output file
+        """
+        extension = os.path.splitext(path)[1].lower()
+        table = np.column_stack([getattr(self, name) for name in self.columns])
+        if extension == ".csv":
+            np.savetxt(path, table, fmt="%d", delimiter=",", header=",".join(self.columns), comments="")
+        elif extension == ".npz":
+            np.savez_compressed(path, **{name: getattr(self, name) for name in self.columns})
+        elif extension == ".graphml":
+            import networkx as nx
+            graph = nx.DiGraph()
+            graph.add_nodes_from((person, {"state": state, "infected_at": infected_at, "generation": generation})
+                                    for person, _, state, infected_at, generation in table.tolist())
+            graph.add_edges_from(self.get_edges().tolist())
+            nx.write_graphml(graph, path)
+        else:
+            raise ValueError("Unsupported trace format: " + path)
+
+    def draw(self, ax, max_persons: int = 200000) -> bool:
+        """
+        Draws the tree with the layered layout, the infections as one LineCollection and the persons as one
+        scatter, so the drawing time grows linearly with the number of persons
+
+        Parameters
+        ----------
+        :param ax: Matplotlib axes to draw on
+        :param max_persons: Traces with more persons are not drawn
+
+        :return Whether the trace was drawn
+        """
+        if len(self) == 0 or len(self) > max_persons:
+            return False
+        from matplotlib.collections import LineCollection
+        from matplotlib.colors import to_rgba_array
+
+        positions = self.get_layout()
+        children = np.flatnonzero(~self.roots)
+        segments = np.stack((positions[self.parent[children]], positions[children]), axis=1)
+        ax.add_collection(LineCollection(segments, colors="darkgray", linewidths=0.5, zorder=1))
+
+        colors = to_rgba_array(trace_colors + [root_color])[np.where(self.roots, len(trace_colors), self.state)]
+        sizes = np.where(self.roots, 50, 15)
+        ax.scatter(positions[:, 0], positions[:, 1], c=colors, s=sizes, zorder=2)
+        ax.set_xlim(-0.05, 1.05)
+        ax.set_ylim(0, 1)
+        ax.axis("off")
+        return True
@@ -0,0 +1,159 @@
+'''
+Records the positions and states of every person on every frame to memory
+mapped files, and plays a recording back in place of a PopulationUtil so a
+Visualization can draw any frame without simulating up to it. Must not import
+matplotlib, the recording runs headless
+'''
+import json
+import os
+import numpy as np
+from src.population import Population
+from src.population_util import PopulationUtil
+import src.person_properties_util as index
+
+# Attributes of the PopulationUtil kept with a recording, the ones Visualization reads
+attributes = ["size", "x_bounds", "y_bounds", "enforce_social_distance_at", "enforce_mask_wearing_at",
+                "social_distance_per", "total_healthcare_capacity"]
+
+
+class TrajectoryRecorder():
+    """
+    Observer of PopulationUtil.move() storing the x and y position and the state of every person, and the state
+    counts and the hospital occupancy, after every frame. Row 0 holds the population before the first frame,
+    row f + 1 the population after frame f
+    """
+
+    def __init__(self, directory: str, population_util: PopulationUtil, frames: int):
+        """
+        Constructor to allocate the files and record the current population as row 0
+
+        Parameters
+        ----------
+        :param directory: Directory to store the recording in, created if needed
+        :param population_util: The simulation to record
+        :param frames: Number of frames that will be recorded
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.frames    = 0
+        rows, size     = frames + 1, population_util.size
+        self.x         = np.lib.format.open_memmap(os.path.join(directory, "x.npy"), mode="w+", dtype=np.float32, shape=(rows, size))
+        self.y         = np.lib.format.open_memmap(os.path.join(directory, "y.npy"), mode="w+", dtype=np.float32, shape=(rows, size))
+        self.state     = np.lib.format.open_memmap(os.path.join(directory, "state.npy"), mode="w+", dtype=np.int8, shape=(rows, size))
+        self.counts    = np.zeros((rows, 5), dtype=np.int64)
+        self.meta      = {name: getattr(population_util, name) for name in attributes}
+        self.store(0, population_util)
+
+    def attach(self, population_util: PopulationUtil) -> "TrajectoryRecorder":
+        """
+        Registers the recorder as an observer of the given simulation, a row is recorded after every move()
+
+        Parameters
+        ----------
+        :param population_util: The simulation to record
+
+        :return The recorder itself
+        """
+        population_util.add_observer(self.record)
+        return self
+
+    def store(self, row: int, population_util: PopulationUtil):
+        """
+        Copies the positions, states and counts of the population into a row
+        """
+        persons = population_util.persons
+        self.x[row]          = persons[:, index.x_axis]
+        self.y[row]          = persons[:, index.y_axis]
+        self.state[row]      = persons[:, index.current_state]
+        self.counts[row, :4] = population_util.population.get_state_counts()
+        self.counts[row, 4]  = population_util.population.get_hospital_occupancy()
+
+    def record(self, population_util: PopulationUtil, frame: int):
+        """
+        Records the frame that was just simulated
+
+        Parameters
+        ----------
+        :param population_util: The simulation
+        :param frame: The frame that was just simulated
+        """
+        if self.frames + 1 == len(self.x):
+            raise ValueError("The recording is full after " + str(self.frames) + " frames")
+        self.frames += 1
+        self.store(self.frames, population_util)
+
+    def close(self):
+        """
+        Flushes the positions and states and writes the counts and the attributes of the simulation
+        """
+        for array in (self.x, self.y, self.state):
+            array.flush()
+        np.save(os.path.join(self.directory, "counts.npy"), self.counts[:self.frames + 1])
+        with open(os.path.join(self.directory, "meta.json"), "w") as out:
+            json.dump(dict(self.meta, frames=self.frames), out, default=float)
+
+    def __enter__(self) -> "TrajectoryRecorder":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class TrajectoryPlayer():
+    """
+    Stands in for the PopulationUtil of a recorded simulation: move(frame) loads the recorded frame into a
+    Population instead of simulating it. Only the positions, states and hospital occupancy are restored
+    """
+
+    def __init__(self, directory: str):
+        """
+        Constructor to open a recording made by TrajectoryRecorder, positioned before the first frame
+
+        Parameters
+        ----------
+        :param directory: Directory of the recording
+        """
+        with open(os.path.join(directory, "meta.json")) as meta_file:
+            meta = json.load(meta_file)
+        for name in attributes:
+            setattr(self, name, meta[name])
+        self.frames     = meta["frames"]
+        self.x          = np.load(os.path.join(directory, "x.npy"), mmap_mode="r")
+        self.y          = np.load(os.path.join(directory, "y.npy"), mmap_mode="r")
+        self.state      = np.load(os.path.join(directory, "state.npy"), mmap_mode="r")
+        self.counts     = np.load(os.path.join(directory, "counts.npy"))
+        self.population = Population(self.size)
+        self.persons    = self.population.get_person()
+        self.frame      = -1
+        self.timer      = None
+        self.load(0)
+
+    def load(self, row: int):
+        """
+        Copies a recorded row into the population
+        """
+        self.persons[:, index.x_axis]        = self.x[row]
+        self.persons[:, index.y_axis]        = self.y[row]
+        self.persons[:, index.current_state] = self.state[row]
+        self.population.hospital_occupancy   = int(self.counts[row, 4])
+
+    def move(self, frame: int):
+        """
+        Loads the population as it was after the given frame
+
+        Parameters
+        ----------
+        :param frame: The frame to show, between 0 and the number of recorded frames - 1
+        """
+        if not 0 <= frame < self.frames:
+            raise IndexError("Frame " + str(frame) + " is not in the recording of " + str(self.frames) + " frames")
+        self.load(frame + 1)
+        self.frame = frame
+
+    def get_history(self, frame: int) -> np.ndarray:
+        """
+        Returns the healthy, infected, immune and dead counts of the frames before the given one
+
+        :return Array of shape (frame, 4)
+        """
+        return self.counts[1:frame + 1, :4]
@@ -3,6 +3,8 @@ Created on Nov 29, 2020
 @author: Pallak Singh
 '''
 from src.population import Population
+from src.spatial_index import make_index, SpatialGrid
+from src import kernels
 import numpy as np
 import math
 import src.person_properties_util as index
@@ -13,105 +15,291 @@ class Virus():
     infecting, healing and dying
     """    
 
-    def __init__(self, infection_range: float, recovery_time: int, total_healthcare_capacity: int):
+    def __init__(self, infection_range: float, recovery_time: int, total_healthcare_capacity: int, rng: np.random.Generator = None,
+                    backend: str = "numpy"):
         """
-        The constructor is responsible for loading the virus statistics from the config file
+        The constructor is responsible for loading the virus statistics from the config file. The chances of
+        infecting and dying are drawn from rng, a new unseeded generator is used when it is not given. With the
+        "numba" backend the infections are found and transmitted by kernels.infect() over a SpatialGrid
         """  
+        if backend not in kernels.backends:
+            raise ValueError("Unknown backend: " + str(backend))
         self.infection_range           = infection_range
         self.recovery_time             = recovery_time
         self.total_healthcare_capacity = total_healthcare_capacity
+        self.backend                   = backend
+        self.spatial_index             = make_index(infection_range) if backend == "numpy" else SpatialGrid(infection_range)
+        self.rng                       = rng if rng is not None else np.random.default_rng()
+
+        #Number of persons infected in the last frame
+        self.new_infections            = 0
+
+        #PhaseTimer charged with the phases of infect(), set by PopulationUtil.enable_instrumentation()
+        self.timer                     = None
+
+    def update_index(self, persons: np.ndarray):
+        """
+        Rebuilds the spatial index over the current positions of the persons, has to be called once every frame
+        after the persons have moved
+
+        Parameters
+        ----------
+        :param persons: The NumPy array containing all the persons in the population
+        """
+        self.spatial_index.build(persons[:, index.x_axis], persons[:, index.y_axis])
         
     def infect(self, population: Population, frame):
+        """
+        Runs one frame of the virus: resolves the persons who have been infected for longer than the recovery
+        time and lets every infected person infect the healthy persons around them. All the infector-target
+        pairs of the frame are handled in one batch
 
-        #Get the index of all the people who were infected in the previous step
-        infected_idx = population.get_all_infected()
+        Parameters
+        ----------
+        :param population: The population to infect
+        :param frame: The current frame
+
+        :return The updated population
+        """
+        timer = self.timer
         persons = population.get_person()
 
-        infected_counter = 0
-        for idx in infected_idx:
-            infected_counter += 1
-            if(population.get_time_infected(int(idx[0]), frame) >= self.recovery_time):
-                population = self.die_or_immune(population,int(idx[0]))
-     
-            x_bounds = [persons[int(idx[0])][index.x_axis] - math.sqrt(self.infection_range), persons[int(idx[0])][index.x_axis] + math.sqrt(self.infection_range)]
-            y_bounds = [persons[int(idx[0])][index.y_axis] - math.sqrt(self.infection_range), persons[int(idx[0])][index.y_axis] + math.sqrt(self.infection_range)]
-            # print(population.get_time_infected(int(idx[0]), frame))
-            tmp = self.find_nearby(persons, x_bounds, y_bounds)
-            for i in tmp:
-                chance = np.random.uniform(low = 0.0001, high = 1)
-                if chance < persons[int(i)][index.susceptibility] and persons[int(idx[0])][index.g_value] > 0 :
-                    population.persons[int(i)][9] = 1
-                    population.persons[int(i)][index.infected_by] = idx[0]
-                    population.set_infected_at(int(i), frame)
-                    population.persons[int(idx[0])][index.g_value] -= 1
-                    if(len(population.persons[population.persons[:,index.hospitalized] == 1]) < self.total_healthcare_capacity):
-                        population.persons[int(i)][index.hospitalized] = 1
-                        
+        #Rows of all the people who were infected in the previous step, only they can infect in this frame
+        infectors = np.flatnonzero(persons[:, index.current_state] == 1)
+
+        #Positions do not change while infecting, so the index is rebuilt once for the whole frame
+        self.update_index(persons)
+        if timer is not None:
+            timer.lap("infect.index")
+
+        population = self.resolve_infections(population, infectors, frame)
+        if timer is not None:
+            timer.lap("infect.resolve")
+
+        if self.backend == "numba":
+            pairs = self.transmit_compiled(population, infectors, frame)
+            if timer is not None:
+                timer.lap("infect.kernel")
+                timer.count("infectors_scanned", len(infectors))
+                timer.count("candidate_pairs", pairs)
+                timer.count("new_infections", self.new_infections)
+            return population
+
+        owner, targets = self.find_pairs(persons, infectors)
+        if timer is not None:
+            timer.lap("infect.find_pairs")
+
+        self.new_infections = 0
+        self.transmit(population, infectors, owner, targets, frame)
+        if timer is not None:
+            timer.lap("infect.transmit")
+            timer.count("infectors_scanned", len(infectors))
+            timer.count("candidate_pairs", len(targets))
+            timer.count("new_infections", self.new_infections)
+
         return population
 
-    
+    def find_pairs(self, persons: np.ndarray, infectors: np.ndarray) -> tuple:
+        """
+        Finds every (infector, healthy person) pair that is within the infection range
+
+        Parameters
+        ----------
+        :param persons: The NumPy array containing all the persons in the population
+        :param infectors: Rows of the infected persons
+
+        :return Tuple of the position of the infector in infectors and the row of the target for every pair,
+                sorted by infector and then by target
+        """
+        susceptible = (persons[:, index.current_state] == 0) & (persons[:, index.social_distance] == 0)
+        offsets, targets = self.spatial_index.neighbours(persons[:, index.x_axis][infectors], persons[:, index.y_axis][infectors],
+                                                            math.sqrt(self.infection_range), susceptible)
+        owner = np.repeat(np.arange(len(infectors)), np.diff(offsets))
+        return owner, targets
+
+    def transmit(self, population: Population, infectors: np.ndarray, owner: np.ndarray, targets: np.ndarray, frame: int):
+        """
+        Draws the transmission chance of every pair at once and infects the targets. Every infector can only infect
+        as many persons as its remaining g value, and a target hit by several infectors is infected by the one that
+        comes first in the population, the same as when the infectors are processed one after the other. The
+        infectors are settled in rounds, each one as soon as no earlier infector can still take one of the
+        targets it would take
+
+        Parameters
+        ----------
+        :param population: The population to infect
+        :param infectors: Rows of the infected persons
+        :param owner: Position in infectors of the infector of every pair
+        :param targets: Row of the target of every pair, the pairs sorted by infector and then by target
+        :param frame: The current frame
+        """
+        persons = population.get_person()
+        chance = self.rng.uniform(low = 0.0001, high = 1, size = len(targets))
+        hit = chance < persons[:, index.susceptibility][targets]
+        owner, targets = owner[hit], targets[hit]
+        if len(targets) == 0:
+            return
+
+        budget = np.maximum(persons[:, index.g_value][infectors], 0).astype(np.int64)
+        active = budget[owner] > 0
+        owner, targets = owner[active], targets[active]
+        unique, target = np.unique(targets, return_inverse=True)
+        pair = np.arange(len(targets))
+        keep = np.zeros(len(targets), dtype=bool)
+        taken = np.zeros(len(unique), dtype=bool)
+        blocked = np.iinfo(np.int64).max
+
+        #Every round settles the infectors whose first targets up to their budget have no earlier infector left
+        #competing for them, the first infector left is always settled
+        while len(pair):
+            o, t = owner[pair], target[pair]
+            first = np.full(len(unique), len(infectors))
+            np.minimum.at(first, t, o)
+            rank = np.arange(len(o)) - np.searchsorted(o, o)
+            block = np.full(len(infectors), blocked)
+            contested = first[t] != o
+            np.minimum.at(block, o[contested], rank[contested])
+            settled = budget[o] <= block[o]
+            won = settled & (rank < budget[o])
+            keep[pair[won]] = True
+            taken[t[won]] = True
+            left = ~settled & ~taken[t]
+            pair = pair[left]
+
+        owner, targets = owner[keep], targets[keep]
+        self.new_infections = len(targets)
+        persons[targets, index.current_state] = 1
+        persons[targets, index.infected_by] = persons[infectors[owner], index.id]
+        persons[targets, index.infected_at] = frame
+        persons[infectors, index.g_value] -= np.bincount(owner, minlength=len(infectors))
+
+        #New cases are admitted in order while there are beds left
+        free_beds = max(0, math.ceil(self.total_healthcare_capacity - population.get_hospital_occupancy()))
+        population.admit_to_hospital(targets[:free_beds])
+
+    def transmit_compiled(self, population: Population, infectors: np.ndarray, frame: int) -> int:
+        """
+        Finds and infects the targets of every infector with kernels.infect(), in one pass over the grid without
+        building the pairs. The outcome follows the same rules as find_pairs() and transmit(), with different draws
+
+        Parameters
+        ----------
+        :param population: The population to infect
+        :param infectors: Rows of the infected persons
+        :param frame: The current frame
+
+        :return The number of candidate pairs that were scanned
+        """
+        persons = population.get_person()
+        grid = self.spatial_index
+        healthy = np.count_nonzero(persons[:, index.current_state] == 0)
+        targets = np.empty(healthy, dtype=np.int64)
+        self.new_infections, pairs = kernels.infect(persons[:, index.x_axis], persons[:, index.y_axis],
+                                                        persons[:, index.current_state], persons[:, index.social_distance],
+                                                        persons[:, index.susceptibility], persons[:, index.g_value],
+                                                        persons[:, index.infected_by], persons[:, index.infected_at],
+                                                        persons[:, index.id], infectors.astype(np.int64), grid.order, grid.cell_start,
+                                                        grid.sorted_x, grid.sorted_y, grid.x_min, grid.y_min, grid.cell_w,
+                                                        grid.cell_h, grid.x_cells, grid.y_cells,
+                                                        math.sqrt(self.infection_range), frame, self.rng, targets)
+
+        #New cases are admitted in the order they were infected while there are beds left
+        free_beds = max(0, math.ceil(self.total_healthcare_capacity - population.get_hospital_occupancy()))
+        population.admit_to_hospital(targets[:min(free_beds, self.new_infections)])
+        return pairs
+
     def find_nearby(self, persons: np.ndarray, x_bounds: list, y_bounds: list) -> list:
         """
-        Find the nearby per
+        Find the nearby persons who are healthy and not socially distancing within the given box. Only the
+        persons in the cells of the spatial index around the box are checked once the index has been built
 
         Parameters
         ----------
-        person : Person
-            [description]
+        persons : np.ndarray
+            The NumPy array containing all the persons in the population
         x_bounds : list
-            [description]
+            The lower and upper bound of the box on the x axis
         y_bounds : list
-            [description]
+            The lower and upper bound of the box on the y axis
 
         Returns
         -------
         list
-            [description]
+            The IDs of the persons within the box who can get infected
         """        
-        
-        selected_rows = persons[:,0][(x_bounds[0]<persons[:, index.x_axis]) &
-                                        (x_bounds[1]>persons[:, index.x_axis]) &
-                                        (y_bounds[0]<persons[:, index.y_axis]) &
-                                        (y_bounds[1]>persons[:, index.y_axis]) &
-                                        (persons[:, index.current_state] == 0) &
-                                        (persons[:, index.current_state] == 0) &
-                                        (persons[:,index.social_distance] == 0)
-                                    ]
+        if not self.spatial_index.is_built():
+            rows = slice(None)
+        else:
+            rows = self.spatial_index.query(x_bounds, y_bounds)
+
+        if self.backend == "numba":
+            rows = np.arange(len(persons)) if isinstance(rows, slice) else rows
+            selected = np.empty(len(rows), dtype=persons[:, index.id].dtype)
+            count = kernels.nearby(persons[:, index.x_axis], persons[:, index.y_axis], persons[:, index.current_state],
+                                    persons[:, index.social_distance], persons[:, index.id], rows, x_bounds[0], x_bounds[1],
+                                    y_bounds[0], y_bounds[1], selected)
+            return selected[:count]
+
+        x = persons[:, index.x_axis][rows]
+        y = persons[:, index.y_axis][rows]
+        selected_rows = persons[:,0][rows][(x_bounds[0] < x) &
+                                            (x_bounds[1] > x) &
+                                            (y_bounds[0] < y) &
+                                            (y_bounds[1] > y) &
+                                            (persons[:, index.current_state][rows] == 0) &
+                                            (persons[:,index.social_distance][rows] == 0)
+                                        ]
                                     
         return selected_rows
 
-    def die_or_immune(self, population: Population, infected_person_idx: int) -> bool:
+    def resolve_infections(self, population: Population, infected: np.ndarray, frame: int) -> Population:
         """
-        [summary]
+        Finds the infected persons who have been infected for at least the recovery time and lets all of them
+        die or become immune at once
 
         Parameters
         ----------
-        infected_person_idx         : np.array
-            [description]
-        healthcare_facility_full    : bool
-            [description]
+        :param population: The population
+        :param infected: Rows of the currently infected persons
+        :param frame: The current frame
 
-        Returns
-        -------
-        bool
-            [description]
-        """ 
-        chance = np.random.uniform(low = 0.001, high = 1)
-        if population.persons[infected_person_idx][index.hospitalized] == 1: 
-            population.persons[infected_person_idx][index.hospitalized] = 3
-            if(chance < population.persons[infected_person_idx][index.mortality_rate]):
-                population.persons[infected_person_idx][index.current_state] = 3
-            else:
-                population.persons[infected_person_idx][index.current_state] = 2
-        else:
-            #print('here')
-            if(chance < population.persons[infected_person_idx][index.mortality_rate] + 0.2):
-                population.persons[infected_person_idx][index.current_state] = 3
-            else:
-                population.persons[infected_person_idx][index.current_state] = 2
+        :return The updated population
+        """
+        persons = population.get_person()
+        recovering = infected[frame - persons[:, index.infected_at][infected] >= self.recovery_time]
+        return self.die_or_immune_all(population, recovering)
+
+    def die_or_immune_all(self, population: Population, infected_person_idx: np.ndarray) -> Population:
+        """
+        Decides whether each of the given infected persons dies or becomes immune. Hospitalized persons die
+        with their own mortality rate and are discharged, persons who could not be hospitalized have an extra
+        20% chance of dying
+
+        Parameters
+        ----------
+        :param population: The population
+        :param infected_person_idx: Rows of the infected persons to resolve
+
+        :return The updated population
+        """
+        persons = population.get_person()
+        chance = self.rng.uniform(low = 0.001, high = 1, size = len(infected_person_idx))
+        hospitalized = persons[:, index.hospitalized][infected_person_idx] == 1
+        mortality = persons[:, index.mortality_rate][infected_person_idx] + np.where(hospitalized, 0, 0.2)
+
+        population.discharge_from_hospital(infected_person_idx[hospitalized])
+        persons[infected_person_idx, index.current_state] = np.where(chance < mortality, 3, 2)
         return population
 
-        
+    def die_or_immune(self, population: Population, infected_person_idx: int) -> Population:
+        """
+        Decides whether a single infected person dies or becomes immune, see die_or_immune_all()
 
-    
-    
\ No newline at end of file
+        Parameters
+        ----------
+        :param population: The population
+        :param infected_person_idx: Row of the infected person
+
+        :return The updated population
+        """ 
+        return self.die_or_immune_all(population, np.array([infected_person_idx], dtype=np.int64))
@@ -5,19 +5,29 @@ Created on Jan 29, 2020
 
 from matplotlib.pyplot import margins
 from src.population_util import PopulationUtil  
+from src.recorder import TimeSeriesRecorder
+from src.render import FFmpegPipe
+from src.instrumentation import PhaseTimer
+from src.tracing import InfectionTrace
 from matplotlib import gridspec
 import matplotlib.pyplot as plt
 import src.person_properties_util as index
 import numpy as np
 from matplotlib.animation import FuncAnimation
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import matplotlib as mpl
 import sys
-import networkx as nx
+import time
 import matplotlib.patches as mpatches
 
+# Colours of the healthy, infected, immune and dead persons, indexed by the current state
+state_colors = ["lightsteelblue", "indianred", "mediumseagreen", "indigo"]
+
 class Visualization():
 
-    def __init__(self, population_util: PopulationUtil, render_mode: bool = False, render_path: str ="render"):
+    def __init__(self, population_util: PopulationUtil, render_mode: bool = False, render_path: str ="render", record_path: str = None, show_stats: bool = False,
+                    fast: bool = False, refresh_every: int = 10, render_frames: int = 1000, start: bool = True,
+                    trace_path: str = None):
         """
         Constructor to set the population_util, render_mode and path, and initialize figure
 
@@ -26,16 +36,35 @@ class Visualization():
         :param population_util: PopulationUtil object using which we will run the visualization backend.
         :param render_mode: Toggle to switch to render mode from animation mode.
         :param render_path: Path to where render should be stored.
+        :param record_path: Path to a .csv, .npz or .parquet file to record the per frame numbers to, see TimeSeriesRecorder.
+        :param show_stats: Toggle to time the phases of every step and show the slowest ones in the statistics panel.
+        :param fast: Toggle to draw everybody with a single scatter coloured by state and to blit, so only the changing artists are redrawn.
+        :param refresh_every: In fast mode, the line graph and the statistics are only updated every refresh_every frames.
+        :param render_frames: Number of frames to render in render mode.
+        :param start: Toggle to render or show the animation right away, when off only the figure is created.
+        :param trace_path: Path to a .csv, .npz or .graphml file to save who infected whom to when the window closes, see InfectionTrace.
         """
 
         self.putil = population_util
+        self.fast = fast
+        self.refresh_every = max(1, refresh_every)
+        self.state_rgba = mpl.colors.to_rgba_array(state_colors)
+
+        # Record the numbers of every frame, they are kept after the window closes
+        self.recorder = None
+        if record_path is not None:
+            self.recorder = TimeSeriesRecorder(record_path).attach(self.putil)
+
+        # Time the phases of every step
+        if show_stats:
+            self.putil.enable_instrumentation()
 
         # Disable toolbar
         mpl.rcParams['toolbar'] = 'None' 
 
         # Initialize figure
         self.fig = plt.figure(figsize=(6.5,7.5))
-        self.fig.canvas.set_window_title('Simulation')
+        self.set_window_title(self.fig, 'Simulation')
 
         # Initialize 3 subplots
         spec = gridspec.GridSpec(ncols=1, nrows=3,height_ratios=[2, 1, 0.5])
@@ -51,57 +80,187 @@ class Visualization():
         self.ax.axis('off')
         self.ax2.axis('off')
 
-        # Initialize the animation
-        self.ani = FuncAnimation(self.fig, self.update, interval=5, init_func=self.setup_plot, blit=False)
+        # With blitting only the axes are redrawn, so the statistics axes has to cover all of its texts
+        if self.fast:
+            self.cover_statistics()
+
+        if not start:
+            return
 
-        # If render mode, reinitialize.
+        # If render mode, pipe the frames to ffmpeg.
         if render_mode == True:
-            self.ani = FuncAnimation(self.fig, self.update, interval=5, frames=1000, init_func=self.setup_plot, blit=False)
             render_path = render_path + "/render.mp4"
             print("Rendering to " + render_path, file = sys.stdout)
-            self.ani.save(render_path, fps=30, dpi=120)
+            self.render(render_path, render_frames)
             print("Render Completed", file = sys.stdout)
-        # Show animation.
+            self.close_recorder()
+        # Show animation, with blitting the static parts are drawn once and cached.
         else:
+            self.ani = FuncAnimation(self.fig, self.update, interval=5, init_func=self.setup_plot, blit=self.fast)
             plt.show()
+            self.close_recorder()
 
-            # Create a digraph showing the infection spread
+            # Show the tree of infections, too large ones are only saved
+            trace = InfectionTrace.from_population(self.putil.population)
+            if trace_path is not None:
+                trace.save(trace_path)
+                print("Saved the infections of " + str(len(trace)) + " persons to " + trace_path, file = sys.stdout)
             fig = plt.figure()
-            G = nx.Graph()
-            color_map = []
-            size_map = []
+            ax = fig.add_subplot()
 
             # Label Patches
             red_patch = mpatches.Patch(color='red', label='First Infection')
             blue_patch = mpatches.Patch(color='cornflowerblue', label='Infected But Recovered')
             indigo_patch = mpatches.Patch(color='indigo', label='Dead')
             orange_patch = mpatches.Patch(color='orange', label='Currently Infected')
-            plt.legend(handles=[red_patch, blue_patch, indigo_patch, orange_patch])
-
-            # Adding graphs edges
-            for i in range(self.putil.size):
-                if(self.putil.population.persons[i, index.infected_by] != i and self.putil.population.persons[i, index.infected_by] != -1): 
-                    if(self.putil.population.persons[i, index.current_state] == 2):
-                        G.add_edge(i,self.putil.population.persons[i, index.infected_by])
-                        color_map.append('cornflowerblue')
-                        size_map.append(15)
-                    elif(self.putil.population.persons[i, index.current_state] == 3):
-                        G.add_edge(i,self.putil.population.persons[i, index.infected_by])
-                        color_map.append('indigo')
-                        size_map.append(15)
-                    else:
-                        G.add_edge(i,self.putil.population.persons[i, index.infected_by])
-                        color_map.append('orange')
-                        size_map.append(15)
-                elif(self.putil.population.persons[i, index.infected_by] == i):
-                    G.add_node(i)
-                    color_map.append('red')
-                    size_map.append(50)
-            
+            ax.legend(handles=[red_patch, blue_patch, indigo_patch, orange_patch])
+
             # Show graph
-            nx.draw_spring(G, node_size = size_map, node_color = color_map, edge_color = 'darkgray')
-            fig.canvas.set_window_title('Infection Tracing Visualization')
-            plt.show()
+            if trace.draw(ax):
+                self.set_window_title(fig, 'Infection Tracing Visualization')
+                plt.show()
+            else:
+                print("Not drawing the infections of " + str(len(trace)) + " persons", file = sys.stdout)
+                plt.close(fig)
+
+    @staticmethod
+    def set_window_title(fig, title: str):
+        """
+        Method to set the window title of a figure, through the figure manager since FigureCanvas.set_window_title()
+        was removed from Matplotlib
+        """
+        if fig.canvas.manager is not None:
+            fig.canvas.manager.set_window_title(title)
+
+    def cover_statistics(self):
+        """
+        Method to stretch the statistics axes over the whole area below the line graph, with its limits changed
+        so that the texts stay where they are. The texts reach out of the axes, and blitting only restores and
+        redraws the inside of every axes
+        """
+        old = self.ax2.get_position()
+        new = [0, 0, 1, self.ax1.get_position().y0]
+        self.ax2.set_position(mpl.transforms.Bbox.from_extents(*new))
+        self.ax2.set_xlim((new[0] - old.x0) / old.width, (new[2] - old.x0) / old.width)
+        self.ax2.set_ylim((new[1] - old.y0) / old.height, (new[3] - old.y0) / old.height)
+
+    def generate_frames(self, frames: int, dpi: int = 120, timer: PhaseTimer = None, first_frame: int = 0):
+        """
+        Generator drawing the simulation on an Agg canvas, yields the RGBA buffer of every frame. In fast mode only
+        the artists changed by update() are drawn over a copy of the static background
+
+        Parameters
+        ----------
+        :param frames: Number of frames to draw
+        :param dpi: Resolution of the frames
+        :param timer: PhaseTimer charged with the update and draw time of every frame, and with the time the
+                      consumer takes before asking for the next one
+        :param first_frame: Frame to start drawing at, the line graph is filled with the earlier frames from
+                            get_history() of the population util, see TrajectoryPlayer
+
+        Returns
+        -------
+        :returns Buffers of height x width x 4 bytes, only valid until the next frame is drawn
+        """
+        self.fig.set_dpi(dpi)
+        canvas = FigureCanvasAgg(self.fig)
+        artists = self.setup_plot()
+        if first_frame > 0:
+            self.fill_history(self.putil.get_history(first_frame))
+
+        # Draw everything but the changing artists once
+        if self.fast:
+            for artist in artists:
+                artist.set_animated(True)
+            canvas.draw()
+            background = canvas.copy_from_bbox(self.fig.bbox)
+
+        for frame in range(first_frame, first_frame + frames):
+            if timer is not None:
+                timer.start()
+            artists = self.update(frame)
+            if timer is not None:
+                timer.lap("render.update")
+            if self.fast:
+                canvas.restore_region(background)
+                for artist in artists:
+                    self.fig.draw_artist(artist)
+            else:
+                canvas.draw()
+            if timer is not None:
+                timer.lap("render.draw")
+            yield canvas.buffer_rgba()
+            if timer is not None:
+                timer.lap("render.write")
+
+    def render(self, path: str, frames: int, fps: int = 30, dpi: int = 120, first_frame: int = 0) -> dict:
+        """
+        Method to render the simulation to a video by writing the raw frames to the stdin of ffmpeg, and to report
+        the throughput
+
+        Parameters
+        ----------
+        :param path: Path to the video
+        :param frames: Number of frames to render
+        :param fps: Frames per second of the video
+        :param dpi: Resolution of the frames
+        :param first_frame: Frame to start rendering at
+
+        Returns
+        -------
+        :returns Statistics of the PhaseTimer of the render, with the number of frames per second
+        """
+        timer = PhaseTimer()
+        start = time.perf_counter()
+        pipe = None
+        try:
+            for buffer in self.generate_frames(frames, dpi, timer, first_frame):
+                if pipe is None:
+                    height, width = buffer.shape[:2]
+                    pipe = FFmpegPipe(path, width, height, fps)
+                pipe.write(buffer)
+        finally:
+            if pipe is not None:
+                pipe.close()
+        elapsed = time.perf_counter() - start
+
+        stats = timer.get_stats()
+        stats["frames_per_s"] = frames / elapsed if elapsed > 0 else 0.0
+        print("Rendered " + str(frames) + " frames in " + str(round(elapsed, 2)) + " s, " +
+                str(round(stats["frames_per_s"], 1)) + " frames/s", file = sys.stdout)
+        print(timer.report(), file = sys.stdout)
+        return stats
+
+    def fill_history(self, counts: np.ndarray):
+        """
+        Method to add frames that were not drawn to the line graph, as if update() had run for them
+
+        Parameters
+        ----------
+        :param counts: Healthy, infected, immune and dead counts of the frames from 0 on, one row per frame
+        """
+        for frame, (n_healthy, n_infected, n_immune, n_dead) in enumerate(counts.tolist()):
+            self.infected.append(n_infected)
+            self.infected_total.append(self.putil.size - n_healthy)
+            self.deaths.append(n_dead)
+            self.frames.append(frame)
+            self.immunes.append(n_immune)
+
+            if frame == self.putil.enforce_mask_wearing_at:
+                self.mask_wearing_info = "Active"
+
+            if frame == self.putil.enforce_social_distance_at:
+                self.social_distancing_info = "Active"
+
+    def close_recorder(self):
+        """
+        Method to finish the recording, if any
+        """
+        if self.recorder is not None:
+            self.recorder.close()
+            print("Recorded " + str(self.recorder.frames) + " frames to " + self.recorder.path, file = sys.stdout)
+        if self.putil.timer is not None:
+            print(self.putil.timer.report(), file = sys.stdout)
 
     def setup_plot(self):
         """
@@ -113,43 +272,41 @@ class Visualization():
         """
 
         # Get all the healthy, immune, infected, and dead people seperately 
-        healthy_x = self.putil.population.get_all_healthy()[:, index.x_axis]
-        healthy_y = self.putil.population.get_all_healthy()[:, index.y_axis]
-        infected_x = self.putil.population.get_all_infected()[:, index.x_axis]
-        infected_y = self.putil.population.get_all_infected()[:, index.y_axis]
-        immune_x = self.putil.population.get_all_recovered()[:, index.x_axis]
-        immune_y = self.putil.population.get_all_recovered()[:, index.y_axis]
-        dead_x = self.putil.population.get_all_dead()[:, index.x_axis]
-        dead_y = self.putil.population.get_all_dead()[:, index.y_axis]
-        total_infected = self.putil.size - len(healthy_x)
-        total_hospitalized = len(self.putil.persons[self.putil.persons[:,index.hospitalized] == 3])
+        counts, (healthy, infected, immune, dead) = self.putil.population.get_positions_by_state()
+        n_healthy, n_infected, n_immune, n_dead = counts.tolist()
+        total_infected = self.putil.size - n_healthy
         
         # Current healthcare status
         self.healthcare_status   = "Normal"
         
-        # Scatter plots to plot people
-        self.scat = self.ax.scatter(healthy_x,
-                                        healthy_y, vmin=0, vmax=1,
-                                                cmap="jet", c="lightsteelblue", s=10)
-        self.scat2 = self.ax.scatter(infected_x,
-                                        infected_y, vmin=0, vmax=1,
-                                                cmap="jet", c="indianred", s=10)
-        self.scat3 = self.ax.scatter(immune_x,
-                                        immune_y, vmin=0, vmax=1,
-                                                cmap="jet", c="mediumseagreen", s=10)
-        self.scat4 = self.ax.scatter(dead_x,
-                                        dead_y, vmin=0, vmax=1,
-                                                cmap="jet", c="indigo", s=10)
+        # Scatter plots to plot people, in fast mode a single one coloured by state
+        if self.fast:
+            persons = self.putil.persons
+            self.scat = self.ax.scatter(persons[:, index.x_axis], persons[:, index.y_axis],
+                                            c=self.state_rgba[persons[:, index.current_state]], s=10)
+        else:
+            self.scat = self.ax.scatter(healthy[:, 0],
+                                            healthy[:, 1], vmin=0, vmax=1,
+                                                    cmap="jet", c="lightsteelblue", s=10)
+            self.scat2 = self.ax.scatter(infected[:, 0],
+                                            infected[:, 1], vmin=0, vmax=1,
+                                                    cmap="jet", c="indianred", s=10)
+            self.scat3 = self.ax.scatter(immune[:, 0],
+                                            immune[:, 1], vmin=0, vmax=1,
+                                                    cmap="jet", c="mediumseagreen", s=10)
+            self.scat4 = self.ax.scatter(dead[:, 0],
+                                            dead[:, 1], vmin=0, vmax=1,
+                                                    cmap="jet", c="indigo", s=10)
         # Lists for line graph
         self.infected       = []
         self.infected_total = []
         self.deaths         = []
         self.frames         = []
         self.immunes        = []
-        self.infected.append(len(infected_x))
-        self.deaths.append(len(dead_x))
-        self.infected_total.append(self.putil.size - len(healthy_x))
-        self.immunes.append(len(immune_x))
+        self.infected.append(n_infected)
+        self.deaths.append(n_dead)
+        self.infected_total.append(self.putil.size - n_healthy)
+        self.immunes.append(n_immune)
         self.frames.append(0)
 
         # Line graph plotting number
@@ -174,17 +331,18 @@ class Visualization():
             self.mask_wearing_info = "Disabled"
 
         self.ax1.tick_params(axis="y",direction="in", pad=3)
-        self.ax1.plot([0,1000],[self.putil.virus.total_healthcare_capacity]*2, c="silver")
+        self.ax1.plot([0,1000],[self.putil.total_healthcare_capacity]*2, c="silver")
         self.ax1.get_xaxis().set_visible(False)
         self.ax1.legend(prop={'size': 8},loc='upper right')
         self.ax2.text(0,1,"Statistics", fontsize='large' , fontweight='bold')
+        self.stats_text = self.ax2.text(0.33, 1.05, "", fontsize='x-small', color='gray')
         self.ax2.text(0,-0.5, "Frame:\nCurrently Infected:\nHealthy People:\nImmune People:\nTotal Deaths:\nHealthcare Conditions:")
         self.ax2.text(0.54,-0.5, "Population:\nMasks Wearing:\nSocial Distancing:\nPeople Distancing:\nTotal Infected:\n")
         self.ax.text(0,1.06, "Simulation", fontsize='xx-large' , fontweight='bold')
-        self.text = self.ax2.text(0.33, -0.5, "%i \n%i \n%s \n%s \n%s \n%s" %(0,len(infected_x),str(len(healthy_x)) + " or 0%", str(len(immune_x)) + " or 0%",str(len(dead_x)) + " or 0%",self.healthcare_status))
+        self.text = self.ax2.text(0.33, -0.5, "%i \n%i \n%s \n%s \n%s \n%s" %(0,n_infected,str(n_healthy) + " or 0%", str(n_immune) + " or 0%",str(n_dead) + " or 0%",self.healthcare_status))
         self.text2 = self.ax2.text(0.81,-0.5,"%d \n%s \n%s \n%s \n%s\n" % (self.putil.size, self.mask_wearing_info, self.social_distancing_info, self.social_distancing_num , total_infected))
 
-        return self.scat, self.scat2, self.scat3, self.scat4, self.currently_infected, self.total_infected, 
+        return self.get_artists()
 
     def update(self, frame):
         """
@@ -199,74 +357,87 @@ class Visualization():
         :returns Variables that store plot objects
         """
 
-        if(frame % 1 == 0):    
+        # Calling method to move people, and check and infect them and perform
+        # other functions.
+        self.putil.move(frame)
 
-            # Calling method to move people, and check and infect them and perform
-            # other functions.
-            self.putil.move(frame)
-            
+        # Update Graphs
+        if self.fast:
+            persons = self.putil.persons
+            counts = self.putil.population.get_state_counts()
+            self.scat.set_offsets(np.column_stack((persons[:, index.x_axis], persons[:, index.y_axis])))
+            self.scat.set_facecolor(self.state_rgba[persons[:, index.current_state]])
+        else:
             # Get all the healthy, immune, infected, and dead people seperately 
-            healthy_x = self.putil.population.get_all_healthy()[:, index.x_axis]
-            healthy_y = self.putil.population.get_all_healthy()[:, index.y_axis]
-            infected_x = self.putil.population.get_all_infected()[:, index.x_axis]
-            infected_y = self.putil.population.get_all_infected()[:, index.y_axis]
-            immune_x = self.putil.population.get_all_recovered()[:, index.x_axis]
-            immune_y = self.putil.population.get_all_recovered()[:, index.y_axis]
-            dead_x = self.putil.population.get_all_dead()[:, index.x_axis]
-            dead_y = self.putil.population.get_all_dead()[:, index.y_axis]
-            total_infected = self.putil.size - len(healthy_x)
-            total_hospitalized = len(self.putil.persons[self.putil.persons[:,index.hospitalized] == 3])
-            currently_infected = len(infected_x)
-
-            # Update healthcare status
-            if currently_infected > self.putil.total_healthcare_capacity*3/2:
-                self.healthcare_status   = "Extreme"
-            elif currently_infected > self.putil.total_healthcare_capacity:
-                self.healthcare_status   = "Worse"
-            elif currently_infected > self.putil.total_healthcare_capacity*2/3:
-                self.healthcare_status   = "Manageable"
-            else:
-                self.healthcare_status   = "Normal"
+            counts, (healthy, infected, immune, dead) = self.putil.population.get_positions_by_state()
+            self.scat.set_offsets(healthy)
+            self.scat2.set_offsets(infected)
+            self.scat3.set_offsets(immune)
+            self.scat4.set_offsets(dead)
+        n_healthy, n_infected, n_immune, n_dead = counts.tolist()
+        total_infected = self.putil.size - n_healthy
+
+        self.infected.append(n_infected)
+        self.infected_total.append(self.putil.size - n_healthy)
+        self.deaths.append(n_dead)
+        self.frames.append(frame)
+        self.immunes.append(n_immune)
+
+        if frame == self.putil.enforce_mask_wearing_at:
+            self.mask_wearing_info = "Active" 
+        
+        if frame == self.putil.enforce_social_distance_at:
+            self.social_distancing_info = "Active"
+
+        # In fast mode the line graph and the statistics are only refreshed every refresh_every frames
+        if self.fast and frame % self.refresh_every != 0:
+            return self.get_artists()
+
+        # Update healthcare status
+        currently_hospitalized = self.putil.population.get_hospital_occupancy()
+        currently_infected = n_infected
+        if currently_infected > self.putil.total_healthcare_capacity*3/2:
+            self.healthcare_status   = "Extreme"
+        elif currently_infected > self.putil.total_healthcare_capacity or currently_hospitalized >= self.putil.total_healthcare_capacity:
+            self.healthcare_status   = "Worse"
+        elif currently_infected > self.putil.total_healthcare_capacity*2/3:
+            self.healthcare_status   = "Manageable"
+        else:
+            self.healthcare_status   = "Normal"
 
-            # Update Graphs
-            data1 = np.c_[healthy_x,healthy_y]
-            data2 = np.c_[infected_x,infected_y]
-            data3 = np.c_[immune_x,immune_y]
-            data4 = np.c_[dead_x,dead_y]
+        self.text.set_text("%i \n%i \n%s \n%s \n%s \n%s" % (frame,n_infected, str(n_healthy) + " or " + str(round(n_healthy*100/self.putil.size,1)) + "%",
+                            str(n_immune) + " or " + str(round(n_immune*100/self.putil.size,1)) + "%", str(n_dead) + " or " + str(round(n_dead*100/self.putil.size,1)) + "%",
+                            self.healthcare_status))
+        self.text2.set_text("%s \n%s \n%s \n%s \n%s\n" % (self.putil.size, self.mask_wearing_info, self.social_distancing_info, self.social_distancing_num , total_infected))
 
-            if frame == self.putil.enforce_mask_wearing_at:
-                self.mask_wearing_info = "Active" 
-            
-            if frame == self.putil.enforce_social_distance_at:
-                self.social_distancing_info = "Active"
+        self.currently_infected.set_ydata(self.infected)
+        self.currently_infected.set_xdata(self.frames)
 
-            self.text.set_text("%i \n%i \n%s \n%s \n%s \n%s" % (frame,len(infected_x), str(len(healthy_x)) + " or " + str(round(len(healthy_x)*100/self.putil.size,1)) + "%",
-                                str(len(immune_x)) + " or " + str(round(len(immune_x)*100/self.putil.size,1)) + "%", str(len(dead_x)) + " or " + str(round(len(dead_x)*100/self.putil.size,1)) + "%",
-                                self.healthcare_status))
-            self.text2.set_text("%s \n%s \n%s \n%s \n%s\n" % (self.putil.size, self.mask_wearing_info, self.social_distancing_info, self.social_distancing_num , total_infected))
-            self.scat.set_offsets(data1)
-            self.scat2.set_offsets(data2)
-            self.scat3.set_offsets(data3)
-            self.scat4.set_offsets(data4)
-   
-            self.infected.append(len(infected_x))
-            self.infected_total.append(self.putil.size - len(healthy_x))
-            self.deaths.append(len(dead_x))
-            self.frames.append(frame)
-            self.immunes.append(len(immune_x))
+        self.total_deaths.set_ydata(self.deaths)
+        self.total_deaths.set_xdata(self.frames)
 
-            self.currently_infected.set_ydata(self.infected)
-            self.currently_infected.set_xdata(self.frames)
+        self.total_immune.set_ydata(self.immunes)
+        self.total_immune.set_xdata(self.frames)
 
-            self.total_deaths.set_ydata(self.deaths)
-            self.total_deaths.set_xdata(self.frames)
+        # Slowest phases of the step, when timing is enabled
+        if self.putil.timer is not None:
+            self.stats_text.set_text(self.putil.timer.summary(top=3))
 
-            self.total_immune.set_ydata(self.immunes)
-            self.total_immune.set_xdata(self.frames)
+        return self.get_artists()
 
-            
-        
-        return self.scat, self.scat2, self.scat3, self.scat4, self.currently_infected,
+    def get_artists(self) -> tuple:
+        """
+        Returns the artists changed by update(), with blitting only these are redrawn on top of the cached background
+
+        Returns
+        -------
+        :returns Variables that store plot objects
+        """
+        if self.fast:
+            scatters = (self.scat,)
+        else:
+            scatters = (self.scat, self.scat2, self.scat3, self.scat4)
+        return scatters + (self.currently_infected, self.total_deaths, self.total_immune, self.text, self.text2, self.stats_text)
 
 
         
@@ -0,0 +1,37 @@
+"""
+Test file for the scaling benchmark
+"""
+
+import unittest
+import logging
+import json
+from benchmarks import scaling
+
+
+class ScalingBenchmarkTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        logging.basicConfig(format='\n%(asctime)s:%(module)s:%(levelname)s:%(message)s', level=logging.DEBUG)
+        logging.info('Testing scaling benchmark')
+
+    def test_phases(self) -> None:
+        """
+        Tests that set_phase() puts the population in the shares of the phase
+        """
+        population_util = scaling.create_population_util(2000, 1)
+        scaling.set_phase(population_util, "peak", 1)
+        counts = population_util.population.get_state_counts() / 2000
+        self.assertAlmostEqual(counts[1], scaling.phases["peak"]["infected"], delta=0.05)
+        self.assertAlmostEqual(counts[2], scaling.phases["peak"]["immune"], delta=0.05)
+        self.assertEqual(population_util.population.get_hospital_occupancy(), int(population_util.total_healthcare_capacity))
+
+    def test_report(self) -> None:
+        """
+        Tests that the report has one JSON serializable result per size, phase and component
+        """
+        report = scaling.run([200, 400], ["low", "late"], repeats=2, seed=0)
+        json.dumps(report)
+        self.assertEqual(len(report["results"]), 2 * 2 * len(scaling.components))
+        for result in report["results"]:
+            self.assertGreater(result["frames_per_s"], 0)
+            self.assertAlmostEqual(result["agent_updates_per_s"], result["size"] * result["frames_per_s"])
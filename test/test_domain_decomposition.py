@@ -0,0 +1,143 @@
+"""
+Test file for the spatial domain decomposition
+"""
+
+import unittest
+import logging
+import numpy as np
+from src.config_util import ConfigUtil
+from src.domain_decomposition import DomainDecomposition, TileGrid, get_tile_shape
+from src.headless import HeadlessSimulation
+from src.population_util import PopulationUtil
+import src.person_properties_util as idx
+
+
+class DomainDecompositionTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        logging.basicConfig(format='\n%(asctime)s:%(module)s:%(levelname)s:%(message)s', level=logging.DEBUG)
+        logging.info('Testing domain decomposition')
+        config_util = ConfigUtil('config/test_config.ini')
+        self.params = dict(k=config_util.getFloatValue("virus.stats", "k_value"),
+                            r=config_util.getFloatValue("virus.stats", "r_value"),
+                            size=600,
+                            min_age=config_util.getIntegerValue("people.stats", "min_age"),
+                            max_age=config_util.getIntegerValue("people.stats", "max_age"),
+                            mortality_rate=config_util.getDictionary("virus.stats", "mortality_rate"),
+                            social_distance_per=config_util.getFloatValue("people.stats", "social_distancing_percent"),
+                            infection_range=0.001,
+                            recovery_time=config_util.getFloatValue("virus.stats", "recovery_time"),
+                            total_healthcare_capacity=20,
+                            mask_effectiveness=config_util.getDictionary("virus.stats", "mask_effectiveness"),
+                            speed=config_util.getFloatValue("people.stats", "speed"),
+                            social_distancing_at=config_util.getIntegerValue("area.stats", "enforce_social_distancing_at"),
+                            mask_wearing_at=config_util.getIntegerValue("area.stats", "enforce_mask_wearing_at"))
+
+    def test_tile_grid(self) -> None:
+        """
+        Tests the owner and the halo of positions in the middle, along an edge and at a corner of the tiles
+        """
+        self.assertEqual(get_tile_shape(4), (2, 2))
+        self.assertEqual(get_tile_shape(6), (3, 2))
+        grid = TileGrid(2, 2, 0.05)
+        x = np.array([0.25, 0.48, 0.52, 0.49, -0.1])
+        y = np.array([0.25, 0.25, 0.75, 0.51, 1.2])
+        np.testing.assert_array_equal(grid.tile_of(x, y), [0, 0, 3, 1, 1])
+        points, tiles = grid.get_halo(x, y)
+        halo = sorted(zip(points.tolist(), tiles.tolist()))
+        self.assertListEqual(halo, [(1, 2), (2, 1), (3, 0), (3, 2), (3, 3)])
+        with self.assertRaises(ValueError):
+            TileGrid(30, 2, 0.05)
+
+    def test_cross_border_infection(self) -> None:
+        """
+        Tests that an infector infects a person on the other side of a tile border through the halo
+        """
+        population_util = PopulationUtil(seed=1, **self.params)
+        persons = population_util.persons
+        persons[:, idx.current_state] = 0
+        persons[:, idx.infected_by] = -1
+        persons[:, idx.x_axis] = np.where(np.arange(self.params["size"]) % 2 == 0, 0.1, 0.9)
+        persons[:, idx.y_axis] = np.linspace(0.05, 0.95, self.params["size"])
+        persons[:2, idx.x_axis] = [0.495, 0.505]
+        persons[:2, idx.y_axis] = 0.3
+        persons[:, idx.speed] = 0.0005
+        persons[0, idx.current_state] = 1
+        persons[0, idx.g_value] = 5
+        persons[0, idx.infected_by] = 0
+        persons[1, idx.susceptibility] = 1
+        persons[1, idx.social_distance] = 0
+        population_util.infected_person = 0
+
+        with DomainDecomposition(population_util, tiles=(2, 1), workers=1, seed=1) as decomposition:
+            counts = decomposition.run(1)
+            persons = decomposition.get_persons()
+        self.assertEqual(counts[0, 2], 2)
+        self.assertEqual(persons[1, idx.current_state], 1)
+        self.assertEqual(persons[1, idx.infected_by], 0)
+        self.assertEqual(persons[1, idx.infected_at], 0)
+        self.assertEqual(persons[0, idx.g_value], 4)
+
+    def test_next_infector(self) -> None:
+        """
+        Tests that a person refused by an infector without g value left across a tile border is infected by the
+        next infector, as in a single simulation
+        """
+        population_util = PopulationUtil(seed=1, **self.params)
+        persons = population_util.persons
+        persons[:, idx.current_state] = 0
+        persons[:, idx.infected_by] = -1
+        persons[:, idx.x_axis] = np.where(np.arange(self.params["size"]) % 2 == 0, 0.1, 0.9)
+        persons[:, idx.y_axis] = np.linspace(0.05, 0.95, self.params["size"])
+        persons[:4, idx.x_axis] = [0.49, 0.48, 0.52, 0.505]
+        persons[:4, idx.y_axis] = 0.3
+        persons[:, idx.speed] = 0.0005
+        persons[[0, 2], idx.current_state] = 1
+        persons[[0, 2], idx.g_value] = 1
+        persons[[0, 2], idx.infected_by] = [0, 0]
+        persons[[1, 3], idx.susceptibility] = 1
+        persons[[1, 3], idx.social_distance] = 0
+        population_util.infected_person = 0
+
+        with DomainDecomposition(population_util, tiles=(2, 1), workers=1, seed=1) as decomposition:
+            decomposition.run(1)
+            persons = decomposition.get_persons()
+            with self.assertRaises(ValueError):
+                decomposition.local_shard.tiles[0].get_rows(np.array([3]))
+        self.assertListEqual(persons[:4, idx.infected_by].tolist(), [0, 0, 0, 2])
+        self.assertListEqual(persons[:4, idx.g_value].tolist()[::2], [0, 0])
+
+    def test_workers(self) -> None:
+        """
+        Tests that nobody is lost while moving between the tiles and that the result does not depend on the
+        number of worker processes
+        """
+        runs = []
+        for workers in [1, 2]:
+            with DomainDecomposition(PopulationUtil(seed=3, **self.params), tiles=(2, 2), workers=workers, seed=3) as decomposition:
+                runs.append(decomposition.run(40))
+                persons = decomposition.get_persons()
+            np.testing.assert_array_equal(persons[:, idx.id], np.arange(self.params["size"]))
+        np.testing.assert_array_equal(runs[0], runs[1])
+        np.testing.assert_array_equal(runs[0][:, 0], np.arange(40))
+        np.testing.assert_array_equal(runs[0][:, 1:5].sum(axis=1), np.full(40, self.params["size"]))
+        self.assertTrue((runs[0][:, 5] <= self.params["total_healthcare_capacity"]).all())
+
+    def test_statistically_equivalent(self) -> None:
+        """
+        Tests that the tiles infect about as many persons on average as single simulations with the same seeds
+        """
+        infected = {"single": [], "tiles": []}
+        for seed in range(6):
+            single = HeadlessSimulation(PopulationUtil(seed=seed, **self.params)).run(120)
+            with DomainDecomposition(PopulationUtil(seed=seed, **self.params), tiles=(2, 2), workers=1, seed=seed) as decomposition:
+                tiled = decomposition.run(120)
+            infected["single"].append(self.params["size"] - single[-1, 1])
+            infected["tiles"].append(self.params["size"] - tiled[-1, 1])
+        expected = np.mean(infected["single"])
+        self.assertGreater(expected, 10)
+        self.assertAlmostEqual(np.mean(infected["tiles"]), expected, delta=0.35 * expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
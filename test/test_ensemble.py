@@ -0,0 +1,86 @@
+"""
+Test file for the Monte Carlo ensemble
+"""
+
+import unittest
+import logging
+import os
+import tempfile
+import numpy as np
+from src.config_util import ConfigUtil
+from src.ensemble import Ensemble, StreamingBands, compartments
+
+
+class EnsembleTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        logging.basicConfig(format='\n%(asctime)s:%(module)s:%(levelname)s:%(message)s', level=logging.DEBUG)
+        logging.info('Testing ensemble')
+        self.config_util = ConfigUtil('config/test_config.ini')
+        self.params = dict(k=self.config_util.getFloatValue("virus.stats", "k_value"),
+                            r=self.config_util.getFloatValue("virus.stats", "r_value"),
+                            size=100,
+                            min_age=self.config_util.getIntegerValue("people.stats", "min_age"),
+                            max_age=self.config_util.getIntegerValue("people.stats", "max_age"),
+                            mortality_rate=self.config_util.getDictionary("virus.stats", "mortality_rate"),
+                            social_distance_per=self.config_util.getFloatValue("people.stats", "social_distancing_percent"),
+                            infection_range=self.config_util.getFloatValue("virus.stats", "infection_range"),
+                            recovery_time=self.config_util.getFloatValue("virus.stats", "recovery_time"),
+                            total_healthcare_capacity=5,
+                            mask_effectiveness=self.config_util.getDictionary("virus.stats", "mask_effectiveness"),
+                            speed=self.config_util.getFloatValue("people.stats", "speed"),
+                            social_distancing_at=-1, mask_wearing_at=-1)
+
+    def test_streaming_bands(self) -> None:
+        """
+        Tests the streaming mean and quantiles against NumPy on the full set of trajectories, before and after
+        the trajectories are replaced by a histogram
+        """
+        trajectories = np.random.randint(0, 51, size=(40, 6, 2))
+        exact = StreamingBands(6, 50, series=2)
+        binned = StreamingBands(6, 50, series=2, max_bins=10)
+        for member, counts in enumerate(trajectories):
+            exact.add(counts)
+            binned.add(counts)
+            if member == 9:
+                #Up to one trajectory per bin they are kept and the quantiles are exact
+                self.assertIsNone(binned.hist)
+                np.testing.assert_array_equal(binned.quantile(0.5),
+                                                np.quantile(trajectories[:10], 0.5, axis=0, method="inverted_cdf"))
+        self.assertIsNone(binned.kept)
+
+        np.testing.assert_allclose(exact.mean(), trajectories.mean(axis=0))
+        np.testing.assert_allclose(exact.std(), trajectories.std(axis=0), atol=1e-9)
+        for q in [0.05, 0.5, 0.95]:
+            np.testing.assert_array_equal(exact.quantile(q), np.quantile(trajectories, q, axis=0, method="inverted_cdf"))
+            self.assertLessEqual(np.abs(binned.quantile(q) - np.quantile(trajectories, q, axis=0)).max(), binned.width)
+
+    def test_run(self) -> None:
+        """
+        Tests that an ensemble run aggregates every member and that the bands can be saved
+        """
+        ensemble = Ensemble(self.params, frames=8, members=4, workers=2, seed=11).run()
+        bands = ensemble.get_bands()
+        self.assertEqual(ensemble.bands.members, 4)
+        self.assertListEqual(sorted(bands.keys()), sorted(compartments))
+        total = sum(bands[name]["mean"] for name in ["healthy", "infected", "immune", "dead"])
+        np.testing.assert_allclose(total, np.full(8, 100.0))
+        self.assertTrue((bands["infected"]["q0.05"] <= bands["infected"]["q0.95"]).all())
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "ensemble.npz")
+            ensemble.save(path)
+            self.assertEqual(len(np.load(path)["infected_mean"]), 8)
+
+    def test_plot(self) -> None:
+        """
+        Tests that the bands can be plotted on an existing axes
+        """
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        ensemble = Ensemble(self.params, frames=4, members=2, workers=1, seed=1).run()
+        ax = plt.figure().add_subplot(1, 1, 1)
+        self.assertIs(ensemble.plot(ax=ax), ax)
+        self.assertEqual(len(ax.get_lines()), 4)
+        plt.close("all")
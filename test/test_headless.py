@@ -0,0 +1,109 @@
+"""
+Test file for the headless simulation
+"""
+
+import unittest
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+from src.config_util import ConfigUtil
+from src.population_util import PopulationUtil
+from src.headless import HeadlessSimulation
+import src.kernels as kernels
+
+
+class HeadlessSimulationTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        logging.basicConfig(format='\n%(asctime)s:%(module)s:%(levelname)s:%(message)s', level=logging.DEBUG)
+        logging.info('Testing headless simulation')
+        self.config_util = ConfigUtil('config/test_config.ini')
+        self.size = 200
+        self.population_util = PopulationUtil(k=self.config_util.getFloatValue("virus.stats", "k_value"),
+                                                r=self.config_util.getFloatValue("virus.stats", "r_value"),
+                                                size=self.size,
+                                                min_age=self.config_util.getIntegerValue("people.stats", "min_age"),
+                                                max_age=self.config_util.getIntegerValue("people.stats", "max_age"),
+                                                mortality_rate=self.config_util.getDictionary("virus.stats", "mortality_rate"),
+                                                social_distance_per=self.config_util.getFloatValue("people.stats", "social_distancing_percent"),
+                                                infection_range=self.config_util.getFloatValue("virus.stats", "infection_range"),
+                                                recovery_time=self.config_util.getFloatValue("virus.stats", "recovery_time"),
+                                                total_healthcare_capacity=10,
+                                                mask_effectiveness=self.config_util.getDictionary("virus.stats", "mask_effectiveness"),
+                                                speed=self.config_util.getFloatValue("people.stats", "speed"),
+                                                social_distancing_at=5, mask_wearing_at=10)
+        self.simulation = HeadlessSimulation(self.population_util)
+
+    def test_run(self) -> None:
+        """
+        Tests that run() collects one row per frame and that the compartments always add up to the population size
+        """
+        counts = self.simulation.run(20)
+        self.assertEqual(counts.shape, (20, len(HeadlessSimulation.columns)))
+        self.assertListEqual(list(counts[:, 0]), list(range(20)))
+        self.assertTrue((counts[:, 1:5].sum(axis=1) == self.size).all())
+        self.assertTrue((counts[:, 5] <= 10).all())
+
+        self.simulation.run(5, start_frame=20)
+        self.assertEqual(len(self.simulation.counts), 25)
+        self.assertEqual(self.simulation.get_final_counts()["frame"], 24)
+
+    def test_save(self) -> None:
+        """
+        Tests that save() writes every column to the .npz file
+        """
+        self.simulation.run(5)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "results.npz")
+            self.simulation.save(path)
+            data = np.load(path)
+            self.assertListEqual(sorted(data.keys()), sorted(HeadlessSimulation.columns))
+            self.assertListEqual(list(data["infected"]), list(self.simulation.counts[:, 2]))
+
+    def test_no_plotting_imports(self) -> None:
+        """
+        Tests that the headless mode does not import the plotting or GUI stack
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            code = ("import sys\n"
+                    "from main import Main\n"
+                    "Main().runHeadless(frames=3, out=sys.argv[1])\n"
+                    "sys.exit(len({'matplotlib', 'networkx', 'PIL', 'tkinter'} & set(sys.modules)))\n")
+            result = subprocess.run([sys.executable, "-c", code, os.path.join(tmp, "results.npz")], stdout=subprocess.DEVNULL)
+            self.assertEqual(result.returncode, 0)
+
+    def test_checkpoint(self) -> None:
+        """
+        Tests that a simulation restored from a checkpoint continues exactly like the original one
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "checkpoint.npz")
+            self.simulation.run(15, checkpoint_path=path, checkpoint_every=4)
+            restored = HeadlessSimulation.from_checkpoint(path)
+            self.assertEqual(restored.next_frame(), 15)
+            np.testing.assert_array_equal(restored.counts, self.simulation.counts)
+            self.assertEqual(restored.putil.population.get_hospital_occupancy(),
+                                self.population_util.population.get_hospital_occupancy())
+            self.assertFalse(os.path.exists(path + ".partial"))
+
+            self.simulation.run(30, start_frame=15)
+            restored.run(30, start_frame=restored.next_frame())
+            np.testing.assert_array_equal(restored.counts, self.simulation.counts)
+            np.testing.assert_array_equal(np.array(restored.putil.persons), np.array(self.population_util.persons))
+
+    def test_checkpoint_backend(self) -> None:
+        """
+        Tests that a restored simulation keeps the backend of the checkpoint unless another one is given
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "checkpoint.npz")
+            self.simulation.run(3, checkpoint_path=path)
+            self.assertEqual(HeadlessSimulation.from_checkpoint(path).putil.backend, "numpy")
+
+            restored = HeadlessSimulation.from_checkpoint(path, backend="numba")
+            self.assertEqual(restored.putil.backend, kernels.resolve_backend("numba"))
+            restored.run(3, start_frame=restored.next_frame(), checkpoint_path=path)
+            self.assertEqual(HeadlessSimulation.from_checkpoint(path).putil.backend, kernels.resolve_backend("numba"))
@@ -0,0 +1,80 @@
+"""
+Test file for the phase timer
+"""
+
+import unittest
+import logging
+import numpy as np
+from src.config_util import ConfigUtil
+from src.instrumentation import PhaseTimer
+from src.population_util import PopulationUtil
+
+
+class PhaseTimerTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        logging.basicConfig(format='\n%(asctime)s:%(module)s:%(levelname)s:%(message)s', level=logging.DEBUG)
+        logging.info('Testing phase timer')
+        self.config_util = ConfigUtil('config/test_config.ini')
+
+    def create(self) -> PopulationUtil:
+        """
+        Creates a seeded simulation from the test config
+        """
+        return PopulationUtil(k=self.config_util.getFloatValue("virus.stats", "k_value"),
+                                r=self.config_util.getFloatValue("virus.stats", "r_value"),
+                                size=400,
+                                min_age=self.config_util.getIntegerValue("people.stats", "min_age"),
+                                max_age=self.config_util.getIntegerValue("people.stats", "max_age"),
+                                mortality_rate=self.config_util.getDictionary("virus.stats", "mortality_rate"),
+                                social_distance_per=self.config_util.getFloatValue("people.stats", "social_distancing_percent"),
+                                infection_range=self.config_util.getFloatValue("virus.stats", "infection_range"),
+                                recovery_time=self.config_util.getFloatValue("virus.stats", "recovery_time"),
+                                total_healthcare_capacity=40,
+                                mask_effectiveness=self.config_util.getDictionary("virus.stats", "mask_effectiveness"),
+                                speed=self.config_util.getFloatValue("people.stats", "speed"),
+                                social_distancing_at=10, mask_wearing_at=20, seed=8)
+
+    def test_laps(self) -> None:
+        """
+        Tests that the laps of a step add up and that the shares sum to one
+        """
+        timer = PhaseTimer()
+        for _ in range(3):
+            timer.start()
+            timer.lap("a")
+            timer.lap("b")
+            timer.count("work", 2)
+        stats = timer.get_stats()
+        self.assertEqual(stats["steps"], 3)
+        self.assertEqual(stats["phases"]["a"]["calls"], 3)
+        self.assertAlmostEqual(sum(phase["share"] for phase in stats["phases"].values()), 1)
+        self.assertEqual(stats["counters"]["work"], 6)
+        self.assertTrue(timer.summary(top=1).startswith("Step"))
+
+    def test_move(self) -> None:
+        """
+        Tests that move() charges every phase once per step, counts the infectors, and behaves the same with
+        and without instrumentation
+        """
+        plain = self.create()
+        timed = self.create()
+        self.assertEqual(timed.get_stats(), {})
+        timer = timed.enable_instrumentation()
+        infectors = 0
+        for frame in range(30):
+            infectors += timed.population.get_state_counts()[1]
+            plain.move(frame)
+            timed.move(frame)
+
+        stats = timed.get_stats()
+        self.assertEqual(stats["steps"], 30)
+        for phase in ["interventions", "out_of_bounds", "update_persons", "update_pop", "infect.find_pairs", "infect.transmit"]:
+            self.assertEqual(stats["phases"][phase]["calls"], 30)
+        self.assertEqual(stats["counters"]["infectors_scanned"], infectors)
+        np.testing.assert_array_equal(np.array(timed.persons), np.array(plain.persons))
+
+        timed.disable_instrumentation()
+        timed.move(30)
+        self.assertEqual(timer.steps, 30)
+        self.assertEqual(timed.get_stats(), {})
@@ -0,0 +1,165 @@
+"""
+Test file for the compiled kernels
+"""
+
+import unittest
+import logging
+import numpy as np
+from src import kernels
+from src.config_util import ConfigUtil
+from src.population import Population
+from src.population_util import PopulationUtil
+from src.movements import Movement
+from src.spatial_index import SpatialGrid
+from src.virus_util import Virus
+import src.person_properties_util as idx
+
+
+class KernelsTest(unittest.TestCase):
+    """
+    Compares the numba backend with the numpy backend. Without Numba the kernels run as plain Python, so the
+    comparisons check the same loops that get compiled
+    """
+
+    def setUp(self) -> None:
+        logging.basicConfig(format='\n%(asctime)s:%(module)s:%(levelname)s:%(message)s', level=logging.DEBUG)
+        logging.info('Testing kernels')
+        self.size = 400
+        self.infection_range = 0.004
+        self.pop = Population(self.size, np.random.default_rng(7))
+        self.pop.initialize_id(0, self.size)
+        self.pop.initialize_positions([0, 1], [0, 1], self.size)
+        Movement(np.random.default_rng(7)).update_persons(self.pop.persons, self.size, heading_update_chance=1)
+        self.pop.persons[:40, idx.current_state] = 1
+        self.pop.persons[:40, idx.g_value] = 3
+        self.pop.persons[:40, idx.infected_at] = 0
+        self.pop.persons[:, idx.susceptibility] = 0.5
+        self.pop.persons[40:60, idx.social_distance] = 1
+        self.pop.persons[60:80, idx.current_state] = 3
+
+    def copy_population(self) -> Population:
+        """
+        Returns a copy of the population of setUp
+        """
+        population = Population(self.size)
+        for source, column in zip(self.pop.persons.columns, population.persons.columns):
+            column[:] = source
+        return population
+
+    def infect(self, backend: str, seed: int) -> Population:
+        """
+        Runs one frame of the virus on a copy of the population with the given backend
+        """
+        population = self.copy_population()
+        virus = Virus(self.infection_range, 100, self.size, np.random.default_rng(seed), backend)
+        virus.spatial_index = SpatialGrid(self.infection_range)
+        virus.infect(population, 1)
+        return population
+
+    def test_resolve_backend(self) -> None:
+        """
+        Tests that auto picks Numba when it is installed and that numba falls back to numpy without it
+        """
+        expected = "numba" if kernels.is_available() else "numpy"
+        self.assertEqual(kernels.resolve_backend("auto"), expected)
+        self.assertEqual(kernels.resolve_backend("numba"), expected)
+        self.assertEqual(kernels.resolve_backend("numpy"), "numpy")
+        with self.assertRaises(ValueError):
+            kernels.resolve_backend("fortran")
+        with self.assertRaises(ValueError):
+            Movement(backend="fortran")
+
+    def test_move(self) -> None:
+        """
+        Tests that update_pop() moves the same persons to the same positions with both backends
+        """
+        expected = Movement().update_pop(self.copy_population().persons)
+        moved = Movement(backend="numba").update_pop(self.copy_population().persons)
+        np.testing.assert_array_equal(moved[:, idx.x_axis], expected[:, idx.x_axis])
+        np.testing.assert_array_equal(moved[:, idx.y_axis], expected[:, idx.y_axis])
+
+    def test_out_of_bounds(self) -> None:
+        """
+        Tests that out_of_bounds() turns around the same persons with both backends, with directions drawn from
+        the same distribution
+        """
+        bounds = np.array([[0.25, 0.75]])
+        before = self.copy_population().persons
+        expected = Movement(np.random.default_rng(1)).out_of_bounds(self.copy_population().persons, bounds, bounds)
+        turned = Movement(np.random.default_rng(1), backend="numba").out_of_bounds(self.copy_population().persons,
+                                                                                    bounds, bounds)
+        for axis in [idx.x_dir, idx.y_dir]:
+            changed = expected[:, axis] != before[:, axis]
+            self.assertTrue(changed.any())
+            np.testing.assert_array_equal(turned[:, axis] != before[:, axis], changed)
+            np.testing.assert_array_equal(np.sign(turned[:, axis]), np.sign(expected[:, axis]))
+            self.assertAlmostEqual(np.abs(turned[:, axis][changed]).mean(), np.abs(expected[:, axis][changed]).mean(),
+                                    delta=0.05)
+
+    def test_infect_certain(self) -> None:
+        """
+        Tests that both backends infect the same persons, from the same infectors given by id, when every
+        contact infects
+        """
+        self.pop.persons[:, idx.susceptibility] = 1
+        self.pop.persons[:40, idx.g_value] = 1000
+        self.pop.persons[:, idx.id] += 1000
+        expected = self.infect("numpy", 0).persons
+        infected = self.infect("numba", 0).persons
+        self.assertGreater(np.count_nonzero(expected[:, idx.current_state] == 1), 40)
+        new = infected[:, idx.infected_at] == 1
+        self.assertTrue(np.isin(infected[:, idx.infected_by][new], np.arange(1000, 1040)).all())
+        for column in [idx.current_state, idx.infected_by, idx.infected_at, idx.g_value, idx.hospitalized]:
+            np.testing.assert_array_equal(infected[:, column], expected[:, column])
+
+    def test_infect_statistically_equivalent(self) -> None:
+        """
+        Tests that both backends infect as many persons on average at fixed seeds, and that the g values bound
+        the infections the same way
+        """
+        counts = {}
+        for backend in ["numpy", "numba"]:
+            counts[backend] = []
+            for seed in range(30):
+                persons = self.infect(backend, seed).persons
+                new = np.count_nonzero(persons[:, idx.infected_at] == 1)
+                self.assertEqual(new, 120 - persons[:40, idx.g_value].astype(int).sum())
+                self.assertTrue((persons[:, idx.current_state][persons[:, idx.social_distance] == 1] == 0).all())
+                counts[backend].append(new)
+        expected = np.mean(counts["numpy"])
+        self.assertGreater(expected, 10)
+        self.assertAlmostEqual(np.mean(counts["numba"]), expected, delta=0.1 * expected)
+
+    @unittest.skipUnless(kernels.is_available(), "Numba is not installed")
+    def test_population_util(self) -> None:
+        """
+        Tests that full simulations end with the same state counts on average with both backends
+        """
+        config_util = ConfigUtil('config/test_config.ini')
+        params = dict(k=config_util.getFloatValue("virus.stats", "k_value"), r=config_util.getFloatValue("virus.stats", "r_value"),
+                        size=2000, min_age=config_util.getIntegerValue("people.stats", "min_age"),
+                        max_age=config_util.getIntegerValue("people.stats", "max_age"),
+                        mortality_rate=config_util.getDictionary("virus.stats", "mortality_rate"),
+                        social_distance_per=config_util.getFloatValue("people.stats", "social_distancing_percent"),
+                        infection_range=config_util.getFloatValue("virus.stats", "infection_range"),
+                        recovery_time=config_util.getFloatValue("virus.stats", "recovery_time"),
+                        total_healthcare_capacity=20,
+                        mask_effectiveness=config_util.getDictionary("virus.stats", "mask_effectiveness"),
+                        speed=config_util.getFloatValue("people.stats", "speed"),
+                        social_distancing_at=config_util.getIntegerValue("area.stats", "enforce_social_distancing_at"),
+                        mask_wearing_at=config_util.getIntegerValue("area.stats", "enforce_mask_wearing_at"))
+        counts = {}
+        for backend in ["numpy", "numba"]:
+            counts[backend] = []
+            for seed in range(10):
+                population_util = PopulationUtil(seed=seed, backend=backend, **params)
+                self.assertEqual(population_util.backend, backend)
+                for frame in range(200):
+                    population_util.move(frame)
+                counts[backend].append(population_util.population.get_state_counts())
+        expected = np.mean(counts["numpy"], axis=0)
+        np.testing.assert_allclose(np.mean(counts["numba"], axis=0), expected, atol=0.15 * params["size"])
+
+
+if __name__ == '__main__':
+    unittest.main()
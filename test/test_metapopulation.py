@@ -0,0 +1,138 @@
+"""
+Test file for the metapopulation mode
+"""
+
+import unittest
+import logging
+import numpy as np
+from src.config_util import ConfigUtil
+from src.headless import HeadlessSimulation
+from src.metapopulation import Metapopulation
+from src.population_util import PopulationUtil
+from src.tracing import InfectionTrace
+import src.person_properties_util as idx
+
+
+class MetapopulationTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        logging.basicConfig(format='\n%(asctime)s:%(module)s:%(levelname)s:%(message)s', level=logging.DEBUG)
+        logging.info('Testing metapopulation')
+        config_util = ConfigUtil('config/test_config.ini')
+        self.params = dict(k=config_util.getFloatValue("virus.stats", "k_value"),
+                            r=config_util.getFloatValue("virus.stats", "r_value"),
+                            size=200,
+                            min_age=config_util.getIntegerValue("people.stats", "min_age"),
+                            max_age=config_util.getIntegerValue("people.stats", "max_age"),
+                            mortality_rate=config_util.getDictionary("virus.stats", "mortality_rate"),
+                            social_distance_per=config_util.getFloatValue("people.stats", "social_distancing_percent"),
+                            infection_range=config_util.getFloatValue("virus.stats", "infection_range"),
+                            recovery_time=config_util.getFloatValue("virus.stats", "recovery_time"),
+                            total_healthcare_capacity=20,
+                            mask_effectiveness=config_util.getDictionary("virus.stats", "mask_effectiveness"),
+                            speed=config_util.getFloatValue("people.stats", "speed"),
+                            social_distancing_at=config_util.getIntegerValue("area.stats", "enforce_social_distancing_at"),
+                            mask_wearing_at=config_util.getIntegerValue("area.stats", "enforce_mask_wearing_at"))
+        self.spec = {"regions": [{"size": 300}, {"size": 200}, {"size": 150}],
+                        "travel": [[0, 0.05, 0.02], [0.05, 0, 0.05], [0.1, 0, 0]], "frames_per_day": 10}
+
+    def test_shards(self) -> None:
+        """
+        Tests that every region is in exactly one shard and that the largest regions are spread first
+        """
+        metapopulation = Metapopulation([dict(self.params, size=size) for size in [500, 100, 400, 300]], np.zeros((4, 4)),
+                                        workers=2)
+        self.assertListEqual(metapopulation.shards, [[0, 1], [2, 3]])
+        self.assertEqual(Metapopulation([self.params], [[0]], workers=8).workers, 1)
+
+    def test_invalid_travel(self) -> None:
+        """
+        Tests that travel matrices of the wrong shape or with more than everybody leaving are refused
+        """
+        with self.assertRaises(ValueError):
+            Metapopulation([self.params, self.params], np.zeros((3, 3)))
+        with self.assertRaises(ValueError):
+            Metapopulation([self.params, self.params, self.params], [[0, 0.6, 0.6], [0, 0, 0], [0, 0, 0]])
+
+    def test_no_travel(self) -> None:
+        """
+        Tests that regions without travel evolve exactly like the same simulations run on their own
+        """
+        with Metapopulation([self.params, self.params], np.zeros((2, 2)), frames_per_day=5, workers=1, seed=4) as metapopulation:
+            counts = metapopulation.run(4)
+            seeds = metapopulation.seeds
+        for region, seed in enumerate(seeds):
+            expected = HeadlessSimulation(PopulationUtil(seed=seed, **self.params)).run(20)
+            np.testing.assert_array_equal(counts[region], expected)
+
+    def test_travel(self) -> None:
+        """
+        Tests that travellers move between the regions without being lost, with unique ids, and that the result
+        does not depend on the number of worker processes
+        """
+        runs = []
+        for workers in [1, 2]:
+            with Metapopulation.from_spec(self.spec, self.params, workers=workers, seed=7) as metapopulation:
+                runs.append(metapopulation.run(6))
+                if workers == 1:
+                    simulations = metapopulation.local_shard.simulations
+                    #The travellers of the last day are on their way to their destinations
+                    travelling = [batch for arrivals in metapopulation.arrivals for batches in arrivals.values() for batch in batches]
+                    ids = np.concatenate([simulations[r].putil.persons[:, idx.id] for r in range(3)] +
+                                            [batch[:, idx.id] for batch in travelling])
+                    sizes = [simulations[r].putil.size for r in range(3)]
+        np.testing.assert_array_equal(runs[0], runs[1])
+
+        self.assertEqual(runs[0].shape, (3, 60, len(HeadlessSimulation.columns)))
+        totals = runs[0][:, :, 1:5].sum(axis=2)
+        np.testing.assert_array_equal(totals.sum(axis=0), np.full(60, 650))
+        self.assertNotEqual(sizes, [300, 200, 150])
+        np.testing.assert_array_equal(np.sort(ids), np.arange(650))
+
+    def test_infected_by(self) -> None:
+        """
+        Tests that the infectors stay ids of persons who were infected after the travellers moved around for a few
+        days, while the rows of the persons keep changing
+        """
+        with Metapopulation.from_spec(self.spec, self.params, workers=1, seed=5) as metapopulation:
+            metapopulation.run(8)
+            simulations = metapopulation.local_shard.simulations
+            travelling = [batch for arrivals in metapopulation.arrivals for batches in arrivals.values() for batch in batches]
+            persons = [simulations[r].putil.persons for r in range(3)] + travelling
+        ids = np.concatenate([batch[:, idx.id] for batch in persons])
+        states = np.concatenate([batch[:, idx.current_state] for batch in persons])
+        infected_by = np.concatenate([batch[:, idx.infected_by] for batch in persons])
+        infectors = infected_by[infected_by >= 0]
+        self.assertGreater(len(infectors), 20)
+        self.assertTrue(np.isin(infectors, ids).all())
+        order = np.argsort(ids)
+        self.assertTrue((states[order[np.searchsorted(ids, infectors, sorter=order)]] != 0).all())
+
+    def test_unseeded_region(self) -> None:
+        """
+        Tests that a region without an index case stays healthy without travel and is only infected by the
+        travellers arriving from a seeded region otherwise
+        """
+        spec = {"regions": [{"size": 300}, {"size": 200, "seeded": False}], "travel": [[0, 0], [0, 0]], "frames_per_day": 10}
+        with Metapopulation.from_spec(spec, self.params, workers=1, seed=3) as metapopulation:
+            counts = metapopulation.run(5)
+            putil = metapopulation.local_shard.simulations[1].putil
+            self.assertEqual(putil.infected_person, -1)
+            self.assertTrue((putil.persons[:, idx.infected_by] == -1).all())
+        np.testing.assert_array_equal(counts[1, :, 1], np.full(50, 200))
+        self.assertGreater(counts[0, -1, 1], 0)
+
+        # A faster epidemic, so that infected persons travel
+        params = dict(self.params, r=6.0, infection_range=8 * self.params["infection_range"])
+        spec["travel"] = [[0, 0.2], [0, 0]]
+        with Metapopulation.from_spec(spec, params, workers=1, seed=3) as metapopulation:
+            counts = metapopulation.run(8)
+            trace = InfectionTrace.from_population(metapopulation.local_shard.simulations[1].putil.population)
+        np.testing.assert_array_equal(counts[1, :10, 1], np.full(10, 200))
+        self.assertGreater(len(trace), len(trace.person[trace.roots]))
+        self.assertTrue((trace.person[trace.roots] < 300).all())
+        self.assertTrue((trace.infected_by[trace.roots] < 300).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
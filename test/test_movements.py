@@ -9,6 +9,7 @@ import unittest
 from src.movements import Movement
 import src.person_properties_util as idx
 from src.population import Population
+from src.person_table import PersonTable
 import numpy as np
 import logging
 
@@ -32,7 +33,7 @@ class MovementTest(unittest.TestCase):
         Tests update_person() method of Movement class and movements module to check data is getting updated randomly
         """
 
-        self.assertIsInstance(self.movement.update_persons(self.pop.get_person(),len(self.pop.get_person())), np.ndarray)
+        self.assertIsInstance(self.movement.update_persons(self.pop.get_person(),len(self.pop.get_person())), PersonTable)
         self.pop.persons[:,idx.speed] = 0.1
         self.assertNotEqual(self.movement.update_persons(self.pop.get_person(),
             len(self.pop.get_person()),heading_update_chance=1)[:,idx.y_dir].any(), 0)
@@ -48,7 +49,7 @@ class MovementTest(unittest.TestCase):
         """
 
         self.assertIsInstance(self.movement.out_of_bounds(self.pop.get_person(),
-            np.array([[0,1]] * 10),np.array([[0,1]] * 10)), np.ndarray)
+            np.array([[0,1]] * 10),np.array([[0,1]] * 10)), PersonTable)
         self.pop.persons[:,idx.speed] = 1
         self.pop.persons[:,idx.x_axis] = 1.1
         self.pop.persons[:,idx.y_axis] = 1.1
@@ -83,6 +84,20 @@ class MovementTest(unittest.TestCase):
         
         self.pop.persons = self.movement.update_pop(self.pop.persons)
 
-        self.assertIsInstance(self.pop.get_person(), np.ndarray)
+        self.assertIsInstance(self.pop.get_person(), PersonTable)
         self.assertListEqual(list(self.pop.get_x_axis()),expectd_x)
         self.assertListEqual(list(self.pop.get_y_axis()),expectd_y)
+
+    def test_chunks(self) -> None:
+        """
+        Tests that processing the population in chunks moves the persons the same as processing it at once
+        """
+        self.pop.persons[:,idx.x_dir] = np.linspace(-1, 1, 10)
+        self.pop.persons[:,idx.y_dir] = 0.2
+        self.pop.persons[:,idx.speed] = 0.5
+        self.pop.persons[3,idx.current_state] = 3
+        expected = Movement().update_pop(np.array(self.pop.persons))
+
+        self.assertListEqual([(r.start, r.stop) for r in Movement(chunk_size=4).chunks(10)], [(0, 4), (4, 8), (8, 10)])
+        Movement(chunk_size=4).update_pop(self.pop.persons)
+        np.testing.assert_allclose(np.array(self.pop.persons), expected, rtol=1e-6)
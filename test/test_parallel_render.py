@@ -0,0 +1,63 @@
+"""
+Test file for the parallel render
+"""
+
+import unittest
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from src.config_util import ConfigUtil
+from src.population_util import PopulationUtil
+from src.parallel_render import ParallelRender
+
+
+class ParallelRenderTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        logging.basicConfig(format='\n%(asctime)s:%(module)s:%(levelname)s:%(message)s', level=logging.DEBUG)
+        logging.info('Testing parallel render')
+        self.config_util = ConfigUtil('config/test_config.ini')
+        self.population_util = PopulationUtil(k=self.config_util.getFloatValue("virus.stats", "k_value"),
+                                                r=self.config_util.getFloatValue("virus.stats", "r_value"),
+                                                size=100,
+                                                min_age=self.config_util.getIntegerValue("people.stats", "min_age"),
+                                                max_age=self.config_util.getIntegerValue("people.stats", "max_age"),
+                                                mortality_rate=self.config_util.getDictionary("virus.stats", "mortality_rate"),
+                                                social_distance_per=self.config_util.getFloatValue("people.stats", "social_distancing_percent"),
+                                                infection_range=self.config_util.getFloatValue("virus.stats", "infection_range"),
+                                                recovery_time=self.config_util.getFloatValue("virus.stats", "recovery_time"),
+                                                total_healthcare_capacity=20,
+                                                mask_effectiveness=self.config_util.getDictionary("virus.stats", "mask_effectiveness"),
+                                                speed=self.config_util.getFloatValue("people.stats", "speed"),
+                                                social_distancing_at=10, mask_wearing_at=20, seed=2)
+
+    def test_segments(self) -> None:
+        """
+        Tests that the segments cover every frame once and start on multiples of refresh_every
+        """
+        for frames, workers in [(1000, 32), (1000, 3), (95, 4), (7, 8), (10, 1)]:
+            segments = ParallelRender(self.population_util, frames, workers=workers).segments()
+            self.assertLessEqual(len(segments), workers)
+            covered = [frame for first, length in segments for frame in range(first, first + length)]
+            self.assertListEqual(covered, list(range(frames)))
+            for first, _ in segments:
+                self.assertEqual(first % 10, 0)
+        self.assertListEqual(ParallelRender(self.population_util, 0, workers=4).segments(), [])
+        with self.assertRaises(ValueError):
+            ParallelRender(self.population_util, 0, workers=4).run("render.mp4")
+
+    @unittest.skipIf(shutil.which("ffmpeg") is None, "ffmpeg is not installed")
+    def test_run(self) -> None:
+        """
+        Tests that every frame ends up in the joined video
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "render.mp4")
+            ParallelRender(self.population_util, 25, workers=3, dpi=30).run(path)
+            probe = subprocess.run(["ffprobe", "-v", "error", "-count_frames", "-select_streams", "v:0",
+                                    "-show_entries", "stream=nb_read_frames", "-of", "csv=p=0", path],
+                                    capture_output=True, text=True)
+            self.assertEqual(probe.stdout.strip(), "25")
+            self.assertListEqual(os.listdir(tmp), ["render.mp4"])
@@ -0,0 +1,92 @@
+"""
+Test file for the person table
+"""
+
+import unittest
+import logging
+import tempfile
+import numpy as np
+from src.person_table import PersonTable
+from src.population_util import PopulationUtil
+import src.person_properties_util as idx
+
+
+class PersonTableTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        logging.basicConfig(format='\n%(asctime)s:%(module)s:%(levelname)s:%(message)s', level=logging.DEBUG)
+        logging.info('Testing person table')
+        self.size = 50
+        self.matrix = np.random.default_rng(1).integers(0, 4, size=(self.size, len(idx.dtypes))).astype(np.float64)
+        self.table = PersonTable.from_array(self.matrix)
+
+    def test_dtypes(self) -> None:
+        """
+        Tests that every property is stored in its own contiguous column of the schema type
+        """
+        self.assertEqual(self.table.shape, (self.size, 20))
+        self.assertEqual(len(self.table), self.size)
+        for column, dtype in zip(self.table.columns, idx.dtypes):
+            self.assertEqual(column.dtype, dtype)
+            self.assertTrue(column.flags["C_CONTIGUOUS"])
+        self.assertLess(self.table.nbytes, self.matrix.nbytes / 2)
+
+    def test_matches_matrix(self) -> None:
+        """
+        Tests that reads return the same values as indexing the equivalent float64 matrix
+        """
+        mask = self.matrix[:, idx.current_state] == 1
+        rows = np.array([3, 1, 7])
+        np.testing.assert_array_equal(np.array(self.table), self.matrix)
+        np.testing.assert_array_equal(self.table[mask], self.matrix[mask])
+        np.testing.assert_array_equal(self.table[rows, idx.x_axis], self.matrix[rows, idx.x_axis])
+        np.testing.assert_array_equal(self.table[5], self.matrix[5])
+        self.assertEqual(self.table[4, idx.infected_by], self.matrix[4, idx.infected_by])
+        self.assertEqual(self.table[mask].dtype, np.float64)
+
+    def test_writes(self) -> None:
+        """
+        Tests that writes through column views, fancy indices and row selections reach the columns
+        """
+        self.table[:, idx.x_dir][self.table[:, idx.current_state] == 2] = 0.5
+        self.matrix[:, idx.x_dir][self.matrix[:, idx.current_state] == 2] = 0.5
+        self.table[[0, 2], idx.g_value] -= 1
+        self.matrix[[0, 2], idx.g_value] -= 1
+        self.table[:, idx.infected_by].fill(-1)
+        self.matrix[:, idx.infected_by].fill(-1)
+        self.table[9] = np.arange(20)
+        self.matrix[9] = np.arange(20)
+        np.testing.assert_array_equal(np.array(self.table), self.matrix)
+
+    def test_slice_view(self) -> None:
+        """
+        Tests that a range of rows is a PersonTable viewing the same columns
+        """
+        view = self.table[10:20]
+        self.assertIsInstance(view, PersonTable)
+        self.assertEqual(len(view), 10)
+        view[:, idx.speed] = 7
+        np.testing.assert_array_equal(self.table[:, idx.speed][10:20], 7)
+        self.assertTrue(np.all(self.table[:, idx.speed][:10] != 7))
+
+    def test_storage(self) -> None:
+        """
+        Tests that a simulation stored in memory mapped files matches the in memory one and can be reopened
+        """
+        params = dict(size=300, r=3.0, k=0.5, min_age=1, max_age=90, mortality_rate={"0-100": 0.1},
+                        social_distance_per=0.2, infection_range=0.001, recovery_time=50, total_healthcare_capacity=30,
+                        mask_effectiveness={"none": 0, "surgical": 60}, speed=0.01, social_distancing_at=20,
+                        mask_wearing_at=10)
+        with tempfile.TemporaryDirectory() as storage_dir:
+            stored = PopulationUtil(seed=3, storage_dir=storage_dir, **params)
+            in_memory = PopulationUtil(seed=3, **params)
+            for frame in range(60):
+                stored.move(frame)
+                in_memory.move(frame)
+            self.assertIsInstance(stored.persons.columns[0], np.memmap)
+            np.testing.assert_array_equal(np.array(stored.persons), np.array(in_memory.persons))
+
+            stored.persons.flush()
+            reopened = PersonTable.open(storage_dir)
+            np.testing.assert_array_equal(np.array(reopened), np.array(in_memory.persons))
+            del stored, reopened
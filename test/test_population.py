@@ -8,6 +8,7 @@ import logging
 import unittest
 from src.config_util import ConfigUtil
 from src.population_util import Population
+from src.person_table import PersonTable
 import numpy as np
 
 
@@ -62,7 +63,7 @@ class PopulationClassTest(unittest.TestCase):
         """
         Test to check if the population has been created of a correct size as provided by the config file
         """
-        assert isinstance(self.population.get_person(), np.ndarray)
+        assert isinstance(self.population.get_person(), PersonTable)
         self.assertEqual(self.size, self.population.get_person()[:, 0].size)
 
     def test_get_all_infected(self):
@@ -110,6 +111,31 @@ class PopulationClassTest(unittest.TestCase):
                 self.assertTrue(False, "Array contains values other than 0 and 1")
         self.assertTrue(True, "Array contains either 0 or 1")
 
+    def test_hospital_occupancy(self):
+        """
+        Test to check if the hospital occupancy follows admissions and discharges and matches the hospitalized column
+        """
+        self.assertEqual(self.population.get_hospital_occupancy(), 0)
+        self.population.admit_to_hospital(np.array([1, 2, 3]))
+        self.population.admit_to_hospital(np.array([7]))
+        self.population.discharge_from_hospital(2)
+        self.assertEqual(self.population.get_hospital_occupancy(), 3)
+        self.assertEqual(self.population.get_hospital_occupancy(), np.count_nonzero(self.population.persons[:, 17] == 1))
+        self.assertEqual(self.population.persons[2, 17], 3)
+
+    def test_get_positions_by_state(self):
+        """
+        Test to check if get_positions_by_state() groups the same positions, in the same order, as the get_all_*() functions
+        """
+        self.population.initialize_positions([0, 1], [0, 1], self.size)
+        self.population.persons[:, 9] = np.arange(self.size) % 3 * (np.arange(self.size) % 5 > 0)
+        self.population.persons[-1, 9] = 3
+        counts, positions = self.population.get_positions_by_state()
+        self.assertListEqual(list(counts), list(self.population.get_state_counts()))
+        for group, rows in zip(positions, [self.population.get_all_healthy(), self.population.get_all_infected(),
+                                            self.population.get_all_recovered(), self.population.get_all_dead()]):
+            np.testing.assert_array_equal(group, rows[:, 2:4])
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
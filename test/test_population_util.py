@@ -9,6 +9,10 @@ import unittest
 from src.config_util import ConfigUtil
 from src.population_util import PopulationUtil
 import functools
+import numpy as np
+from src.population_util import spawn_seeds
+import src.person_properties_util as idx
+from src.person_table import PersonTable
 
 
 class PopulationUtilClassTest(unittest.TestCase):
@@ -36,11 +40,11 @@ class PopulationUtilClassTest(unittest.TestCase):
         self.enforce_mask_wearing_at    = self.config_util.getIntegerValue("area.stats", "enforce_mask_wearing_at")
         self.initialize()
 
-    def initialize(self) -> None:
+    def initialize(self, seed=None) -> PopulationUtil:
         """
         Initializes the population util class with the appropriate parameters
         """
-        self.population_util = PopulationUtil(k=self.k, r=self.r, min_age=self.min_age, max_age=self.max_age,
+        self.population_util = PopulationUtil(seed=seed, k=self.k, r=self.r, min_age=self.min_age, max_age=self.max_age,
                                                   size=self.size,
                                                   mortality_rate=self.mortality_rate,
                                                   infection_range=self.infection_range,
@@ -50,6 +54,7 @@ class PopulationUtilClassTest(unittest.TestCase):
                                                   mask_effectiveness=self.mask_effectiveness, speed=self.speed,
                                                   social_distancing_at=self.enforce_social_distance_at,
                                                   mask_wearing_at=self.enforce_mask_wearing_at)
+        return self.population_util
 
     def test_move(self):
         """
@@ -73,4 +78,62 @@ class PopulationUtilClassTest(unittest.TestCase):
                 self.assertTrue(True, "Test passed, y axis values changed")
         except Exception as e:
             self.assertTrue(False, 'Test failed')
-            logging.error('Error occured '+e)
\ No newline at end of file
+            logging.error('Error occured '+e)
+
+    def test_seed(self):
+        """
+        Tests that runs with the same seed are identical and that runs with different seeds are not
+        """
+        runs = []
+        for seed in [5, 5, 6]:
+            population_util = self.initialize(seed)
+            for frame in range(30):
+                population_util.move(frame)
+            runs.append(np.array(population_util.persons))
+        np.testing.assert_array_equal(runs[0], runs[1])
+        self.assertFalse(np.array_equal(runs[0], runs[2]))
+
+    def test_spawn_seeds(self):
+        """
+        Tests that spawn_seeds() derives distinct and reproducible seeds
+        """
+        seeds = spawn_seeds(3, 8)
+        self.assertEqual(len(set(seeds)), 8)
+        self.assertListEqual(seeds, spawn_seeds(3, 8))
+
+    def test_remove_add_persons(self):
+        """
+        Tests that removed persons keep their properties when added to another simulation, which keeps moving
+        """
+        source = self.initialize(1)
+        target = PopulationUtil(seed=2, **source.get_params())
+        patient = source.persons[source.infected_person, idx.id]
+        rows = np.array([r for r in [3, 0, 7] if r != source.infected_person])
+        expected = np.array(source.persons)[rows]
+
+        removed = source.remove_persons(rows)
+        np.testing.assert_array_equal(np.array(removed), expected)
+        self.assertEqual(source.size, self.size - len(rows))
+        self.assertEqual(len(source.destinations), source.size)
+        self.assertEqual(source.persons[source.infected_person, idx.id], patient)
+
+        #The first infected person may leave too, it is no longer tracked then
+        occupancy = source.population.get_hospital_occupancy()
+        source.persons[source.infected_person, idx.hospitalized] = 1
+        source.population.hospital_occupancy += 1
+        patient_zero = source.remove_persons([source.infected_person])
+        self.assertEqual(source.infected_person, -1)
+        self.assertEqual(source.population.get_hospital_occupancy(), occupancy)
+        removed = PersonTable.concatenate([removed, patient_zero])
+        expected = np.concatenate((expected, np.array(patient_zero)))
+        rows = np.append(rows, -1)
+
+        occupancy = target.population.get_hospital_occupancy()
+        target.add_persons(removed)
+        self.assertEqual(target.population.get_hospital_occupancy(), occupancy + 1)
+        self.assertEqual(target.size, self.size + len(rows))
+        np.testing.assert_array_equal(np.array(target.persons)[-len(rows):], expected)
+        for frame in range(5):
+            source.move(frame)
+            target.move(frame)
+        self.assertEqual(target.population.get_state_counts().sum(), target.size)
@@ -0,0 +1,129 @@
+"""
+Test file for the time series recorder
+"""
+
+import unittest
+import logging
+import os
+import tempfile
+import numpy as np
+from src.config_util import ConfigUtil
+from src.population_util import PopulationUtil
+from src.headless import HeadlessSimulation
+from src.recorder import TimeSeriesRecorder, pyarrow
+
+
+class TimeSeriesRecorderTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        logging.basicConfig(format='\n%(asctime)s:%(module)s:%(levelname)s:%(message)s', level=logging.DEBUG)
+        logging.info('Testing time series recorder')
+        self.config_util = ConfigUtil('config/test_config.ini')
+        self.size = 300
+        self.frames = 40
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def create_population_util(self) -> PopulationUtil:
+        """
+        Creates the recorded simulation
+        """
+        return PopulationUtil(k=self.config_util.getFloatValue("virus.stats", "k_value"),
+                                            r=self.config_util.getFloatValue("virus.stats", "r_value"),
+                                            size=self.size,
+                                            min_age=self.config_util.getIntegerValue("people.stats", "min_age"),
+                                            max_age=self.config_util.getIntegerValue("people.stats", "max_age"),
+                                            mortality_rate=self.config_util.getDictionary("virus.stats", "mortality_rate"),
+                                            social_distance_per=self.config_util.getFloatValue("people.stats", "social_distancing_percent"),
+                                            infection_range=self.config_util.getFloatValue("virus.stats", "infection_range"),
+                                            recovery_time=self.config_util.getFloatValue("virus.stats", "recovery_time"),
+                                            total_healthcare_capacity=20,
+                                            mask_effectiveness=self.config_util.getDictionary("virus.stats", "mask_effectiveness"),
+                                            speed=self.config_util.getFloatValue("people.stats", "speed"),
+                                            social_distancing_at=10, mask_wearing_at=20, seed=4)
+
+    def record(self, name: str) -> tuple:
+        """
+        Runs a simulation with a recorder using small chunks attached, returns the recorded file and the counts
+        """
+        population_util = self.create_population_util()
+        path = os.path.join(self.tmp.name, name)
+        simulation = HeadlessSimulation(population_util)
+        with TimeSeriesRecorder(path, chunk_frames=7).attach(population_util):
+            counts = simulation.run(self.frames)
+        return path, counts
+
+    def check(self, recorded: dict, counts: np.ndarray) -> None:
+        """
+        Checks the recorded columns against the counts of the headless simulation
+        """
+        for i, name in enumerate(HeadlessSimulation.columns):
+            self.assertListEqual(list(recorded[name]), list(counts[:, i]))
+        self.assertListEqual(list(recorded["social_distancing"]), [int(frame >= 10) for frame in range(self.frames)])
+        self.assertListEqual(list(recorded["mask_wearing"]), [int(frame >= 20) for frame in range(self.frames)])
+        infected = self.size - counts[:, 1]
+        self.assertListEqual(list(recorded["new_infections"][1:]), list(np.diff(infected)))
+
+    def test_csv(self) -> None:
+        """
+        Tests that every frame is recorded to CSV
+        """
+        path, counts = self.record("series.csv")
+        recorded = np.genfromtxt(path, delimiter=",", names=True, dtype=np.int64)
+        self.check(recorded, counts)
+
+    def test_npz(self) -> None:
+        """
+        Tests that every frame is recorded to npz and that the temporary file is removed
+        """
+        path, counts = self.record("series.npz")
+        self.check(np.load(path), counts)
+        self.assertFalse(os.path.exists(path + ".partial"))
+
+    def test_parquet(self) -> None:
+        """
+        Tests that every frame is recorded to Parquet
+        """
+        if pyarrow is None:
+            self.skipTest("pyarrow is not installed")
+        path, counts = self.record("series.parquet")
+        self.check(pyarrow.parquet.read_table(path).to_pydict(), counts)
+
+    def test_resume(self) -> None:
+        """
+        Tests that a run resumed from a checkpoint keeps the rows recorded up to the checkpoint and replaces the
+        ones recorded after it
+        """
+        formats = ["csv", "npz"] + (["parquet"] if pyarrow is not None else [])
+        for extension in formats:
+            with self.subTest(extension=extension):
+                path = os.path.join(self.tmp.name, "resumed." + extension)
+                checkpoint = os.path.join(self.tmp.name, "checkpoint.npz")
+                simulation = HeadlessSimulation(self.create_population_util())
+                with TimeSeriesRecorder(path, chunk_frames=7).attach(simulation.putil):
+                    simulation.run(15, checkpoint_path=checkpoint)
+                    simulation.run(10, start_frame=15)
+
+                restored = HeadlessSimulation.from_checkpoint(checkpoint)
+                recorder = TimeSeriesRecorder(path, chunk_frames=7, resume_frame=restored.next_frame())
+                with recorder.attach(restored.putil):
+                    restored.run(self.frames - restored.next_frame(), start_frame=restored.next_frame())
+                self.assertEqual(recorder.frames, self.frames)
+
+                _, counts = self.record("uninterrupted." + extension)
+                if extension == "csv":
+                    recorded = np.genfromtxt(path, delimiter=",", names=True, dtype=np.int64)
+                elif extension == "npz":
+                    recorded = np.load(path)
+                else:
+                    recorded = pyarrow.parquet.read_table(path).to_pydict()
+                self.check(recorded, counts)
+
+    def test_unsupported_format(self) -> None:
+        """
+        Tests that an unknown extension is rejected
+        """
+        with self.assertRaises(ValueError):
+            TimeSeriesRecorder(os.path.join(self.tmp.name, "series.txt"))
@@ -0,0 +1,47 @@
+"""
+Test file for the ffmpeg pipe
+"""
+
+import unittest
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import numpy as np
+from src.render import FFmpegPipe
+
+
+@unittest.skipIf(shutil.which("ffmpeg") is None, "ffmpeg is not installed")
+class FFmpegPipeTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        logging.basicConfig(format='\n%(asctime)s:%(module)s:%(levelname)s:%(message)s', level=logging.DEBUG)
+        logging.info('Testing ffmpeg pipe')
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_write(self) -> None:
+        """
+        Tests that every written frame ends up in the video
+        """
+        path = os.path.join(self.tmp.name, "video.mp4")
+        with FFmpegPipe(path, 64, 48, fps=10, ffmpeg="ffmpeg") as pipe:
+            for i in range(12):
+                pipe.write(np.full((48, 64, 4), i * 20, dtype=np.uint8))
+        self.assertEqual(pipe.frames, 12)
+        probe = subprocess.run(["ffprobe", "-v", "error", "-count_frames", "-select_streams", "v:0",
+                                "-show_entries", "stream=nb_read_frames", "-of", "csv=p=0", path],
+                                capture_output=True, text=True)
+        self.assertEqual(probe.stdout.strip(), "12")
+
+    def test_frame_size(self) -> None:
+        """
+        Tests that a frame of the wrong size is rejected
+        """
+        with FFmpegPipe(os.path.join(self.tmp.name, "video.mp4"), 64, 48, ffmpeg="ffmpeg") as pipe:
+            with self.assertRaises(ValueError):
+                pipe.write(np.zeros((48, 60, 4), dtype=np.uint8))
+            pipe.write(np.zeros((48, 64, 4), dtype=np.uint8))
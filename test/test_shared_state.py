@@ -0,0 +1,130 @@
+"""
+Test file for the shared memory view of the simulation state
+"""
+
+import unittest
+import logging
+import multiprocessing
+import numpy as np
+from src.config_util import ConfigUtil
+from src.population_util import PopulationUtil
+from src.shared_state import SharedStatePublisher, SharedStateReader
+import src.person_properties_util as index
+
+
+def read_frame(name: str) -> tuple:
+    """
+    Reads a segment from another process
+    """
+    with SharedStateReader(name) as reader:
+        snapshot = reader.read()
+        return snapshot["frame"], snapshot["counters"], snapshot["columns"]["current_state"]
+
+
+class SharedStateTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        logging.basicConfig(format='\n%(asctime)s:%(module)s:%(levelname)s:%(message)s', level=logging.DEBUG)
+        logging.info('Testing shared simulation state')
+        self.config_util = ConfigUtil('config/test_config.ini')
+        self.population_util = PopulationUtil(k=self.config_util.getFloatValue("virus.stats", "k_value"),
+                                                r=self.config_util.getFloatValue("virus.stats", "r_value"),
+                                                size=300,
+                                                min_age=self.config_util.getIntegerValue("people.stats", "min_age"),
+                                                max_age=self.config_util.getIntegerValue("people.stats", "max_age"),
+                                                mortality_rate=self.config_util.getDictionary("virus.stats", "mortality_rate"),
+                                                social_distance_per=self.config_util.getFloatValue("people.stats", "social_distancing_percent"),
+                                                infection_range=self.config_util.getFloatValue("virus.stats", "infection_range"),
+                                                recovery_time=self.config_util.getFloatValue("virus.stats", "recovery_time"),
+                                                total_healthcare_capacity=20,
+                                                mask_effectiveness=self.config_util.getDictionary("virus.stats", "mask_effectiveness"),
+                                                speed=self.config_util.getFloatValue("people.stats", "speed"),
+                                                social_distancing_at=5, mask_wearing_at=-1, seed=1)
+
+    def check(self, snapshot: dict, frame: int) -> None:
+        """
+        Checks a snapshot against the simulation
+        """
+        persons = self.population_util.persons
+        self.assertEqual(snapshot["frame"], frame)
+        self.assertEqual(snapshot["seq"] % 2, 0)
+        counts = self.population_util.population.get_state_counts()
+        self.assertListEqual([snapshot["counters"][name] for name in ("healthy", "infected", "immune", "dead")], list(counts))
+        self.assertEqual(snapshot["counters"]["new_infections"], self.population_util.virus.new_infections)
+        self.assertEqual(snapshot["counters"]["social_distancing"], int(frame >= 5))
+        for name, column in snapshot["columns"].items():
+            np.testing.assert_array_equal(column, persons[:, index.names.index(name)])
+
+    def test_publish(self) -> None:
+        """
+        Tests that every frame is published and that the views are read only
+        """
+        with SharedStatePublisher(self.population_util, columns=["x_axis", "y_axis", "current_state", "infected_by"]) as publisher:
+            publisher.attach(self.population_util)
+            with SharedStateReader(publisher.name) as reader:
+                self.check(reader.read(), -1)
+                for frame in range(12):
+                    self.population_util.move(frame)
+                    self.check(reader.read(), frame)
+                self.assertEqual(reader.get_seq(), 26)
+                self.assertEqual(reader.columns["infected_by"].dtype, np.int32)
+                with self.assertRaises(ValueError):
+                    reader.columns["x_axis"][0] = 0
+
+    def test_every(self) -> None:
+        """
+        Tests that only every every-th frame is published
+        """
+        with SharedStatePublisher(self.population_util, every=5).attach(self.population_util) as publisher:
+            with SharedStateReader(publisher.name) as reader:
+                for frame in range(8):
+                    self.population_util.move(frame)
+                self.assertEqual(reader.read()["frame"], 5)
+
+    def test_seqlock(self) -> None:
+        """
+        Tests that a frame being written is not read
+        """
+        with SharedStatePublisher(self.population_util) as publisher:
+            with SharedStateReader(publisher.name) as reader:
+                seq = reader.get_seq()
+                self.assertTrue(reader.is_consistent(seq))
+                publisher.seq[0] += 1
+                self.assertFalse(reader.is_consistent(seq))
+                with self.assertRaises(TimeoutError):
+                    reader.read(timeout=0.05)
+                publisher.seq[0] += 1
+                self.assertFalse(reader.is_consistent(seq))
+                self.assertEqual(reader.read()["seq"], seq + 2)
+
+    def test_other_process(self) -> None:
+        """
+        Tests that another process reads the published frame, and that the segment survives that process
+        """
+        with SharedStatePublisher(self.population_util).attach(self.population_util) as publisher:
+            for frame in range(6):
+                self.population_util.move(frame)
+            with multiprocessing.get_context("spawn").Pool(1) as pool:
+                frame, counters, state = pool.apply(read_frame, (publisher.name,))
+            self.assertEqual(frame, 5)
+            self.assertEqual(counters["infected"], self.population_util.population.get_state_counts()[1])
+            np.testing.assert_array_equal(state, self.population_util.persons[:, index.current_state])
+            with SharedStateReader(publisher.name) as reader:
+                self.assertEqual(reader.read()["frame"], 5)
+
+    def test_not_a_segment(self) -> None:
+        """
+        Tests that other segments are rejected
+        """
+        from multiprocessing import shared_memory
+        other = shared_memory.SharedMemory(create=True, size=128)
+        try:
+            with self.assertRaises(ValueError):
+                SharedStateReader(other.name)
+        finally:
+            other.close()
+            other.unlink()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+"""
+Test file for the simulation worker of the GUI
+"""
+
+import unittest
+import logging
+import time
+from src.config_util import ConfigUtil
+from gui.simulation_worker import SimulationWorker
+
+
+class SimulationWorkerTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        logging.basicConfig(format='\n%(asctime)s:%(module)s:%(levelname)s:%(message)s', level=logging.DEBUG)
+        logging.info('Testing simulation worker')
+        self.config_util = ConfigUtil('config/test_config.ini')
+        self.params = dict(k=self.config_util.getFloatValue("virus.stats", "k_value"),
+                            r=self.config_util.getFloatValue("virus.stats", "r_value"),
+                            size=100,
+                            min_age=self.config_util.getIntegerValue("people.stats", "min_age"),
+                            max_age=self.config_util.getIntegerValue("people.stats", "max_age"),
+                            mortality_rate=self.config_util.getDictionary("virus.stats", "mortality_rate"),
+                            social_distance_per=self.config_util.getFloatValue("people.stats", "social_distancing_percent"),
+                            infection_range=self.config_util.getFloatValue("virus.stats", "infection_range"),
+                            recovery_time=self.config_util.getFloatValue("virus.stats", "recovery_time"),
+                            total_healthcare_capacity=20,
+                            mask_effectiveness=self.config_util.getDictionary("virus.stats", "mask_effectiveness"),
+                            speed=self.config_util.getFloatValue("people.stats", "speed"),
+                            social_distancing_at=-1, mask_wearing_at=-1)
+
+    def wait(self, worker: SimulationWorker) -> list:
+        """
+        Polls the worker like the window does until it is finished, returns all the messages
+        """
+        messages = []
+        deadline = time.time() + 60
+        while not worker.finished and time.time() < deadline:
+            messages += worker.poll()
+            time.sleep(0.05)
+        worker.process.join(10)
+        return messages
+
+    def test_cancel(self) -> None:
+        """
+        Tests that a cancelled render stops on its first frame and reports it
+        """
+        worker = SimulationWorker(self.params, render_path="render", frames=10)
+        worker.cancel()
+        worker.start()
+        messages = self.wait(worker)
+        self.assertTrue(worker.finished)
+        self.assertEqual(messages[-1][0], "cancelled")
+        self.assertEqual(messages[-1][1]["simulated"], 0)
+        self.assertEqual(messages[-1][1]["healthy"] + messages[-1][1]["infected"], 100)
+        self.assertFalse(worker.is_alive())
+
+    def test_error(self) -> None:
+        """
+        Tests that an exception in the worker process is sent back
+        """
+        del self.params["size"]
+        worker = SimulationWorker(self.params, render_path="render", frames=10)
+        worker.start()
+        messages = self.wait(worker)
+        self.assertEqual(messages[-1][0], "error")
+        self.assertIn("TypeError", messages[-1][1]["message"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+Test file for the spatial index
+"""
+
+import unittest
+import logging
+import math
+import numpy as np
+from src.population import Population
+from src.spatial_index import SpatialGrid, KDTreeIndex, cKDTree
+from src.virus_util import Virus
+import src.person_properties_util as idx
+
+
+class SpatialGridTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        logging.basicConfig(format='\n%(asctime)s:%(module)s:%(levelname)s:%(message)s', level=logging.DEBUG)
+        logging.info('Testing spatial index')
+        self.size = 500
+        self.infection_range = 0.001
+        self.pop = Population(self.size)
+        self.pop.initialize_id(0, self.size)
+        self.pop.initialize_positions([0, 1], [0, 1], self.size)
+        # A few persons slightly out of bounds, movement can push them there
+        self.pop.persons[:5, idx.x_axis] = -0.01
+        self.pop.persons[5:10, idx.y_axis] = 1.02
+        self.pop.persons[:, idx.current_state] = np.random.randint(0, 4, size=self.size)
+        self.pop.persons[:, idx.social_distance] = np.random.randint(0, 2, size=self.size)
+
+    def test_query_covers_box(self) -> None:
+        """
+        Tests that the cells returned by query() contain every person inside the box, for boxes of the infection
+        range and larger ones
+        """
+        grid = SpatialGrid(self.infection_range)
+        x = self.pop.get_x_axis()
+        y = self.pop.get_y_axis()
+        grid.build(x, y)
+        reach = math.sqrt(self.infection_range)
+        for i in range(self.size):
+            x_bounds = [x[i] - reach, x[i] + reach]
+            y_bounds = [y[i] - reach, y[i] + reach]
+            inside = np.flatnonzero((x_bounds[0] < x) & (x_bounds[1] > x) & (y_bounds[0] < y) & (y_bounds[1] > y))
+            candidates = grid.query(x_bounds, y_bounds)
+            self.assertTrue(np.isin(inside, candidates).all())
+
+        #Boxes much larger than a cell, partly outside the bounds
+        for half in [0.1, 0.3, 0.8]:
+            for centre in [0.2, 0.5, 0.9]:
+                bounds = [centre - half, centre + half]
+                inside = np.flatnonzero((bounds[0] < x) & (bounds[1] > x) & (bounds[0] < y) & (bounds[1] > y))
+                self.assertTrue(np.isin(inside, grid.query(bounds, bounds)).all())
+
+    def test_find_nearby_matches_full_scan(self) -> None:
+        """
+        Tests that find_nearby() returns the same persons with and without the spatial index
+        """
+        persons = self.pop.get_person()
+        reach = math.sqrt(self.infection_range)
+        scan = Virus(self.infection_range, 100, 10)
+        indexed = Virus(self.infection_range, 100, 10)
+        indexed.update_index(persons)
+        for i in range(self.size):
+            x_bounds = [persons[i, idx.x_axis] - reach, persons[i, idx.x_axis] + reach]
+            y_bounds = [persons[i, idx.y_axis] - reach, persons[i, idx.y_axis] + reach]
+            self.assertListEqual(list(scan.find_nearby(persons, x_bounds, y_bounds)),
+                                    list(indexed.find_nearby(persons, x_bounds, y_bounds)))
+
+    def brute_force_neighbours(self, rows: np.ndarray, reach: float, mask: np.ndarray) -> list:
+        """
+        Neighbours of the given rows found by scanning the whole population
+        """
+        x = self.pop.get_x_axis()
+        y = self.pop.get_y_axis()
+        return [list(np.flatnonzero(mask & (x[i] - reach < x) & (x[i] + reach > x) & (y[i] - reach < y) & (y[i] + reach > y)))
+                    for i in rows]
+
+    def check_neighbours(self, spatial_index) -> None:
+        """
+        Checks the CSR output of neighbours() against the brute force search
+        """
+        x = self.pop.get_x_axis()
+        y = self.pop.get_y_axis()
+        reach = math.sqrt(self.infection_range)
+        mask = self.pop.get_current_state() == 0
+        rows = np.flatnonzero(self.pop.get_current_state() == 1)
+        spatial_index.build(x, y)
+        offsets, indices = spatial_index.neighbours(x[rows], y[rows], reach, mask)
+        self.assertEqual(len(offsets), len(rows) + 1)
+        found = [list(indices[offsets[i]:offsets[i + 1]]) for i in range(len(rows))]
+        self.assertListEqual(found, self.brute_force_neighbours(rows, reach, mask))
+
+    def test_grid_neighbours(self) -> None:
+        """
+        Tests the batched neighbours() query of the uniform grid, with and without splitting it into batches
+        """
+        self.check_neighbours(SpatialGrid(self.infection_range))
+        grid = SpatialGrid(self.infection_range)
+        grid.max_pairs_per_batch = 16
+        self.check_neighbours(grid)
+
+    def test_kdtree_neighbours(self) -> None:
+        """
+        Tests the batched neighbours() query of the KD-tree index, with and without splitting it into batches
+        """
+        if cKDTree is None:
+            self.skipTest("SciPy is not installed")
+        self.check_neighbours(KDTreeIndex())
+        tree = KDTreeIndex()
+        tree.max_pairs_per_batch = 16
+        self.check_neighbours(tree)
@@ -0,0 +1,71 @@
+"""
+Test file for the parameter sweep
+"""
+
+import unittest
+import logging
+import csv
+import os
+import tempfile
+from src.config_util import ConfigUtil
+from src.sweep import ParameterSweep, result_columns
+
+
+class ParameterSweepTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        logging.basicConfig(format='\n%(asctime)s:%(module)s:%(levelname)s:%(message)s', level=logging.DEBUG)
+        logging.info('Testing parameter sweep')
+        self.config_util = ConfigUtil('config/test_config.ini')
+        self.base_params = dict(k=self.config_util.getFloatValue("virus.stats", "k_value"),
+                                r=self.config_util.getFloatValue("virus.stats", "r_value"),
+                                size=100,
+                                min_age=self.config_util.getIntegerValue("people.stats", "min_age"),
+                                max_age=self.config_util.getIntegerValue("people.stats", "max_age"),
+                                mortality_rate=self.config_util.getDictionary("virus.stats", "mortality_rate"),
+                                social_distance_per=self.config_util.getFloatValue("people.stats", "social_distancing_percent"),
+                                infection_range=self.config_util.getFloatValue("virus.stats", "infection_range"),
+                                recovery_time=self.config_util.getFloatValue("virus.stats", "recovery_time"),
+                                total_healthcare_capacity=5,
+                                mask_effectiveness=self.config_util.getDictionary("virus.stats", "mask_effectiveness"),
+                                speed=self.config_util.getFloatValue("people.stats", "speed"),
+                                social_distancing_at=-1, mask_wearing_at=-1)
+
+    def test_grid(self) -> None:
+        """
+        Tests that grid() returns every combination of the parameter values
+        """
+        runs = ParameterSweep.grid({"r": [1, 2, 3], "k": [0.1, 0.9]})
+        self.assertEqual(len(runs), 6)
+        self.assertIn({"r": 3, "k": 0.9}, runs)
+
+    def test_latin_hypercube(self) -> None:
+        """
+        Tests that latin_hypercube() uses every stratum of every range exactly once
+        """
+        runs = ParameterSweep.latin_hypercube({"r": [1, 5], "size": [100, 1100]}, 10, seed=3)
+        self.assertEqual(len(runs), 10)
+        strata = sorted(int((run["r"] - 1) / 4 * 10) for run in runs)
+        self.assertListEqual(strata, list(range(10)))
+        self.assertTrue(all(isinstance(run["size"], int) for run in runs))
+
+    def test_run(self) -> None:
+        """
+        Tests that run() writes one row per run and that the same seed gives the same results
+        """
+        runs = ParameterSweep.from_spec({"mode": "list", "runs": [{"r": 2.0}, {"r": 4.0, "size": 150}, {"k": 0.5}]})
+        sweep = ParameterSweep(self.base_params, frames=5, workers=2, seed=7)
+        results = []
+        with tempfile.TemporaryDirectory() as tmp:
+            for i in range(2):
+                path = os.path.join(tmp, "sweep" + str(i) + ".csv")
+                self.assertEqual(sweep.run(runs, path), 3)
+                with open(path) as out:
+                    rows = sorted(csv.DictReader(out), key=lambda row: int(row["run"]))
+                results.append(rows)
+
+        self.assertEqual(len(results[0]), 3)
+        self.assertEqual(results[0][1]["size"], "150")
+        self.assertTrue(set(result_columns).issubset(results[0][0].keys()))
+        self.assertEqual(sum(int(results[0][1][name]) for name in ["healthy", "infected", "immune", "dead"]), 150)
+        self.assertListEqual(results[0], results[1])
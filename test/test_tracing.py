@@ -0,0 +1,117 @@
+"""
+Test file for the infection tracing
+"""
+
+import unittest
+import logging
+import os
+import tempfile
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import networkx as nx
+import numpy as np
+from src.config_util import ConfigUtil
+from src.population_util import PopulationUtil
+from src.tracing import InfectionTrace
+import src.person_properties_util as index
+
+
+class InfectionTraceTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        logging.basicConfig(format='\n%(asctime)s:%(module)s:%(levelname)s:%(message)s', level=logging.DEBUG)
+        logging.info('Testing infection tracing')
+        self.config_util = ConfigUtil('config/test_config.ini')
+        self.population_util = PopulationUtil(k=self.config_util.getFloatValue("virus.stats", "k_value"),
+                                                r=self.config_util.getFloatValue("virus.stats", "r_value"),
+                                                size=400,
+                                                min_age=self.config_util.getIntegerValue("people.stats", "min_age"),
+                                                max_age=self.config_util.getIntegerValue("people.stats", "max_age"),
+                                                mortality_rate=self.config_util.getDictionary("virus.stats", "mortality_rate"),
+                                                social_distance_per=self.config_util.getFloatValue("people.stats", "social_distancing_percent"),
+                                                infection_range=self.config_util.getFloatValue("virus.stats", "infection_range"),
+                                                recovery_time=self.config_util.getFloatValue("virus.stats", "recovery_time"),
+                                                total_healthcare_capacity=20,
+                                                mask_effectiveness=self.config_util.getDictionary("virus.stats", "mask_effectiveness"),
+                                                speed=self.config_util.getFloatValue("people.stats", "speed"),
+                                                social_distancing_at=-1, mask_wearing_at=-1, seed=8)
+        for frame in range(120):
+            self.population_util.move(frame)
+        self.trace = InfectionTrace.from_population(self.population_util.population)
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        plt.close("all")
+        self.tmp.cleanup()
+
+    def test_from_population(self) -> None:
+        """
+        Tests the persons, edges and generations against a walk over every person
+        """
+        persons = self.population_util.persons
+        infected_by = {i: int(persons[i, index.infected_by]) for i in range(self.population_util.size)
+                        if persons[i, index.infected_by] != -1}
+        self.assertGreater(len(infected_by), 10)
+        self.assertListEqual(list(self.trace.person), list(infected_by))
+        self.assertSetEqual({tuple(edge) for edge in self.trace.get_edges().tolist()},
+                            {(by, i) for i, by in infected_by.items() if by != i})
+        self.assertListEqual(list(self.trace.person[self.trace.roots]), [self.population_util.infected_person])
+
+        def generation(i):
+            return 0 if infected_by[i] == i else generation(infected_by[i]) + 1
+        self.assertListEqual(list(self.trace.generation), [generation(i) for i in infected_by])
+
+        layout = self.trace.get_layout()
+        self.assertTrue(((layout >= 0) & (layout <= 1)).all())
+        self.assertEqual(len(np.unique(layout, axis=0)), len(self.trace))
+
+    def test_external_infector(self) -> None:
+        """
+        Tests that a person whose infector is not traced becomes a root instead of hanging off another person
+        """
+        trace = InfectionTrace([5, 6, 7, 8], [5, 99, 6, 0], [1, 1, 1, 1], [0, 3, 5, 4])
+        self.assertListEqual(list(trace.roots), [True, True, False, True])
+        self.assertListEqual(list(trace.generation), [0, 0, 1, 0])
+        self.assertListEqual(trace.get_edges().tolist(), [[6, 7]])
+        self.assertEqual(len(np.unique(trace.get_layout(), axis=0)), len(trace))
+
+    def test_save(self) -> None:
+        """
+        Tests that the CSV, npz and GraphML files hold the trace
+        """
+        csv_path = os.path.join(self.tmp.name, "trace.csv")
+        self.trace.save(csv_path)
+        saved = np.genfromtxt(csv_path, delimiter=",", names=True, dtype=np.int64)
+        for name in InfectionTrace.columns:
+            self.assertListEqual(list(saved[name]), list(getattr(self.trace, name)))
+
+        npz_path = os.path.join(self.tmp.name, "trace.npz")
+        self.trace.save(npz_path)
+        saved = np.load(npz_path)
+        for name in InfectionTrace.columns:
+            self.assertListEqual(list(saved[name]), list(getattr(self.trace, name)))
+
+        graphml_path = os.path.join(self.tmp.name, "trace.graphml")
+        self.trace.save(graphml_path)
+        graph = nx.read_graphml(graphml_path, node_type=int)
+        self.assertEqual(graph.number_of_nodes(), len(self.trace))
+        self.assertSetEqual(set(graph.edges()), {tuple(edge) for edge in self.trace.get_edges().tolist()})
+        self.assertEqual(graph.nodes[int(self.trace.person[-1])]["generation"], self.trace.generation[-1])
+
+        with self.assertRaises(ValueError):
+            self.trace.save(os.path.join(self.tmp.name, "trace.txt"))
+
+    def test_draw(self) -> None:
+        """
+        Tests that every infection is drawn as one line and that large traces are skipped
+        """
+        ax = plt.figure().add_subplot()
+        self.assertTrue(self.trace.draw(ax))
+        self.assertEqual(len(ax.collections[0].get_segments()), len(self.trace) - 1)
+        self.assertEqual(len(ax.collections[1].get_offsets()), len(self.trace))
+        self.assertFalse(self.trace.draw(plt.figure().add_subplot(), max_persons=len(self.trace) - 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+"""
+Test file for the trajectory recorder and player
+"""
+
+import unittest
+import logging
+import tempfile
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+from src.config_util import ConfigUtil
+from src.population_util import PopulationUtil
+from src.headless import HeadlessSimulation
+from src.trajectory import TrajectoryRecorder, TrajectoryPlayer
+from src.visualization import Visualization
+import src.person_properties_util as index
+
+
+class TrajectoryTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        logging.basicConfig(format='\n%(asctime)s:%(module)s:%(levelname)s:%(message)s', level=logging.DEBUG)
+        logging.info('Testing trajectory recorder and player')
+        self.config_util = ConfigUtil('config/test_config.ini')
+        self.frames = 30
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        plt.close("all")
+        self.tmp.cleanup()
+
+    def create_population_util(self) -> PopulationUtil:
+        return PopulationUtil(k=self.config_util.getFloatValue("virus.stats", "k_value"),
+                                r=self.config_util.getFloatValue("virus.stats", "r_value"),
+                                size=200,
+                                min_age=self.config_util.getIntegerValue("people.stats", "min_age"),
+                                max_age=self.config_util.getIntegerValue("people.stats", "max_age"),
+                                mortality_rate=self.config_util.getDictionary("virus.stats", "mortality_rate"),
+                                social_distance_per=self.config_util.getFloatValue("people.stats", "social_distancing_percent"),
+                                infection_range=self.config_util.getFloatValue("virus.stats", "infection_range"),
+                                recovery_time=self.config_util.getFloatValue("virus.stats", "recovery_time"),
+                                total_healthcare_capacity=20,
+                                mask_effectiveness=self.config_util.getDictionary("virus.stats", "mask_effectiveness"),
+                                speed=self.config_util.getFloatValue("people.stats", "speed"),
+                                social_distancing_at=10, mask_wearing_at=20, seed=6)
+
+    def record(self) -> np.ndarray:
+        """
+        Records a headless run, returns its counts
+        """
+        population_util = self.create_population_util()
+        with TrajectoryRecorder(self.tmp.name, population_util, self.frames).attach(population_util):
+            return HeadlessSimulation(population_util).run(self.frames)
+
+    def test_play(self) -> None:
+        """
+        Tests that the player shows the same positions, states and counts as the simulation on every frame
+        """
+        counts = self.record()
+        player = TrajectoryPlayer(self.tmp.name)
+        population_util = self.create_population_util()
+        self.assertEqual(player.frames, self.frames)
+        self.assertEqual(player.size, population_util.size)
+        self.assertEqual(player.enforce_mask_wearing_at, 20)
+        np.testing.assert_array_equal(player.population.get_state_counts(), population_util.population.get_state_counts())
+
+        for frame in range(self.frames):
+            population_util.move(frame)
+            player.move(frame)
+            for column in (index.x_axis, index.y_axis, index.current_state):
+                np.testing.assert_array_equal(player.persons[:, column], np.float32(population_util.persons[:, column]))
+            self.assertListEqual(list(player.population.get_state_counts()), list(counts[frame, 1:5]))
+            self.assertEqual(player.population.get_hospital_occupancy(), counts[frame, 5])
+        np.testing.assert_array_equal(player.get_history(self.frames), counts[:, 1:5])
+
+        with self.assertRaises(IndexError):
+            player.move(self.frames)
+
+    def test_full(self) -> None:
+        """
+        Tests that recording more frames than allocated fails
+        """
+        population_util = self.create_population_util()
+        TrajectoryRecorder(self.tmp.name, population_util, 2).attach(population_util)
+        population_util.move(0)
+        population_util.move(1)
+        with self.assertRaises(ValueError):
+            population_util.move(2)
+
+    def test_first_frame(self) -> None:
+        """
+        Tests that drawing from the middle of a recording gives the same frames as drawing from the start
+        """
+        self.record()
+        for fast in (False, True):
+            whole = Visualization(TrajectoryPlayer(self.tmp.name), fast=fast, start=False)
+            part = Visualization(TrajectoryPlayer(self.tmp.name), fast=fast, start=False)
+            whole_frames = [np.array(buffer) for buffer in whole.generate_frames(self.frames, dpi=40)]
+            part_frames = [np.array(buffer) for buffer in part.generate_frames(self.frames - 20, dpi=40, first_frame=20)]
+            for whole_frame, part_frame in zip(whole_frames[20:], part_frames):
+                np.testing.assert_array_equal(whole_frame, part_frame)
+            self.assertListEqual(part.infected, whole.infected)
+            self.assertEqual(part.mask_wearing_info, "Active")
+
+
+if __name__ == "__main__":
+    unittest.main()
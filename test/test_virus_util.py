@@ -104,3 +104,118 @@ class VirusUtilTest(unittest.TestCase):
         self.population.persons[:, index.mortality_rate] = 1.00
         self.virus_util.die_or_immune(self.population, int(self.population.get_all_infected()[0][0]))
         self.assertNotEqual(len(self.population.get_all_dead()), 0)
+
+    def test_transmit(self):
+        """
+        Test case to test the transmit() method; checks that the infectors do not infect more persons than their g value
+        and that a person reached by two infectors is infected by the first one
+        """
+        self.population.persons[:, index.current_state] = 0
+        self.population.persons[:, index.susceptibility] = 1
+        self.population.persons[:, index.hospitalized] = 0
+        self.population.persons[0, index.g_value] = 2
+        self.population.persons[1, index.g_value] = 3
+        infectors = np.array([0, 1])
+        owner = np.array([0, 0, 0, 1, 1, 1, 1])
+        targets = np.array([2, 3, 4, 2, 3, 4, 5])
+
+        self.virus_util.transmit(self.population, infectors, owner, targets, 5)
+
+        self.assertListEqual(list(self.population.persons[2:6, index.current_state]), [1, 1, 1, 1])
+        self.assertListEqual(list(self.population.persons[2:6, index.infected_by]), [0, 0, 1, 1])
+        self.assertListEqual(list(self.population.persons[2:6, index.infected_at]), [5, 5, 5, 5])
+        self.assertListEqual(list(self.population.persons[0:2, index.g_value]), [0, 1])
+        self.assertEqual(len(self.population.get_all_infected()), 4)
+
+    def test_transmit_sequential(self):
+        """
+        Test case to check that transmit() infects the same persons from the same infectors as processing the
+        infectors one after the other, for random pairs and g values
+        """
+        rng = np.random.default_rng(2)
+        self.population.persons[:, index.susceptibility] = 1
+        self.population.persons[:, index.hospitalized] = 0
+        infectors = np.arange(4)
+        for trial in range(300):
+            self.population.persons[:, index.current_state] = 0
+            self.population.persons[:, index.infected_by] = -1
+            g_value = rng.integers(0, 4, size=len(infectors))
+            self.population.persons[infectors, index.g_value] = g_value
+            hits = [np.flatnonzero(rng.random(6) < 0.5) + 4 for infector in infectors]
+            owner = np.concatenate([np.full(len(hit), i) for i, hit in enumerate(hits)]).astype(np.int64)
+            targets = np.concatenate(hits).astype(np.int64)
+
+            expected = np.full(self.size, -1)
+            for i, hit in enumerate(hits):
+                won = [target for target in hit if expected[target] == -1][:g_value[i]]
+                expected[won] = self.population.persons[infectors[i], index.id]
+
+            self.virus_util.transmit(self.population, infectors, owner, targets, 5)
+            self.assertListEqual(list(self.population.persons[:, index.infected_by]), list(expected))
+            self.assertListEqual(list(self.population.persons[infectors, index.g_value]),
+                                    list(g_value - np.bincount(expected[expected != -1], minlength=self.size)[infectors]))
+
+    def test_transmit_dense_frame(self):
+        """
+        Test case to check that transmit() matches the infectors processed one after the other with the same
+        draws, on a crowded frame where most infectors share targets
+        """
+        size = 3000
+        population = Population(size, np.random.default_rng(4))
+        population.initialize_id(0, size)
+        population.initialize_positions(self.x_bounds, self.y_bounds, size)
+        persons = population.persons
+        persons[:, index.g_value] = np.random.default_rng(4).integers(0, 4, size)
+        persons[:, index.susceptibility] = 0.5
+        persons[:, index.current_state] = np.random.default_rng(4).random(size) < 0.3
+        persons[:, index.infected_by] = -1
+        virus = Virus(0.004, self.recovery_time, 50, np.random.default_rng(9))
+        infectors = np.flatnonzero(persons[:, index.current_state] == 1)
+        virus.update_index(persons)
+        owner, targets = virus.find_pairs(persons, infectors)
+        self.assertGreater(len(targets) - len(np.unique(targets)), 500)
+
+        #The baseline loop over the infectors with the draws transmit() makes
+        hit = np.random.default_rng(9).uniform(low = 0.0001, high = 1, size = len(targets)) < 0.5
+        g_value = persons[:, index.g_value][infectors].astype(int)
+        expected = np.full(size, -1)
+        for i, target, is_hit in zip(owner, targets, hit):
+            if is_hit and expected[target] == -1 and g_value[i] > 0:
+                expected[target] = infectors[i]
+                g_value[i] -= 1
+
+        virus.transmit(population, infectors, owner, targets, 3)
+        self.assertListEqual(list(persons[:, index.infected_by]), list(expected))
+        self.assertListEqual(list(persons[:, index.g_value][infectors]), list(g_value))
+
+    def test_hospital_occupancy(self):
+        """
+        Test case to check that the hospital occupancy kept by the population matches the hospitalized persons after infecting
+        """
+        self.population.persons = self.movement.update_persons(self.population.persons, self.size, self.speed, 1)
+        self.population.persons[:, index.current_state] = 1
+        self.population.persons[:, index.hospitalized] = 0
+        self.population.admit_to_hospital(np.arange(self.size))
+        self.virus_util.infect(self.population, int(self.recovery_time))
+        self.assertEqual(self.population.get_hospital_occupancy(), 0)
+        self.assertEqual(np.count_nonzero(self.population.persons[:, index.hospitalized] == 3), self.size)
+
+    def test_resolve_infections(self):
+        """
+        Test case to test the resolve_infections() method; only the persons past the recovery time are resolved, hospitalized
+        persons die with their mortality rate and the others with 20% more
+        """
+        self.population.persons[:, index.current_state] = 1
+        self.population.persons[:, index.hospitalized] = 0
+        self.population.persons[:, index.infected_at] = 0
+        self.population.persons[0, index.infected_at] = 1
+        self.population.persons[:, index.mortality_rate] = 0
+        self.population.persons[1:3, index.mortality_rate] = 1
+        self.population.persons[7, index.mortality_rate] = 0.8
+        self.population.admit_to_hospital(np.array([1, 2, 3, 4, 5, 6]))
+
+        self.virus_util.resolve_infections(self.population, np.arange(8), int(self.recovery_time))
+
+        self.assertListEqual(list(self.population.persons[:, index.current_state]), [1, 3, 3, 2, 2, 2, 2, 3, 1, 1])
+        self.assertListEqual(list(self.population.persons[:, index.hospitalized]), [0, 3, 3, 3, 3, 3, 3, 0, 0, 0])
+        self.assertEqual(self.population.get_hospital_occupancy(), 0)
@@ -0,0 +1,146 @@
+"""
+Test file for the visualization
+"""
+
+import unittest
+import logging
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+from src.config_util import ConfigUtil
+from src.population_util import PopulationUtil
+from src.visualization import Visualization
+import src.person_properties_util as index
+
+
+class VisualizationTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        logging.basicConfig(format='\n%(asctime)s:%(module)s:%(levelname)s:%(message)s', level=logging.DEBUG)
+        logging.info('Testing visualization')
+        self.config_util = ConfigUtil('config/test_config.ini')
+
+    def tearDown(self) -> None:
+        plt.close("all")
+
+    def create_visualization(self, fast: bool) -> Visualization:
+        """
+        Creates the figure of a visualization without starting the animation
+        """
+        population_util = PopulationUtil(k=self.config_util.getFloatValue("virus.stats", "k_value"),
+                                            r=self.config_util.getFloatValue("virus.stats", "r_value"),
+                                            size=200,
+                                            min_age=self.config_util.getIntegerValue("people.stats", "min_age"),
+                                            max_age=self.config_util.getIntegerValue("people.stats", "max_age"),
+                                            mortality_rate=self.config_util.getDictionary("virus.stats", "mortality_rate"),
+                                            social_distance_per=self.config_util.getFloatValue("people.stats", "social_distancing_percent"),
+                                            infection_range=self.config_util.getFloatValue("virus.stats", "infection_range"),
+                                            recovery_time=self.config_util.getFloatValue("virus.stats", "recovery_time"),
+                                            total_healthcare_capacity=20,
+                                            mask_effectiveness=self.config_util.getDictionary("virus.stats", "mask_effectiveness"),
+                                            speed=self.config_util.getFloatValue("people.stats", "speed"),
+                                            social_distancing_at=10, mask_wearing_at=20, seed=3)
+        return Visualization(population_util, fast=fast, refresh_every=5, start=False)
+
+    def test_update(self) -> None:
+        """
+        Tests that the normal and the fast mode show the same positions and numbers
+        """
+        normal = self.create_visualization(False)
+        fast = self.create_visualization(True)
+        self.assertEqual(len(normal.setup_plot()), 10)
+        self.assertEqual(len(fast.setup_plot()), 7)
+
+        for frame in range(1, 16):
+            normal.update(frame)
+            artists = fast.update(frame)
+            self.assertIs(artists[0], fast.scat)
+
+            # Same positions, coloured by state in the fast mode
+            persons = fast.putil.persons
+            state = persons[:, index.current_state].astype(int)
+            offsets = np.concatenate([scat.get_offsets() for scat in (normal.scat, normal.scat2, normal.scat3, normal.scat4)])
+            self.assertEqual(len(fast.scat.get_offsets()), len(offsets))
+            np.testing.assert_array_equal(fast.scat.get_offsets()[:, 0], persons[:, index.x_axis])
+            np.testing.assert_array_equal(fast.scat.get_facecolors(), fast.state_rgba[state])
+
+            # The line graph has every frame, its text is only refreshed every refresh_every frames in fast mode
+            self.assertListEqual(fast.infected, normal.infected)
+            self.assertListEqual(fast.deaths, normal.deaths)
+            if frame % fast.refresh_every == 0:
+                self.assertEqual(fast.text.get_text(), normal.text.get_text())
+                self.assertListEqual(list(fast.currently_infected.get_ydata()), fast.infected)
+
+    def test_generate_frames(self) -> None:
+        """
+        Tests that one RGBA buffer of the figure size is drawn per frame, in the normal and the fast mode
+        """
+        for fast in (False, True):
+            visualization = self.create_visualization(fast)
+            visualization.fig.set_size_inches(4, 5)
+            frames = [np.array(buffer) for buffer in visualization.generate_frames(6, dpi=50)]
+            self.assertEqual(len(frames), 6)
+            for frame in frames:
+                self.assertEqual(frame.shape, (250, 200, 4))
+                self.assertEqual(frame.dtype, np.uint8)
+            self.assertFalse(np.array_equal(frames[0], frames[-1]))
+            self.assertEqual(visualization.frames[-1], 5)
+
+
+    def blit(self, visualization: Visualization, frames: int) -> tuple:
+        """
+        Draws frames the way FuncAnimation blits them, restoring and redrawing the inside of every axes with
+        changing artists only, and returns the last one along with the same frame drawn in full
+        """
+        canvas = visualization.fig.canvas
+        artists = visualization.setup_plot()
+        for artist in artists:
+            artist.set_animated(True)
+        canvas.draw()
+        backgrounds = {artist.axes: canvas.copy_from_bbox(artist.axes.bbox) for artist in artists}
+        for frame in range(1, frames + 1):
+            artists = visualization.update(frame)
+            for background in backgrounds.values():
+                canvas.restore_region(background)
+            for artist in artists:
+                visualization.fig.draw_artist(artist)
+        blitted = np.array(canvas.buffer_rgba())
+        for artist in artists:
+            artist.set_animated(False)
+        canvas.draw()
+        return blitted, np.array(canvas.buffer_rgba())
+
+    def test_blit_statistics(self) -> None:
+        """
+        Tests that the statistics below the line graph look the same when blitted in the fast mode as when the
+        whole figure is drawn, so they neither smear nor go stale
+        """
+        visualization = self.create_visualization(True)
+        blitted, full = self.blit(visualization, 24)
+        top = len(full) - int(visualization.ax1.bbox.y0) + 1
+        self.assertGreater(np.count_nonzero(full[top:, :, :3].sum(axis=2) < 300), 0)
+        np.testing.assert_array_equal(blitted[top:], full[top:])
+
+
+    def test_blit_timing_panel(self) -> None:
+        """
+        Tests that the timing panel of the statistics is refreshed and drawn inside the blitted region in the
+        fast mode
+        """
+        visualization = self.create_visualization(True)
+        visualization.putil.enable_instrumentation()
+        blitted, full = self.blit(visualization, 10)
+        panel = visualization.stats_text
+        self.assertIn(panel, visualization.get_artists())
+        self.assertTrue(panel.get_text().startswith("Step"))
+        extent = panel.get_window_extent(visualization.fig.canvas.get_renderer())
+        self.assertTrue(visualization.ax2.bbox.contains(extent.x0, extent.y0))
+        self.assertTrue(visualization.ax2.bbox.contains(extent.x1, extent.y1))
+        rows = slice(len(full) - int(extent.y1) - 1, len(full) - int(extent.y0) + 1)
+        np.testing.assert_array_equal(blitted[rows], full[rows])
+
+
+
+if __name__ == "__main__":
+    unittest.main()